@@ -2,34 +2,133 @@ import subprocess
 import sys
 import os
 import platform
-import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+import requests
+
+import config
+from header_probe import HeaderProbe, analyze_security_headers
+from metrics import SCANNER_SECONDS, SUBPROCESSES
+from nmap_parser import NmapXMLParser, format_nmap_summary
+from process_supervisor import ResourceLimits
+from scan_cache import CANCELLED_RESULT, ScanResultCache, normalize_target
+from stream_runner import ProcessCancelled, run_streaming
+from tool_registry import ToolRegistry
+
+# Scanners run by an "all" scan, in report order
+ALL_SCANNERS = ['nmap', 'nikto', 'whatweb', 'curl']
+
+# Scanners implemented in-process rather than as external tools
+IN_PROCESS_SCANNERS = ('curl',)
+
+# Arguments that make each external tool print its version
+VERSION_ARGS = {
+    'nmap': ['--version'],
+    'nikto': ['-Version'],
+    'whatweb': ['--version'],
+}
+
+# Command-line options of each scanner, also part of the result cache key
+SCANNER_OPTIONS = {
+    # Vulnerability scripts, XML on stdout so it can be parsed while running
+    'nmap': ['-sV', '--script', 'vuln', '-oX', '-'],
+    'nikto': ['-Format', 'txt'],
+    'whatweb': ['--log-verbose', '-'],
+    # Header probe: HEAD request, following redirects
+    'curl': ['head', 'follow-redirects'],
+}
+
+# Longest each external tool may run, in seconds; a scan's overall deadline
+# can cut this shorter
+SCANNER_TIMEOUTS = {
+    'nmap': 300,
+    'nikto': 600,
+    'whatweb': 120,
+}
+
+# Extra seconds a grouped nmap run may take for every host after the first
+NMAP_GROUP_HOST_TIMEOUT = 60
+
+# Progress is republished after this many output lines without a finding
+PROGRESS_EVERY_LINES = 50
+# Number of most recent findings included in each progress update
+PROGRESS_FINDINGS = 20
+
+# Nikto status lines that start with "+ " but are not findings
+NIKTO_INFO_PREFIXES = (
+    '+ Target IP:', '+ Target Hostname:', '+ Target Port:', '+ Start Time:',
+    '+ End Time:', '+ Server:', '+ SSL Info:', '+ Subject:', '+ Issuer:',
+    '+ Ciphers:', '+ Platform:',
+)
+
+
+def _is_nikto_finding(line):
+    if not line.startswith('+ ') or line.startswith(NIKTO_INFO_PREFIXES):
+        return False
+    # Summary lines such as "+ 1 host(s) tested"
+    return not line[2:3].isdigit()
+
+
+def _parse_nikto_line(line):
+    return [line.strip()] if _is_nikto_finding(line) else []
+
 class ScannerManager:
-    def __init__(self):
+    def __init__(self, shared_results=None):
         self.temp_dir = Path(__file__).parent.parent / 'temp_installs'
         self.temp_dir.mkdir(exist_ok=True)
         self.system = platform.system().lower()
+        # Shared with other worker processes through `shared_results`, if given
+        self.result_cache = ScanResultCache(
+            config.SCAN_CACHE_TTLS, maxsize=config.SCAN_CACHE_SIZE,
+            shared=shared_results, lease=config.SCAN_DEADLINE
+        )
+        # Tool paths and versions, resolved once and refreshed in the background
+        self.registry = ToolRegistry(
+            VERSION_ARGS,
+            refresh_interval=config.TOOL_REFRESH_INTERVAL,
+            poll_interval=config.TOOL_POLL_INTERVAL
+        )
+        self.registry.start()
+        # rlimits and niceness every scanner subprocess starts with
+        self.resource_limits = ResourceLimits(
+            cpu_seconds=config.SCANNER_CPU_LIMIT,
+            memory_bytes=config.SCANNER_MEMORY_LIMIT_MB * 1024 * 1024,
+            max_files=config.SCANNER_MAX_FILES,
+            nice=config.SCANNER_NICE
+        )
+        # Pooled HTTP client behind the 'curl' header scan
+        self.header_probe = HeaderProbe(
+            timeout=config.HEADER_PROBE_TIMEOUT,
+            max_redirects=config.HEADER_PROBE_MAX_REDIRECTS,
+            pool_size=config.HEADER_PROBE_POOL_SIZE,
+            verify_tls=bool(config.HEADER_PROBE_VERIFY_TLS)
+        )
         
     def check_scanner_installed(self, scanner_type):
         """Check if a scanner is installed on the system"""
-        scanner_commands = {
-            'nmap': 'nmap',
-            'nikto': 'nikto',
-            'whatweb': 'whatweb',
-            'curl': 'curl'
-        }
-        
-        scanner_name = scanner_commands.get(str(scanner_type))
-        if not scanner_name:
-            return False
-            
-        return shutil.which(scanner_name) is not None
+        if str(scanner_type) in IN_PROCESS_SCANNERS:
+            return True
+        return self.registry.is_installed(str(scanner_type))
+    
+    def scanner_info(self, scanner_type):
+        """Cached path and version of a scanner, or None if unknown"""
+        if str(scanner_type) in IN_PROCESS_SCANNERS:
+            return {'path': None, 'version': f'built-in (requests {requests.__version__})'}
+        return self.registry.info(str(scanner_type))
+    
+    def _tool_path(self, scanner):
+        return self.registry.path(scanner) or scanner
     
     def ensure_scanners(self, scan_type):
-        """Ensure required scanners are available, install if not"""
+        """Return the scanners a scan needs that are not installed
+
+        Installation happens in prewarm_scanners, never during a scan.
+        """
         if scan_type == 'all' or scan_type == 1:
-            scanners = ['nmap', 'nikto', 'whatweb', 'curl']
+            scanners = ALL_SCANNERS
         else:
             scanner_map = {
                 2: ['nmap'],
@@ -39,9 +138,18 @@ class ScannerManager:
             }
             scanners = scanner_map.get(scan_type, [])
         
-        for scanner in scanners:
-            if not self.check_scanner_installed(scanner):
+        return self.registry.missing([s for s in scanners if s not in IN_PROCESS_SCANNERS])
+    
+    def prewarm_scanners(self, install=True):
+        """Install any missing scanners ahead of time, then refresh the registry"""
+        tools = [s for s in ALL_SCANNERS if s not in IN_PROCESS_SCANNERS]
+        missing = self.registry.missing(tools)
+        if install:
+            for scanner in missing:
                 self.install_scanner(scanner)
+        if missing:
+            self.registry.refresh()
+        return self.registry.missing(tools)
     
     def install_scanner(self, scanner):
         """Temporarily install a scanner"""
@@ -62,8 +170,7 @@ class ScannerManager:
         install_commands = {
             'nmap': ['sudo', 'apt-get', 'install', '-y', 'nmap'],
             'nikto': ['sudo', 'apt-get', 'install', '-y', 'nikto'],
-            'whatweb': ['sudo', 'apt-get', 'install', '-y', 'whatweb'],
-            'curl': ['sudo', 'apt-get', 'install', '-y', 'curl']
+            'whatweb': ['sudo', 'apt-get', 'install', '-y', 'whatweb']
         }
         
         if scanner in install_commands:
@@ -74,8 +181,7 @@ class ScannerManager:
         install_commands = {
             'nmap': ['brew', 'install', 'nmap'],
             'nikto': ['brew', 'install', 'nikto'],
-            'whatweb': ['brew', 'install', 'whatweb'],
-            'curl': ['brew', 'install', 'curl']
+            'whatweb': ['brew', 'install', 'whatweb']
         }
         
         if scanner in install_commands:
@@ -87,94 +193,328 @@ class ScannerManager:
         # This is a simplified version
         print(f"Windows installation for {scanner} not fully implemented")
     
-    def run_nmap(self, target):
+    def _timeout(self, scanner, deadline, default=None):
+        """Seconds a scanner may run: its own limit, or less if the deadline is near"""
+        timeout = default or SCANNER_TIMEOUTS[scanner]
+        if deadline is None:
+            return timeout
+        return max(1, min(timeout, deadline - time.monotonic()))
+
+    def run_scanner(self, scanner, target, progress=None, force_refresh=False,
+                    cancel=None, deadline=None, timings=None):
+        """Run one scanner, reusing a recent or in-flight identical scan
+
+        `cancel` is a threading.Event that stops the scanner when set, and
+        `deadline` a time.monotonic() value it must finish by. The wall time
+        is stored in `timings` under 'run_<scanner>'.
+        """
+        method = getattr(self, f'run_{scanner}')
+        if cancel is not None and cancel.is_set():
+            return dict(CANCELLED_RESULT)
+        if deadline is not None and deadline <= time.monotonic():
+            return {'error': f'Scan deadline reached before {scanner} started',
+                    'success': False}
+
+        shared = []
+        def on_shared():
+            shared.append(True)
+            if progress:
+                progress(scanner, {'state': 'shared', 'lines': 0,
+                                   'finding_count': 0, 'findings': []})
+
+        start = time.perf_counter()
+        result = self.result_cache.get_or_run(
+            scanner, target, SCANNER_OPTIONS[scanner],
+            lambda: method(target, progress=progress, cancel=cancel, deadline=deadline),
+            force_refresh=force_refresh, on_shared=on_shared, cancel=cancel,
+            deadline=deadline
+        )
+        elapsed = time.perf_counter() - start
+
+        if result.get('cancelled'):
+            outcome = 'cancelled'
+        elif 'cached_at' in result:
+            outcome = 'cached'
+        elif shared:
+            outcome = 'shared'
+        else:
+            outcome = 'success' if result.get('success') else 'failed'
+        SCANNER_SECONDS.observe(elapsed, scanner=scanner, outcome=outcome)
+        if timings is not None:
+            timings[f'run_{scanner}'] = round(elapsed, 4)
+        return result
+
+    def run_scanners(self, scanners, target, max_workers=None, progress=None,
+                     force_refresh=False, cancel=None, deadline=None, timings=None,
+                     on_result=None):
+        """Run several scanners against the same target concurrently
+
+        The scanners share the scan's deadline: each may run until its own
+        timeout or the deadline, whichever comes first, so scanners that
+        start late (beyond `max_workers`) get whatever time is left.
+        `on_result(scanner, result)` is called in this thread as each
+        scanner finishes.
+        """
+        if max_workers is None:
+            max_workers = config.SCANNER_CONCURRENCY
+        max_workers = max(1, min(max_workers, len(scanners)))
+
+        results = {}
+        if not scanners:
+            return results
+
+        # Each tool spends its time waiting on its own subprocess, so threads
+        # are enough to overlap them
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                scanner: executor.submit(
+                    self.run_scanner, scanner, target,
+                    progress=progress, force_refresh=force_refresh,
+                    cancel=cancel, deadline=deadline, timings=timings
+                )
+                for scanner in scanners
+            }
+            names = {future: scanner for scanner, future in futures.items()}
+            for future in as_completed(names):
+                scanner = names[future]
+                try:
+                    results[scanner] = future.result()
+                except Exception as e:
+                    results[scanner] = {'error': str(e), 'success': False}
+                if on_result:
+                    on_result(scanner, results[scanner])
+
+        # In the order asked for, as before
+        return {scanner: results[scanner] for scanner in scanners}
+
+    def _run_tool(self, scanner, cmd, timeout, progress=None, parse_line=None, cancel=None):
+        """Run a tool with streamed output, publishing progress as it goes
+
+        `parse_line` returns the findings completed by each output line.
+        Returns the finished StreamResult together with all findings.
+        """
+        findings = []
+        status = {'state': 'running', 'lines': 0, 'finding_count': 0, 'findings': []}
+
+        def publish(**changes):
+            status.update(changes)
+            if progress:
+                progress(scanner, dict(status, findings=findings[-PROGRESS_FINDINGS:]))
+
+        def on_line(line):
+            status['lines'] += 1
+            new_findings = parse_line(line) if parse_line else []
+            if new_findings:
+                findings.extend(new_findings)
+                publish(finding_count=len(findings))
+            elif status['lines'] % PROGRESS_EVERY_LINES == 0:
+                publish()
+
+        publish()
+        SUBPROCESSES.inc(scanner=scanner)
+        try:
+            result = run_streaming(
+                cmd, timeout, on_line=on_line, max_bytes=config.SCANNER_OUTPUT_LIMIT,
+                limits=self.resource_limits, cancel=cancel
+            )
+        except subprocess.TimeoutExpired:
+            publish(state='timeout')
+            raise
+        except ProcessCancelled:
+            publish(state='cancelled')
+            raise
+        except Exception:
+            publish(state='failed')
+            raise
+        finally:
+            SUBPROCESSES.dec(scanner=scanner)
+
+        publish(state='completed' if result.returncode == 0 else 'failed')
+        return result, findings
+
+    def run_nmap(self, target, progress=None, cancel=None, deadline=None):
         """Run Nmap scan"""
         try:
             # Basic Nmap scan with vulnerability scripts
-            cmd = ['nmap', '-sV', '--script', 'vuln', target]
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+            cmd = [self._tool_path('nmap'), *SCANNER_OPTIONS['nmap'], target]
+            parser = NmapXMLParser()
+            result, _ = self._run_tool(
+                'nmap', cmd, self._timeout('nmap', deadline), progress,
+                parse_line=lambda line: [
+                    finding for finding in parser.feed(line)
+                    if finding['vulnerable'] or finding['cves']
+                ],
+                cancel=cancel
+            )
+            parser.close()
             return {
-                'output': result.stdout,
-                'error': result.stderr,
+                'output': format_nmap_summary(parser.ports, parser.findings),
+                'error': result.stderr.text(),
+                'ports': parser.ports,
+                'findings': parser.findings,
+                'resources': result.usage,
                 'success': result.returncode == 0
             }
         except subprocess.TimeoutExpired:
             return {'error': 'Nmap scan timed out', 'success': False}
+        except ProcessCancelled:
+            return dict(CANCELLED_RESULT)
         except Exception as e:
             return {'error': str(e), 'success': False}
     
-    def run_nikto(self, target):
+    def run_nmap_group(self, targets, force_refresh=False, owner=None, background=True):
+        """Scan many hosts with grouped nmap runs, in a background thread by default
+
+        The hosts are claimed in the result cache first, so per-target scans
+        that ask for nmap meanwhile wait for the grouped run's result instead
+        of starting nmap themselves. A group's nmap is stopped once all the
+        scans waiting on it in this process were cancelled or reached their
+        deadlines. `owner` takes over hosts reserved in the shared tier (see
+        scan_cache.reserve). Returns the hosts that are scanned.
+        """
+        options = SCANNER_OPTIONS['nmap']
+        owned = self.result_cache.claim('nmap', targets, options, force_refresh, owner=owner)
+        if not owned:
+            return []
+
+        def run():
+            size = max(1, config.NMAP_GROUP_SIZE)
+            for start in range(0, len(owned), size):
+                chunk = owned[start:start + size]
+                results = {}
+                abandoned = self.result_cache.watch('nmap', chunk, options)
+                try:
+                    results = self.run_nmap_hosts(chunk, cancel=abandoned)
+                finally:
+                    self.result_cache.unwatch(abandoned)
+                    for target in chunk:
+                        self.result_cache.resolve('nmap', target, options, results.get(
+                            target, {'error': 'Nmap returned no result for this host',
+                                     'success': False}))
+
+        if background:
+            threading.Thread(target=run, name='nmap-group', daemon=True).start()
+        else:
+            run()
+        return owned
+
+    def run_nmap_hosts(self, targets, cancel=None):
+        """Run one Nmap scan over several hosts, split into per-host results"""
+        try:
+            cmd = [self._tool_path('nmap'), *SCANNER_OPTIONS['nmap'], *targets]
+            parser = NmapXMLParser()
+            timeout = SCANNER_TIMEOUTS['nmap'] + NMAP_GROUP_HOST_TIMEOUT * (len(targets) - 1)
+            result, _ = self._run_tool('nmap', cmd, timeout, parse_line=parser.feed,
+                                       cancel=cancel)
+            parser.close()
+        except subprocess.TimeoutExpired:
+            return {target: {'error': 'Nmap scan timed out', 'success': False}
+                    for target in targets}
+        except ProcessCancelled:
+            # Scans that ask for these hosts later run nmap themselves
+            return {target: dict(CANCELLED_RESULT) for target in targets}
+        except Exception as e:
+            return {target: {'error': str(e), 'success': False} for target in targets}
+
+        results = {}
+        for target in targets:
+            # Nmap reports a host by address, and by the name it was given
+            name = normalize_target(target)
+            def matches(record):
+                return name in (str(record['host']).lower(),
+                                str(record.get('hostname') or '').lower())
+            ports = [port for port in parser.ports if matches(port)]
+            findings = [finding for finding in parser.findings if matches(finding)]
+            results[target] = {
+                'output': format_nmap_summary(ports, findings),
+                'error': result.stderr.text(),
+                'ports': ports,
+                'findings': findings,
+                # One process scanned the whole group
+                'resources': dict(result.usage, grouped_hosts=len(targets)),
+                'success': result.returncode == 0
+            }
+        return results
+    
+    def run_nikto(self, target, progress=None, cancel=None, deadline=None):
         """Run Nikto web scanner"""
         try:
             # Ensure target has http:// prefix for Nikto
             if not target.startswith(('http://', 'https://')):
                 target = 'http://' + target
                 
-            cmd = ['nikto', '-h', target, '-Format', 'txt']
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+            cmd = [self._tool_path('nikto'), '-h', target, *SCANNER_OPTIONS['nikto']]
+            result, findings = self._run_tool(
+                'nikto', cmd, self._timeout('nikto', deadline), progress,
+                parse_line=_parse_nikto_line, cancel=cancel
+            )
             return {
-                'output': result.stdout,
-                'error': result.stderr,
+                'output': result.stdout.text(),
+                'error': result.stderr.text(),
+                'findings': findings,
+                'truncated': result.stdout.truncated,
+                'resources': result.usage,
                 'success': result.returncode == 0
             }
         except subprocess.TimeoutExpired:
             return {'error': 'Nikto scan timed out', 'success': False}
+        except ProcessCancelled:
+            return dict(CANCELLED_RESULT)
         except Exception as e:
             return {'error': str(e), 'success': False}
     
-    def run_whatweb(self, target):
+    def run_whatweb(self, target, progress=None, cancel=None, deadline=None):
         """Run WhatWeb technology detection"""
         try:
-            cmd = ['whatweb', target, '--log-verbose', '-']
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+            cmd = [self._tool_path('whatweb'), target, *SCANNER_OPTIONS['whatweb']]
+            result, _ = self._run_tool(
+                'whatweb', cmd, self._timeout('whatweb', deadline), progress, cancel=cancel
+            )
             return {
-                'output': result.stdout,
-                'error': result.stderr,
+                'output': result.stdout.text(),
+                'error': result.stderr.text(),
+                'resources': result.usage,
                 'success': result.returncode == 0
             }
+        except subprocess.TimeoutExpired:
+            return {'error': 'WhatWeb scan timed out', 'success': False}
+        except ProcessCancelled:
+            return dict(CANCELLED_RESULT)
         except Exception as e:
             return {'error': str(e), 'success': False}
     
-    def run_curl(self, target):
-        """Run curl for HTTP header analysis"""
+    def run_curl(self, target, progress=None, cancel=None, deadline=None):
+        """Probe HTTP headers with the pooled in-process client
+
+        A single probe is short, so a cancel is only checked before it starts.
+        """
+        if cancel is not None and cancel.is_set():
+            return dict(CANCELLED_RESULT)
+        status = {'state': 'running', 'lines': 0, 'finding_count': 0, 'findings': []}
+        if progress:
+            progress('curl', dict(status))
         try:
-            # Check various security headers
-            cmd = ['curl', '-I', '-L', target]
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
-            
-            # Also check SSL/TLS if HTTPS
-            headers = result.stdout
-            security_analysis = self._analyze_security_headers(headers)
-            
-            return {
-                'headers': headers,
-                'security_analysis': security_analysis,
-                'success': result.returncode == 0
-            }
+            probe = self.header_probe.probe(
+                target, timeout=self._timeout('curl', deadline, self.header_probe.timeout))
+        except requests.Timeout:
+            if progress:
+                progress('curl', dict(status, state='timeout'))
+            return {'error': 'Header probe timed out', 'success': False}
         except Exception as e:
+            if progress:
+                progress('curl', dict(status, state='failed'))
             return {'error': str(e), 'success': False}
-    
-    def _analyze_security_headers(self, headers):
-        """Analyze security headers from curl output"""
-        security_headers = {
-            'Strict-Transport-Security': 'HSTS is implemented - Good',
-            'Content-Security-Policy': 'CSP is implemented - Good',
-            'X-Frame-Options': 'Clickjacking protection - Good',
-            'X-Content-Type-Options': 'MIME sniffing protection - Good',
-            'X-XSS-Protection': 'XSS protection - Good'
-        }
-        
-        missing = []
-        present = []
-        
-        for header, description in security_headers.items():
-            if header.lower() in headers.lower():
-                present.append(description)
-            else:
-                missing.append(f"Missing {header}")
         
+        if progress:
+            progress('curl', dict(status, state='completed', lines=len(probe['headers'])))
         return {
-            'present': present,
-            'missing': missing,
-            'score': len(present) * 20  # Score out of 100
+            'headers': probe['raw'],
+            'header_map': probe['headers'],
+            'set_cookies': probe['set_cookies'],
+            'url': probe['url'],
+            'status_code': probe['status'],
+            'redirects': probe['redirects'],
+            'security_analysis': analyze_security_headers(
+                probe['headers'], probe['set_cookies'], probe['url']),
+            'success': True
         }
@@ -1,37 +1,86 @@
-from flask import Flask, render_template, request, jsonify, session
-import re
+from flask import Flask, render_template, request, jsonify, session, Response, stream_with_context, send_file
 import os
 import json
+import time
 from datetime import datetime
-import threading
-import subprocess
-import sys
-from scanners.scanner_manager import ScannerManager
-from google_sheets_logger import GoogleSheetsLogger
-from email_verifier import verify_gmail
-from report_generator import generate_professional_report
+from email_verifier import verify_gmail, GMAIL_PATTERN
+from report_model import build_report_model
+from report_renderers import RENDERERS
+from scan_scheduler import ScanScheduler, QueueFullError, PRIORITIES
+from job_queue import create_job_queue
+from result_store import strip_outputs, TERMINAL_STATUSES
+from scan_events import FINAL_EVENTS
+from scan_runner import (scanner_manager, scan_results, report_service, scan_events_bus,
+                         scan_cancel_event, start_prewarm, mark_cancelled, new_scan_record,
+                         run_scan, nmap_group_jobs, cancel_nmap_group_jobs)
+from metrics import REGISTRY, CONTENT_TYPE, REPORT_SECONDS
+from target_expansion import expand_targets, TargetError
+import config
 import secrets
 
 app = Flask(__name__)
 app.secret_key = secrets.token_hex(16)
 
-# Initialize components
-scanner_manager = ScannerManager()
-sheets_logger = GoogleSheetsLogger()
+if config.SCAN_EXECUTION == 'queue':
+    # Scans are only enqueued here; worker.py processes run them
+    scan_scheduler = create_job_queue(config)
+else:
+    # Bounded worker pool that runs queued scans
+    scan_scheduler = ScanScheduler(
+        run_scan,
+        workers=config.SCAN_WORKERS,
+        max_queue=config.SCAN_QUEUE_SIZE,
+        per_user_limit=config.SCAN_PER_USER_LIMIT,
+        bulk_workers=config.SCAN_BULK_WORKERS
+    )
+    # Scans queued or running in this app's previous run died with it
+    interrupted = scan_results.fail_unfinished('Interrupted by a restart of the scan server')
+    if interrupted:
+        print(f"Marked {interrupted} interrupted scans as failed")
+    start_prewarm()
+
+# Queue depth and busy workers, read from the scheduler at scrape time
+REGISTRY.gauge(
+    'webscan_scan_queue_depth', 'Scans waiting for a worker', ['priority'],
+    function=lambda: {(priority,): count for priority, count
+                      in scan_scheduler.stats()['queued_by_priority'].items()})
+REGISTRY.gauge(
+    'webscan_scans_running', 'Scans running on a worker',
+    function=lambda: scan_scheduler.stats()['running'])
 
-# Store scan results temporarily
-scan_results = {}
+def scan_limits(data, default_priority):
+    """Priority class and deadline (seconds) requested for a scan"""
+    priority = data.get('priority') or default_priority
+    if priority not in PRIORITIES:
+        raise ValueError(f"priority must be one of: {', '.join(PRIORITIES)}")
+    deadline = data.get('deadline')
+    if deadline in (None, ''):
+        return priority, config.SCAN_DEADLINE
+    try:
+        deadline = int(deadline)
+    except (TypeError, ValueError):
+        raise ValueError('deadline must be a number of seconds')
+    if deadline <= 0:
+        raise ValueError('deadline must be a number of seconds')
+    return priority, min(deadline, config.SCAN_DEADLINE)
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics in the text exposition format"""
+    if not config.METRICS_ENABLED:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
 @app.route('/verify_email', methods=['POST'])
 def verify_email():
     data = request.json
     email = data.get('email')
     
-    if not email or not re.match(r'^[a-zA-Z0-9._%+-]+@gmail\.com$', email):
+    if not email or not GMAIL_PATTERN.match(email):
         return jsonify({'valid': False, 'message': 'Invalid Gmail ID format'})
     
     # Verify Gmail exists (using Google's API or verification service)
@@ -48,11 +97,12 @@ def check_scanner():
     data = request.json
     scanner_type = data.get('scanner_type')
     
-    # Check if scanner is installed
-    is_installed = scanner_manager.check_scanner_installed(scanner_type)
+    # Check if scanner is installed (served from the tool registry)
+    info = scanner_manager.scanner_info(scanner_type)
     
     return jsonify({
-        'installed': is_installed,
+        'installed': bool(info and info['path']),
+        'version': info['version'] if info else None,
         'scanner': scanner_type
     })
 
@@ -64,103 +114,309 @@ def scan():
     data = request.json
     scan_type = data.get('scan_type')
     target = data.get('target')
+    force_refresh = bool(data.get('force_refresh', False))
+    quick_delta = bool(data.get('quick_delta', False))
     gmail = session['gmail']
     
     # Validate target
     if not target:
         return jsonify({'error': 'Target URL/IP is required'}), 400
+    try:
+        priority, deadline = scan_limits(data, 'interactive')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    # Start scan in background thread
+    # Queue the scan for the worker pool
     scan_id = secrets.token_hex(8)
-    thread = threading.Thread(
-        target=run_scan,
-        args=(scan_id, scan_type, target, gmail)
-    )
-    thread.daemon = True
-    thread.start()
+    scan_results.save(new_scan_record(scan_id, scan_type, target, gmail,
+                                      priority=priority))
+    try:
+        scan_scheduler.submit(scan_id, gmail, scan_type, target, gmail, force_refresh,
+                              quick_delta, deadline, priority=priority)
+    except QueueFullError as e:
+        scan_results.delete(scan_id)
+        return jsonify({'error': str(e)}), 503
+    scan_events_bus.publish(scan_id, 'status', {
+        'status': 'queued',
+        'queue_position': scan_scheduler.position(scan_id)
+    })
     
     return jsonify({
         'scan_id': scan_id,
-        'message': 'Scan started successfully'
+        'message': 'Scan queued successfully',
+        'queue_position': scan_scheduler.position(scan_id)
     })
 
-def run_scan(scan_id, scan_type, target, gmail):
-    """Run the actual scan"""
+@app.route('/scan_batch', methods=['POST'])
+def start_scan_batch():
+    if 'gmail' not in session:
+        return jsonify({'error': 'Please verify your Gmail first'}), 401
+    
+    # JSON body, or a form with an uploaded hostname file
+    data = request.get_json(silent=True) or request.form
+    scan_type = data.get('scan_type')
+    if isinstance(scan_type, str) and scan_type.isdigit():
+        scan_type = int(scan_type)
+    force_refresh = str(data.get('force_refresh', '')).lower() in ('1', 'true', 'on')
+    quick_delta = str(data.get('quick_delta', '')).lower() in ('1', 'true', 'on')
+    gmail = session['gmail']
     try:
-        # Initialize results
-        results = {
-            'scan_id': scan_id,
-            'timestamp': datetime.now().isoformat(),
-            'target': target,
-            'scan_type': scan_type,
-            'gmail': gmail,
-            'status': 'running',
-            'results': {},
-            'vulnerabilities': []
-        }
-        
-        scan_results[scan_id] = results
-        
-        # Check and install required scanners
-        scanner_manager.ensure_scanners(scan_type)
-        
-        # Run the scan based on type
-        if scan_type == 'all' or scan_type == 1:
-            results['results']['nmap'] = scanner_manager.run_nmap(target)
-            results['results']['nikto'] = scanner_manager.run_nikto(target)
-            results['results']['whatweb'] = scanner_manager.run_whatweb(target)
-            results['results']['curl'] = scanner_manager.run_curl(target)
-        else:
-            scanner_map = {
-                2: 'nmap',
-                3: 'nikto',
-                4: 'curl',
-                5: 'whatweb'
-            }
-            scanner_name = scanner_map.get(scan_type)
-            if scanner_name:
-                method = getattr(scanner_manager, f'run_{scanner_name}')
-                results['results'][scanner_name] = method(target)
-        
-        # Analyze vulnerabilities
-        results['vulnerabilities'] = analyze_vulnerabilities(results['results'])
-        
-        # Determine overall vulnerability stage
-        results['vuln_stage'] = determine_vuln_stage(results['vulnerabilities'])
-        
-        # Generate professional report
-        report_path = generate_professional_report(results)
-        results['report_path'] = report_path
-        
-        # Log to Google Sheets
-        sheets_logger.log_scan({
-            'timestamp': results['timestamp'],
-            'gmail': gmail,
-            'scan_type': scan_type,
-            'target': target,
-            'vuln_stage': results['vuln_stage']
-        })
-        
-        results['status'] = 'completed'
-        scan_results[scan_id] = results
-        
-    except Exception as e:
-        results['status'] = 'failed'
-        results['error'] = str(e)
-        scan_results[scan_id] = results
+        priority, deadline = scan_limits(data, 'bulk')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    entries = data.get('targets') or []
+    if isinstance(entries, str):
+        entries = [entries]
+    uploaded = request.files.get('targets_file')
+    if uploaded:
+        entries = list(entries) + [uploaded.read().decode('utf-8', errors='replace')]
+    
+    # Expand lists and CIDR ranges into single targets
+    try:
+        targets, duplicates = expand_targets(entries, max_targets=config.BATCH_MAX_TARGETS)
+    except TargetError as e:
+        return jsonify({'error': str(e)}), 400
+    if not targets:
+        return jsonify({'error': 'At least one target is required'}), 400
+    
+    batch_id = secrets.token_hex(8)
+    scans = [(secrets.token_hex(8), target) for target in targets]
+    for scan_id, target in scans:
+        scan_results.save(new_scan_record(scan_id, scan_type, target, gmail, batch_id,
+                                          priority))
+    
+    # One nmap process per group of hosts instead of one per target. Worker
+    # processes run the groups as jobs queued ahead of the scans, and share
+    # the results through the shared scan cache.
+    group_jobs = []
+    if scan_type in ('all', 1, 2) and len(targets) > 1:
+        if config.SCAN_EXECUTION == 'queue':
+            group_jobs = nmap_group_jobs(targets, gmail, force_refresh)
+        elif scanner_manager.check_scanner_installed('nmap'):
+            scanner_manager.run_nmap_group(targets, force_refresh=force_refresh)
+    
+    try:
+        scan_scheduler.submit_many(group_jobs + [
+            (scan_id, gmail, (scan_type, target, gmail, force_refresh, quick_delta, deadline))
+            for scan_id, target in scans
+        ], priority=priority)
+    except QueueFullError as e:
+        cancel_nmap_group_jobs(group_jobs)
+        for scan_id, _ in scans:
+            scan_results.delete(scan_id)
+        return jsonify({'error': str(e)}), 503
+    for scan_id, _ in scans:
+        scan_events_bus.publish(scan_id, 'status', {'status': 'queued'})
+    
+    # Kept next to the scan records, so any app process can report on it
+    scan_results.save_batch({
+        'batch_id': batch_id,
+        'timestamp': datetime.now().isoformat(),
+        'gmail': gmail,
+        'scan_type': scan_type,
+        'scans': [{'scan_id': scan_id, 'target': target} for scan_id, target in scans]
+    })
+    
+    return jsonify({
+        'batch_id': batch_id,
+        'message': f'{len(scans)} scans queued successfully',
+        'targets': len(scans),
+        'duplicates_removed': duplicates,
+        'scans': [{'scan_id': scan_id, 'target': target} for scan_id, target in scans]
+    })
+
+@app.route('/batch_status/<batch_id>')
+def batch_status(batch_id):
+    batch = scan_results.get_batch(batch_id)
+    if batch is None:
+        return jsonify({'error': 'Batch not found'}), 404
+    
+    # Aggregate progress over the batch's scans, without raw outputs
+    counts = {'queued': 0, 'running': 0, 'completed': 0, 'failed': 0, 'cancelled': 0}
+    stages = {}
+    scans = []
+    for scan in batch['scans']:
+        record = scan_results.get(scan['scan_id'], include_outputs=False) or {}
+        status = record.get('status', 'failed')
+        counts[status] = counts.get(status, 0) + 1
+        entry = dict(scan, status=status)
+        if record.get('vuln_stage'):
+            entry['vuln_stage'] = record['vuln_stage']
+            stages[record['vuln_stage']] = stages.get(record['vuln_stage'], 0) + 1
+        scans.append(entry)
+    
+    total = len(scans)
+    finished = sum(counts.get(status, 0) for status in TERMINAL_STATUSES)
+    return jsonify(dict(
+        batch,
+        scans=scans,
+        total=total,
+        counts=counts,
+        vuln_stages=stages,
+        progress=round(100 * finished / total) if total else 100,
+        status='completed' if finished == total else 'running'
+    ))
+
+@app.route('/scan_cancel/<scan_id>', methods=['POST'])
+def scan_cancel(scan_id):
+    """Cancel a queued or running scan
+
+    A queued scan is taken off the queue; a running one has its scanner
+    processes killed, which frees its worker as soon as they are gone.
+    """
+    record = scan_results.get(scan_id)
+    if record is None:
+        return jsonify({'error': 'Scan not found'}), 404
+    if record.get('gmail') != session.get('gmail'):
+        return jsonify({'error': 'Only the user who started a scan can cancel it'}), 403
+    if record.get('status') in TERMINAL_STATUSES:
+        return jsonify({'error': f"Scan already {record['status']}",
+                        'status': record['status']}), 409
+    
+    if scan_scheduler.cancel(scan_id):
+        mark_cancelled(record)
+        return jsonify({'scan_id': scan_id, 'status': 'cancelled'})
+    
+    # Running (or just picked up by a worker): run_scan finishes it off.
+    # A queued job was flagged by cancel() for its worker.py process.
+    if config.SCAN_EXECUTION == 'local':
+        scan_cancel_event(scan_id).set()
+    return jsonify({'scan_id': scan_id, 'status': 'cancelling'}), 202
+
+def status_record(scan_id, summary=False):
+    """A scan's record as /scan_status returns it, or None if it is unknown"""
+    record = scan_results.get(scan_id, include_outputs=not summary)
+    if record is None:
+        return None
+    if summary:
+        record = strip_outputs(record)[0]
+    if record.get('status') == 'queued':
+        record = dict(record, queue_position=scan_scheduler.position(scan_id))
+    return record
 
 @app.route('/scan_status/<scan_id>')
 def scan_status(scan_id):
-    if scan_id in scan_results:
-        return jsonify(scan_results[scan_id])
+    # ?view=summary leaves out the raw scanner outputs
+    record = status_record(scan_id, summary=request.args.get('view') == 'summary')
+    if record is not None:
+        return jsonify(record)
     return jsonify({'error': 'Scan not found'}), 404
 
+def scan_snapshot(scan_id):
+    """Current scan state as a 'snapshot' event, without raw outputs"""
+    channel = scan_events_bus.channel(scan_id, create=True)
+    last_id = channel.last_id
+    record = strip_outputs(scan_results.get(scan_id, include_outputs=False))[0]
+    if record.get('status') == 'queued':
+        record['queue_position'] = scan_scheduler.position(scan_id)
+    return {'id': last_id, 'event': 'snapshot', 'data': record}
+
+def needs_snapshot(scan_id, since):
+    """Whether a client resuming after event `since` has missed events
+
+    A client already holding the final event of a finished scan gets the
+    snapshot too: nothing more will be published, and the snapshot's final
+    status ends its stream.
+    """
+    channel = scan_events_bus.channel(scan_id)
+    if since is None or channel is None:
+        return True
+    if since >= channel.last_id and channel.closed:
+        return True
+    oldest = channel.events[0]['id'] if channel.events else channel.last_id + 1
+    return oldest > since + 1 or since > channel.last_id
+
+def format_sse(event):
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+def stream_scan_events(scan_id, since):
+    """Server-Sent Events for one scan, ending after its final event"""
+    yield 'retry: 3000\n\n'
+    if needs_snapshot(scan_id, since):
+        snapshot = scan_snapshot(scan_id)
+        yield format_sse(snapshot)
+        if snapshot['data']['status'] in FINAL_EVENTS:
+            return
+        since = snapshot['id']
+    
+    channel = scan_events_bus.channel(scan_id, create=True)
+    queue_position = None
+    while True:
+        events = channel.wait(since, config.SSE_KEEPALIVE)
+        if not events:
+            if channel.closed:
+                return
+            # Queue positions move as other scans start, so push them here
+            position = scan_scheduler.position(scan_id)
+            if position is not None and position != queue_position:
+                queue_position = position
+                yield format_sse({'id': since, 'event': 'status', 'data': {
+                    'status': 'queued', 'queue_position': position}})
+            else:
+                yield ': keepalive\n\n'
+            continue
+        for event in events:
+            yield format_sse(event)
+            since = event['id']
+            if event['event'] in FINAL_EVENTS:
+                return
+
+@app.route('/scan_events/<scan_id>')
+def scan_events(scan_id):
+    """Push scan status changes as SSE, or long-poll with ?mode=poll"""
+    if scan_id not in scan_results:
+        return jsonify({'error': 'Scan not found'}), 404
+    
+    since = request.args.get('since', type=int)
+    if since is None:
+        since = request.headers.get('Last-Event-ID', type=int)
+    
+    if request.args.get('mode') == 'poll':
+        if needs_snapshot(scan_id, since):
+            snapshot = scan_snapshot(scan_id)
+            return jsonify({'events': [snapshot], 'last_id': snapshot['id']})
+        channel = scan_events_bus.channel(scan_id)
+        events = channel.wait(since, config.LONG_POLL_TIMEOUT)
+        return jsonify({
+            'events': events,
+            'last_id': events[-1]['id'] if events else since
+        })
+    
+    return Response(
+        stream_with_context(stream_scan_events(scan_id, since)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/download_report/<scan_id>')
 def download_report(scan_id):
-    if scan_id in scan_results:
-        report_path = scan_results[scan_id].get('report_path')
-        if report_path and os.path.exists(report_path):
-            return send_file(report_path, as_attachment=True)
+    # ?format= picks the renderer: pdf (default), html, json or sarif
+    report_format = request.args.get('format', 'pdf').lower()
+    if report_format != 'pdf' and report_format not in RENDERERS:
+        return jsonify({'error': f'Unsupported report format: {report_format}'}), 400
+    
+    record = scan_results.get(scan_id)
+    if record is not None and record.get('status') == 'completed':
+        if report_format in RENDERERS:
+            renderer = RENDERERS[report_format]
+            # Chunked renderers (HTML) do their work while the body streams
+            started = time.perf_counter()
+            body = REPORT_SECONDS.observe_body(
+                renderer.render(build_report_model(record)), started, format=report_format)
+            return Response(
+                body,
+                mimetype=renderer.mimetype,
+                headers={'Content-Disposition':
+                         f'attachment; filename=security_scan_{scan_id}.{renderer.extension}'}
+            )
+        try:
+            with REPORT_SECONDS.time(format='pdf'):
+                report_path = report_service.render(record)
+        except Exception as e:
+            return jsonify({'error': f'Failed to generate report: {e}'}), 500
+        return send_file(os.path.abspath(report_path), as_attachment=True,
+                         download_name=f'security_scan_{scan_id}.pdf')
     return jsonify({'error': 'Report not found'}), 404
 
 if __name__ == '__main__':
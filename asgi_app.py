@@ -0,0 +1,219 @@
+"""Async serving mode: the waiting-heavy endpoints on an ASGI event loop
+
+/scan_status, /scan_events (long-poll and SSE), /download_report and
+/verify_email are served here as coroutines, so a held connection costs a
+suspended task instead of a server thread. Every other route is the Flask
+app, mounted through a WSGI adapter in the same process, so both share the
+scan scheduler, the stores and the session cookie.
+
+    pip install starlette uvicorn a2wsgi
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+
+Run a single process per host (as with app.py): the in-process scan queue
+and the session secret are per process. benchmarks/bench_async_tier.py
+compares this mode with the threaded Flask server.
+"""
+import os
+import time
+
+from a2wsgi import WSGIMiddleware
+from itsdangerous import BadSignature
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+from app import (app as flask_app, scan_scheduler, status_record, scan_snapshot,
+                 needs_snapshot, format_sse)
+from email_verifier import verify_gmail_async, GMAIL_PATTERN
+from report_model import build_report_model
+from report_renderers import RENDERERS
+from scan_events import FINAL_EVENTS
+from scan_runner import scan_results, report_service, scan_events_bus
+from metrics import REPORT_SECONDS
+import config
+
+
+def json_response(data, status_code=200):
+    # Flask's encoder, so both tiers return the same JSON
+    return Response(flask_app.json.dumps(data), status_code=status_code,
+                    media_type='application/json')
+
+
+def load_session(request):
+    """The Flask session carried by a request's cookie"""
+    interface = flask_app.session_interface
+    cookie = request.cookies.get(interface.get_cookie_name(flask_app))
+    if not cookie:
+        return {}
+    try:
+        return interface.get_signing_serializer(flask_app).loads(
+            cookie, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return {}
+
+
+def save_session(response, data):
+    """Set the Flask session cookie, readable by the mounted Flask routes"""
+    interface = flask_app.session_interface
+    response.set_cookie(
+        interface.get_cookie_name(flask_app),
+        interface.get_signing_serializer(flask_app).dumps(dict(data)),
+        path=interface.get_cookie_path(flask_app),
+        domain=interface.get_cookie_domain(flask_app),
+        secure=interface.get_cookie_secure(flask_app),
+        httponly=interface.get_cookie_httponly(flask_app),
+        samesite=(interface.get_cookie_samesite(flask_app) or '').lower() or None
+    )
+
+
+async def verify_email(request):
+    data = await request.json()
+    email = data.get('email')
+
+    if not email or not GMAIL_PATTERN.match(email):
+        return JSONResponse({'valid': False, 'message': 'Invalid Gmail ID format'})
+
+    # MX lookup through dns.asyncresolver; cached like the sync path
+    if not await verify_gmail_async(email):
+        return JSONResponse({'valid': False,
+                             'message': 'Gmail ID does not exist or cannot be verified'})
+
+    response = JSONResponse({'valid': True, 'message': 'Email verified successfully'})
+    save_session(response, dict(load_session(request), gmail=email))
+    return response
+
+
+async def scan_status(request):
+    scan_id = request.path_params['scan_id']
+    summary = request.query_params.get('view') == 'summary'
+
+    # Store reads and encoding of large records stay off the event loop
+    def body():
+        record = status_record(scan_id, summary=summary)
+        return None if record is None else flask_app.json.dumps(record)
+
+    encoded = await run_in_threadpool(body)
+    if encoded is None:
+        return JSONResponse({'error': 'Scan not found'}, status_code=404)
+    return Response(encoded, media_type='application/json')
+
+
+async def stream_scan_events(scan_id, since):
+    """stream_scan_events() of app.py, waiting on the event loop"""
+    yield 'retry: 3000\n\n'
+    if await run_in_threadpool(needs_snapshot, scan_id, since):
+        snapshot = await run_in_threadpool(scan_snapshot, scan_id)
+        yield format_sse(snapshot)
+        if snapshot['data']['status'] in FINAL_EVENTS:
+            return
+        since = snapshot['id']
+
+    channel = scan_events_bus.channel(scan_id, create=True)
+    queue_position = None
+    while True:
+        events = await channel.wait_async(since, config.SSE_KEEPALIVE)
+        if not events:
+            if await run_in_threadpool(lambda: channel.closed):
+                return
+            # Queue positions move as other scans start, so push them here
+            position = await run_in_threadpool(scan_scheduler.position, scan_id)
+            if position is not None and position != queue_position:
+                queue_position = position
+                yield format_sse({'id': since, 'event': 'status', 'data': {
+                    'status': 'queued', 'queue_position': position}})
+            else:
+                yield ': keepalive\n\n'
+            continue
+        for event in events:
+            yield format_sse(event)
+            since = event['id']
+            if event['event'] in FINAL_EVENTS:
+                return
+
+
+def event_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+async def scan_events(request):
+    """Push scan status changes as SSE, or long-poll with ?mode=poll"""
+    scan_id = request.path_params['scan_id']
+    if not await run_in_threadpool(scan_results.__contains__, scan_id):
+        return JSONResponse({'error': 'Scan not found'}, status_code=404)
+
+    since = event_id(request.query_params.get('since'))
+    if since is None:
+        since = event_id(request.headers.get('Last-Event-ID'))
+
+    if request.query_params.get('mode') == 'poll':
+        if await run_in_threadpool(needs_snapshot, scan_id, since):
+            snapshot = await run_in_threadpool(scan_snapshot, scan_id)
+            return json_response({'events': [snapshot], 'last_id': snapshot['id']})
+        channel = scan_events_bus.channel(scan_id, create=True)
+        events = await channel.wait_async(since, config.LONG_POLL_TIMEOUT)
+        return json_response({
+            'events': events,
+            'last_id': events[-1]['id'] if events else since
+        })
+
+    return StreamingResponse(
+        stream_scan_events(scan_id, since),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+async def download_report(request):
+    scan_id = request.path_params['scan_id']
+    # ?format= picks the renderer: pdf (default), html, json or sarif
+    report_format = request.query_params.get('format', 'pdf').lower()
+    if report_format != 'pdf' and report_format not in RENDERERS:
+        return JSONResponse({'error': f'Unsupported report format: {report_format}'},
+                            status_code=400)
+
+    record = await run_in_threadpool(scan_results.get, scan_id)
+    if record is None or record.get('status') != 'completed':
+        return JSONResponse({'error': 'Report not found'}, status_code=404)
+
+    if report_format in RENDERERS:
+        renderer = RENDERERS[report_format]
+        started = time.perf_counter()
+        body = await run_in_threadpool(lambda: renderer.render(build_report_model(record)))
+        # Chunked renderers (HTML) do their work while the body streams
+        body = REPORT_SECONDS.observe_body(body, started, format=report_format)
+        if isinstance(body, (str, bytes)):
+            body = [body]
+        # Chunked renderers (HTML) are iterated on the thread pool as they stream
+        return StreamingResponse(
+            body,
+            media_type=renderer.mimetype,
+            headers={'Content-Disposition':
+                     f'attachment; filename=security_scan_{scan_id}.{renderer.extension}'}
+        )
+    try:
+        # Awaits the render process pool; the file is then streamed in chunks
+        with REPORT_SECONDS.time(format='pdf'):
+            report_path = await report_service.render_async(record)
+    except Exception as e:
+        return JSONResponse({'error': f'Failed to generate report: {e}'}, status_code=500)
+    return FileResponse(os.path.abspath(report_path), media_type='application/pdf',
+                        filename=f'security_scan_{scan_id}.pdf')
+
+
+app = Starlette(routes=[
+    Route('/verify_email', verify_email, methods=['POST']),
+    Route('/scan_status/{scan_id}', scan_status),
+    Route('/scan_events/{scan_id}', scan_events),
+    Route('/download_report/{scan_id}', download_report),
+    # Everything else: the Flask routes, run on a small thread pool
+    Mount('/', app=WSGIMiddleware(flask_app)),
+])
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=5000)
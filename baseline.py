@@ -0,0 +1,253 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from report_model import finding_id
+from scan_cache import normalize_target
+
+# Cheap scanners whose output decides whether a quick delta scan may skip
+# the slow ones
+QUICK_PROBES = ('curl', 'whatweb')
+
+# Response headers tracked between scans; volatile ones (Date, cookies)
+# would make every rescan look changed
+TRACKED_HEADERS = (
+    'strict-transport-security', 'content-security-policy', 'x-frame-options',
+    'x-content-type-options', 'x-xss-protection', 'referrer-policy',
+    'permissions-policy', 'server', 'x-powered-by', 'etag', 'last-modified',
+    'content-type', 'location',
+)
+
+# Lines of whatweb output that change on every run
+WHATWEB_VOLATILE = re.compile(r'^\s*(Date|Expires|Set-Cookie|Age)\b.*$', re.IGNORECASE | re.MULTILINE)
+
+
+def _digest(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def parse_headers(text):
+    """Headers of the last response in curl -I -L output, keyed by lower-case name"""
+    headers = {}
+    for line in (text or '').splitlines():
+        if line.startswith('HTTP/'):
+            # A new response after a redirect
+            headers = {}
+        elif ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+    return headers
+
+
+def scanner_fingerprints(scanner, result):
+    """{key: {'label', 'digest'}} items describing one scanner's result"""
+    items = {}
+    if scanner == 'nmap':
+        for port in result.get('ports', []):
+            key = f"port:{port['host']}:{port['port']}/{port['protocol']}"
+            items[key] = {
+                'label': f"{port['host']} {port['port']}/{port['protocol']} {port.get('state')}",
+                'digest': _digest([port.get('state'), port.get('service'),
+                                   port.get('product'), port.get('version')]),
+            }
+        for finding in result.get('findings', []):
+            where = finding['port'] or 'host'
+            key = f"script:{finding['host']}:{where}:{finding['script']}"
+            items[key] = {
+                'label': f"{finding['host']} {where} {finding['script']}",
+                'digest': _digest([finding['vulnerable'],
+                                   sorted(cve['id'] for cve in finding['cves'])]),
+            }
+    elif scanner == 'nikto':
+        findings = result.get('findings')
+        if findings is None:
+            findings = [line for line in (result.get('output') or '').splitlines()
+                        if line.startswith('+ ')]
+        for line in findings:
+            # Numbers (inodes, sizes, timings) differ between runs of the same item
+            key = 'nikto:' + _digest(re.sub(r'\d+', '#', line))
+            items[key] = {'label': line, 'digest': key}
+    elif scanner == 'curl':
+        headers = result.get('header_map') or parse_headers(result.get('headers'))
+        for name in TRACKED_HEADERS:
+            if name in headers:
+                items[f'header:{name}'] = {
+                    'label': f'{name}: {headers[name]}', 'digest': _digest(headers[name])
+                }
+    elif scanner == 'whatweb':
+        output = WHATWEB_VOLATILE.sub('', result.get('output') or '')
+        items['whatweb'] = {'label': 'WhatWeb fingerprint', 'digest': _digest(output.split())}
+    return items
+
+
+def fingerprint_scan(results, vulnerabilities):
+    """Fingerprints of every successful scanner result and of the findings"""
+    return {
+        'scanners': {
+            scanner: scanner_fingerprints(scanner, result)
+            for scanner, result in results.items() if result.get('success')
+        },
+        'findings': {
+            finding_id(vuln): {'label': vuln.get('title', ''),
+                               'digest': _digest(vuln.get('severity'))}
+            for vuln in vulnerabilities
+        },
+    }
+
+
+def probe_signature(fingerprints):
+    """Digest per quick probe scanner, compared to decide on a quick delta"""
+    return {
+        scanner: _digest(items)
+        for scanner, items in fingerprints['scanners'].items() if scanner in QUICK_PROBES
+    }
+
+
+def _diff_items(before, after):
+    new = [dict(after[key], key=key) for key in after if key not in before]
+    resolved = [dict(before[key], key=key) for key in before if key not in after]
+    changed = [
+        {'key': key, 'label': after[key]['label'], 'before': before[key]['label']}
+        for key in after if key in before and before[key]['digest'] != after[key]['digest']
+    ]
+    return new, resolved, changed
+
+
+def diff_fingerprints(baseline, current):
+    """New, resolved and changed items of a scan compared to its baseline
+
+    Only scanners that succeeded in both scans are compared. Findings are
+    compared when both scans ran the same scanners, since a scanner missing
+    from one side would otherwise show up as resolved findings.
+    """
+    before = baseline['fingerprints']
+    compared = sorted(set(before['scanners']) & set(current['scanners']))
+
+    delta = {
+        'baseline_scan_id': baseline.get('scan_id'),
+        'baseline_timestamp': baseline.get('timestamp'),
+        'scanners_compared': compared,
+        'new': [], 'resolved': [], 'changed': [],
+        'findings': None,
+    }
+    for scanner in compared:
+        new, resolved, changed = _diff_items(
+            before['scanners'][scanner], current['scanners'][scanner])
+        delta['new'].extend(dict(item, scanner=scanner) for item in new)
+        delta['resolved'].extend(dict(item, scanner=scanner) for item in resolved)
+        delta['changed'].extend(dict(item, scanner=scanner) for item in changed)
+
+    if set(before['scanners']) == set(current['scanners']):
+        new, resolved, changed = _diff_items(before['findings'], current['findings'])
+        delta['findings'] = {'new': new, 'resolved': resolved, 'changed': changed}
+
+    delta['unchanged'] = not (delta['new'] or delta['resolved'] or delta['changed'])
+    return delta
+
+
+def merge_fingerprints(baseline, current):
+    """Baseline fingerprints updated with a new scan
+
+    Scanners that failed this time keep their previous items.
+    """
+    scanners = dict(baseline['fingerprints']['scanners']) if baseline else {}
+    scanners.update(current['scanners'])
+    return {'scanners': scanners, 'findings': current['findings']}
+
+
+class BaselineStore:
+    """Latest fingerprints per (target, scan type)
+
+    Kept in an SQLite table next to the scan records, or in memory when
+    `path` is None.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._memory = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._connect() as conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS baselines (
+                        target TEXT,
+                        scan_type TEXT,
+                        updated_at REAL,
+                        baseline TEXT NOT NULL,
+                        PRIMARY KEY (target, scan_type)
+                    )
+                """)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def _key(self, target, scan_type):
+        return normalize_target(target), str(scan_type)
+
+    def get(self, target, scan_type):
+        key = self._key(target, scan_type)
+        if not self.path:
+            with self._lock:
+                data = self._memory.get(key)
+        else:
+            row = self._connect().execute(
+                'SELECT baseline FROM baselines WHERE target = ? AND scan_type = ?', key
+            ).fetchone()
+            data = row[0] if row else None
+        return json.loads(data) if data else None
+
+    def save(self, target, scan_type, baseline):
+        key = self._key(target, scan_type)
+        data = json.dumps(baseline)
+        if not self.path:
+            with self._lock:
+                self._memory[key] = data
+            return
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO baselines (target, scan_type, updated_at, baseline) '
+                'VALUES (?, ?, ?, ?)',
+                key + (time.time(), data)
+            )
+
+
+class RedisBaselineStore:
+    """Latest fingerprints per (target, scan type) in Redis; same interface as BaselineStore"""
+
+    def __init__(self, url, prefix='webscan'):
+        import redis
+
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+
+    def _key(self, target, scan_type):
+        return f'{self.prefix}:baseline:{scan_type}:{normalize_target(target)}'
+
+    def get(self, target, scan_type):
+        data = self.redis.get(self._key(target, scan_type))
+        return json.loads(data) if data else None
+
+    def save(self, target, scan_type, baseline):
+        self.redis.set(self._key(target, scan_type), json.dumps(baseline))
+
+
+def create_baseline_store(settings):
+    """Baseline store sharing the result store's database"""
+    if settings.RESULT_STORE_BACKEND == 'memory':
+        return BaselineStore()
+    if settings.RESULT_STORE_BACKEND == 'redis':
+        return RedisBaselineStore(settings.RESULT_REDIS_URL)
+    return BaselineStore(settings.RESULT_DB_PATH)
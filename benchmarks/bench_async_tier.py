@@ -0,0 +1,282 @@
+"""Benchmark the sync (threaded Flask) and async (asgi_app.py) serving modes
+
+Starts the app in each mode, parks a scan in the queue and holds N
+concurrent /scan_events long-polls on it, the way status pages wait for
+updates. While they are held it measures /scan_status, /download_report
+(JSON) and /verify_email latencies, and reads the server's RSS and thread
+count. Then it checks how many of the long-polls were answered.
+
+    python benchmarks/bench_async_tier.py [--connections 1000] [--hold 20]
+    python benchmarks/bench_async_tier.py --mode async --json async.json
+
+The async mode needs starlette, uvicorn and a2wsgi. Nothing leaves the
+machine: the parked scans run the stand-in scanners of fake_scanner.py.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from bench_scan_load import install_fake_tools, peak_rss_kb, summarize, git_commit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Serve on an ephemeral port and print it for the benchmark
+SERVER_CODE = {
+    'sync': """
+import sys
+sys.path.insert(0, sys.argv[1])
+from werkzeug.serving import make_server
+import app
+server = make_server('127.0.0.1', 0, app.app, threaded=True)
+print(server.server_port, flush=True)
+server.serve_forever()
+""",
+    'async': """
+import socket, sys
+sys.path.insert(0, sys.argv[1])
+import uvicorn
+import asgi_app
+sock = socket.socket()
+# A passed-in socket misses the TCP_NODELAY uvicorn's own listener gets;
+# without it every keep-alive response waits out a delayed ACK
+sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+sock.bind(('127.0.0.1', 0))
+sock.listen(4096)
+print(sock.getsockname()[1], flush=True)
+uvicorn.Server(uvicorn.Config(asgi_app.app, log_level='warning', backlog=4096)).run(sockets=[sock])
+""",
+}
+
+
+def proc_status(pid):
+    """VmRSS (kB) and thread count of a process, from /proc (Linux only)"""
+    values = {}
+    try:
+        with open(f'/proc/{pid}/status', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith(('VmRSS:', 'Threads:')):
+                    values[line.split(':')[0]] = int(line.split()[1])
+    except OSError:
+        pass
+    return values.get('VmRSS'), values.get('Threads')
+
+
+def start_app(mode, workdir, bin_dir, hold):
+    env = dict(os.environ)
+    env.update({
+        'PATH': bin_dir + os.pathsep + env.get('PATH', ''),
+        'WEBSCAN_SCANNER_AUTO_INSTALL': '0',
+        # One scan worker, busy with a slow nikto, keeps the next scan queued
+        'WEBSCAN_SCAN_WORKERS': '1',
+        'BENCH_NIKTO_DELAY': '3600',
+        'WEBSCAN_LONG_POLL_TIMEOUT': str(hold),
+    })
+    process = subprocess.Popen(
+        [sys.executable, '-c', SERVER_CODE[mode], ROOT], cwd=workdir, env=env,
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+    )
+    line = process.stdout.readline()
+    if not line.strip().isdigit():
+        process.kill()
+        raise RuntimeError(f'the {mode} app did not start; run it directly to see why')
+    return process, int(line)
+
+
+def prepare_scans(base_url):
+    """A finished scan to read, a running one, and a queued one whose events never come"""
+    session = requests.Session()
+    session.post(f'{base_url}/verify_email', json={'email': 'benchuser001@gmail.com'},
+                 timeout=30)
+
+    def scan(scan_type, target):
+        return session.post(f'{base_url}/scan', json={
+            'scan_type': scan_type, 'target': target, 'force_refresh': True
+        }, timeout=30).json()['scan_id']
+
+    finished = scan(4, '127.0.0.1:9')
+    while session.get(f'{base_url}/scan_status/{finished}?view=summary',
+                      timeout=30).json().get('status') not in ('completed', 'failed'):
+        time.sleep(0.1)
+    running = scan(3, '127.0.0.1:9')
+    parked = scan(3, '127.0.0.1:10')
+    last_id = session.get(f'{base_url}/scan_events/{parked}?mode=poll',
+                          timeout=30).json()['last_id']
+    return session, finished, running, parked, last_id
+
+
+async def http_get(port, path, timeout):
+    """Status code of a GET over a fresh connection, read to the end"""
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection('127.0.0.1', port), timeout)
+    try:
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n'
+                     .encode())
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout)
+        return int(response.split(b' ', 2)[1])
+    finally:
+        writer.close()
+
+
+async def hold_long_polls(port, path, connections, hold):
+    """Open `connections` long-polls at once; count how each one ended"""
+    async def one():
+        try:
+            return 'answered' if await http_get(port, path, hold + 30) == 200 else 'http_error'
+        except asyncio.TimeoutError:
+            return 'timeout'
+        except (OSError, IndexError, ValueError):
+            return 'refused'
+
+    results = await asyncio.gather(*(one() for _ in range(connections)))
+    return {outcome: results.count(outcome) for outcome in set(results)}
+
+
+def measure_requests(session, base_url, finished, requests_per_endpoint):
+    samples = {}
+    endpoints = {
+        'scan_status': lambda: session.get(f'{base_url}/scan_status/{finished}', timeout=60),
+        'report_json': lambda: session.get(
+            f'{base_url}/download_report/{finished}?format=json', timeout=60),
+        'verify_email': lambda: session.post(
+            f'{base_url}/verify_email', json={'email': 'benchuser001@gmail.com'}, timeout=60),
+    }
+    for name, call in endpoints.items():
+        for _ in range(requests_per_endpoint):
+            start = time.perf_counter()
+            try:
+                ok = call().status_code == 200
+            except requests.RequestException:
+                ok = False
+            if ok:
+                samples.setdefault(name, []).append(time.perf_counter() - start)
+            else:
+                samples.setdefault(f'{name}_errors', []).append(1)
+    return samples
+
+
+def run_mode(mode, settings):
+    with tempfile.TemporaryDirectory() as workdir:
+        bin_dir = os.path.join(workdir, 'bin')
+        os.mkdir(bin_dir)
+        install_fake_tools(bin_dir)
+        process, port = start_app(mode, workdir, bin_dir, settings['hold'])
+        base_url = f'http://127.0.0.1:{port}'
+        try:
+            session, finished, running, parked, last_id = prepare_scans(base_url)
+            idle_rss, idle_threads = proc_status(process.pid)
+
+            loop = asyncio.new_event_loop()
+            path = f'/scan_events/{parked}?mode=poll&since={last_id}'
+            holders = loop.create_task(
+                hold_long_polls(port, path, settings['connections'], settings['hold']))
+            # Let the connections open, then measure while they are held
+            loop.run_until_complete(asyncio.sleep(settings['ramp']))
+            held_rss, held_threads = proc_status(process.pid)
+            samples = measure_requests(session, base_url, finished, settings['requests'])
+            outcomes = loop.run_until_complete(holders)
+            loop.close()
+            server_peak = peak_rss_kb(process.pid)
+            # Stop the slow stand-in nikto before the server goes
+            for scan_id in (parked, running):
+                session.post(f'{base_url}/scan_cancel/{scan_id}', timeout=30)
+            time.sleep(1)
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    return {
+        'mode': mode,
+        'long_polls': outcomes,
+        'latency': {name: summarize(values) for name, values in samples.items()
+                    if not name.endswith('_errors')},
+        'errors': {name[:-len('_errors')]: len(values) for name, values in samples.items()
+                   if name.endswith('_errors')},
+        'rss_kb': {'idle': idle_rss, 'held': held_rss, 'peak': server_peak},
+        'threads': {'idle': idle_threads, 'held': held_threads},
+    }
+
+
+def print_result(result, settings):
+    def ms(summary):
+        return f"p50 {summary['p50'] * 1000:7.1f} ms, p99 {summary['p99'] * 1000:7.1f} ms"
+
+    print(f"{result['mode']}: {settings['connections']} long-polls held {settings['hold']}s, "
+          f"outcomes {result['long_polls']}")
+    for name, summary in sorted(result['latency'].items()):
+        errors = result['errors'].get(name, 0)
+        print(f"  {name:14} {ms(summary)}" + (f", {errors} errors" if errors else ''))
+    rss, threads = result['rss_kb'], result['threads']
+    print(f"  RSS kB         idle {rss['idle']}, held {rss['held']}, peak {rss['peak']}")
+    print(f"  threads        idle {threads['idle']}, held {threads['held']}")
+
+
+def compare(results):
+    """Async against sync: the headline numbers side by side"""
+    by_mode = {result['mode']: result for result in results}
+    if set(by_mode) != {'sync', 'async'}:
+        return
+    sync, async_ = by_mode['sync'], by_mode['async']
+    print('sync -> async:')
+    rows = [('held RSS kB', ('rss_kb', 'held')), ('held threads', ('threads', 'held'))]
+    rows += [(f'{name} p99', ('latency', name, 'p99')) for name in sorted(sync['latency'])]
+    for label, path in rows:
+        a, b = sync, async_
+        for key in path:
+            a = a.get(key) if isinstance(a, dict) else None
+            b = b.get(key) if isinstance(b, dict) else None
+        if a and b is not None:
+            print(f"  {label:22} {a:>12} -> {b:<12} ({(b - a) / a * 100:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', action='append', choices=sorted(SERVER_CODE),
+                        help='serving mode (repeatable, default: both)')
+    parser.add_argument('--connections', type=int, default=1000,
+                        help='long-polls held at the same time')
+    parser.add_argument('--hold', type=int, default=20,
+                        help='seconds each long-poll waits (WEBSCAN_LONG_POLL_TIMEOUT)')
+    parser.add_argument('--ramp', type=float, default=3,
+                        help='seconds to let the long-polls connect before measuring')
+    parser.add_argument('--requests', type=int, default=50,
+                        help='requests timed per endpoint while the long-polls are held')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    settings = {'connections': args.connections, 'hold': args.hold, 'ramp': args.ramp,
+                'requests': args.requests}
+    results = []
+    for mode in args.mode or ['sync', 'async']:
+        result = run_mode(mode, settings)
+        print_result(result, settings)
+        results.append(result)
+    compare(results)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({
+                'benchmark': 'async_tier',
+                'commit': git_commit(),
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpus': os.cpu_count(),
+                'settings': settings,
+                'results': results,
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
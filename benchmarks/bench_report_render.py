@@ -0,0 +1,104 @@
+"""Benchmark PDF report generation throughput
+
+Renders the same synthetic scan repeatedly and reports reports/second.
+With --plotly (needs plotly and kaleido installed) it also times the
+previous Plotly/Kaleido chart, for a before/after comparison.
+
+    python benchmarks/bench_report_render.py [--reports 50] [--plotly]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import report_generator
+
+
+def synthetic_scan(findings=25):
+    severities = ['Critical', 'High', 'Medium', 'Low']
+    return {
+        'scan_id': 'benchmark',
+        'timestamp': '2024-01-01T00:00:00',
+        'target': 'bench.example',
+        'scan_type': 1,
+        'gmail': 'bench@gmail.com',
+        'vuln_stage': 'High',
+        'results': {
+            'nmap': {'success': True, 'output': '80/tcp open http\n' * 50},
+            'nikto': {'success': True, 'output': '+ /: finding\n' * 50},
+        },
+        'vulnerabilities': [{
+            'title': f'Finding {i}',
+            'severity': severities[i % 4],
+            'description': 'Synthetic finding',
+            'impact': 'None',
+            'recommendation': 'None'
+        } for i in range(findings)],
+    }
+
+
+def plotly_chart(severity_counts):
+    """The chart as it was built before the switch to ReportLab graphics"""
+    from io import BytesIO
+    import plotly.graph_objects as go
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Image
+
+    fig = go.Figure(data=[go.Bar(
+        x=list(severity_counts.keys()),
+        y=list(severity_counts.values()),
+        marker_color=['red', 'orange', 'yellow', 'green']
+    )])
+    fig.update_layout(title="Vulnerability Severity Distribution",
+                      xaxis_title="Severity Level", yaxis_title="Number of Findings",
+                      showlegend=False)
+    img_bytes = fig.to_image(format="png", width=600, height=400)
+    return Image(BytesIO(img_bytes), width=5*inch, height=3*inch)
+
+
+def run(label, reports, scan):
+    start = time.perf_counter()
+    for _ in range(reports):
+        report_generator.generate_professional_report(scan)
+    elapsed = time.perf_counter() - start
+    rate = reports / elapsed
+    print(f"{label:24} {reports:5d} reports  {elapsed:7.2f}s  {rate:8.2f} reports/s")
+    return {'mode': label, 'reports': reports, 'seconds': round(elapsed, 4),
+            'reports_per_second': round(rate, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reports', type=int, default=50)
+    parser.add_argument('--plotly', action='store_true', help='also time the Plotly/Kaleido chart')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    json_path = os.path.abspath(args.json) if args.json else None
+    scan = synthetic_scan()
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        results.append(run('reportlab chart', args.reports, scan))
+
+        if args.plotly:
+            native_chart = report_generator.severity_chart
+            try:
+                report_generator.severity_chart = lambda counts: plotly_chart(
+                    dict(zip(report_generator.SEVERITY_LEVELS, counts)))
+                results.append(run('plotly/kaleido chart', args.reports, scan))
+            finally:
+                report_generator.severity_chart = native_chart
+
+    if json_path:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump({'benchmark': 'report_render', 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Benchmark the rule engine on large synthetic nikto and nmap outputs
+
+Shows scan time as the number of rules grows, next to a naive baseline
+that searches the output once per rule.
+
+    python benchmarks/bench_rule_engine.py [--lines 200000]
+"""
+import argparse
+import json
+import os
+import random
+import re
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from rule_engine import RuleEngine
+
+NIKTO_LINES = [
+    "+ /: The anti-clickjacking X-Frame-Options header is not present.",
+    "+ /: The X-Content-Type-Options header is not set.",
+    "+ Apache/2.4.29 appears to be outdated (current is at least Apache/2.4.54).",
+    "+ OSVDB-3268: /icons/: Directory indexing found.",
+    "+ /phpinfo.php: Output from the phpinfo() function was found.",
+    "+ /admin/login.php: Admin login page/section found.",
+    "+ OSVDB-3233: /icons/README: Apache default file found.",
+]
+
+NMAP_LINES = [
+    "  80/tcp open http Apache httpd 2.4.49",
+    "  [vulners] 80/tcp possible CVE-2021-41773, CVE-2021-42013",
+    "  [ssl-heartbleed] 443/tcp VULNERABLE",
+    "  22/tcp open ssh OpenSSH 7.4",
+]
+
+
+def synthetic_output(lines, count, seed):
+    rng = random.Random(seed)
+    return '\n'.join(rng.choice(lines) + f' #{i}' for i in range(count)) + '\n'
+
+
+def synthetic_rules(scanner, count, seed, pattern_share=0.5):
+    """`count` rules that mostly do not match, like a large rule set
+
+    A `pattern_share` of them are patterns shaped like the bundled ones: a
+    path or banner, then a version or file name part.
+    """
+    rng = random.Random(seed)
+    rules = []
+    for i in range(count):
+        word = ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(8, 24)))
+        rule = {
+            'id': f'synthetic-{scanner}-{i}', 'scanner': scanner,
+            'severity': 'Low', 'title': f'Synthetic rule {i}'
+        }
+        if rng.random() < pattern_share:
+            rule['pattern'] = rng.choice([
+                rf'/{word}/[\w./-]*\.(?:php|asp)\b',
+                rf'{word}\[{i % 10}\.\d+',
+                rf'^\+ {word}:\s*\S+',
+            ])
+        else:
+            rule['keyword'] = f'{word} {i}'
+        rules.append(rule)
+    return rules
+
+
+def naive_scan(rules, text):
+    """Baseline: one case-insensitive search of the whole text per rule"""
+    hits = 0
+    for rule in rules:
+        pattern = rule.get('pattern') or re.escape(rule['keyword'])
+        hits += len(re.findall(pattern, text, re.IGNORECASE | re.MULTILINE))
+    return hits
+
+
+def timed(func, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', type=int, default=200000, help='output lines per scanner')
+    parser.add_argument('--rule-counts', default='10,100,1000,5000')
+    parser.add_argument('--pattern-share', type=float, default=0.5,
+                        help='share of synthetic rules that are patterns')
+    parser.add_argument('--naive-max', type=int, default=1000,
+                        help='largest rule count to time the naive baseline at')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    with open(config.RULES_PATH, encoding='utf-8') as f:
+        base_rules = json.load(f)['rules']
+
+    outputs = {
+        'nikto': synthetic_output(NIKTO_LINES, args.lines, 1),
+        'nmap': synthetic_output(NMAP_LINES, args.lines, 2),
+    }
+
+    results = []
+    print(f"{'scanner':8} {'rules':>6} {'MB':>6} {'compile s':>10} {'engine s':>9} {'MB/s':>7} {'naive s':>8}")
+    for scanner, text in outputs.items():
+        size_mb = len(text) / 1e6
+        for rule_count in (int(n) for n in args.rule_counts.split(',')):
+            rules = [rule for rule in base_rules if rule['scanner'] == scanner]
+            rules += synthetic_rules(scanner, max(0, rule_count - len(rules)), rule_count,
+                                     args.pattern_share)
+
+            start = time.perf_counter()
+            engine = RuleEngine(rules)
+            compile_time = time.perf_counter() - start
+
+            engine_time = timed(engine.scan, scanner, text)
+            naive_time = (timed(naive_scan, rules, text, repeat=1)
+                          if rule_count <= args.naive_max else None)
+
+            results.append({
+                'scanner': scanner, 'rules': len(rules), 'output_mb': round(size_mb, 2),
+                'compile_s': round(compile_time, 4), 'engine_s': round(engine_time, 4),
+                'naive_s': round(naive_time, 4) if naive_time is not None else None,
+            })
+            naive = f'{naive_time:8.3f}' if naive_time is not None else '       -'
+            print(f"{scanner:8} {len(rules):6} {size_mb:6.1f} {compile_time:10.3f} "
+                  f"{engine_time:9.3f} {size_mb / engine_time:7.1f} {naive}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'benchmark': 'rule_engine', 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
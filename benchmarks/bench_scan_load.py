@@ -0,0 +1,407 @@
+"""Benchmark scan throughput end to end against stand-in scanners
+
+Starts the app in a subprocess with fake_scanner.py in place of nmap,
+nikto and whatweb, and a local HTTP server as the scan target, then has
+N concurrent users drive /scan and /scan_status. Reports scans/minute,
+p50/p99 latencies, the server's peak RSS and report render times.
+
+    python benchmarks/bench_scan_load.py [--scenario steady] [--json out.json]
+    python benchmarks/bench_scan_load.py --users 16 --scans-per-user 4 --nmap-delay 2
+    python benchmarks/bench_scan_load.py --json new.json --compare old.json
+
+Nothing leaves the machine: every scan targets 127.0.0.1.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAKE_SCANNER = os.path.join(ROOT, 'benchmarks', 'fake_scanner.py')
+TOOLS = ('nmap', 'nikto', 'whatweb')
+
+# Named load scenarios; command-line options override their values
+SCENARIOS = {
+    # A quick check that the harness works
+    'smoke': {'users': 2, 'scans_per_user': 2, 'scan_type': 1,
+              'delays': {'nmap': 0.2, 'nikto': 0.1, 'whatweb': 0.05}},
+    # Several users each running a few full scans
+    'steady': {'users': 8, 'scans_per_user': 4, 'scan_type': 1,
+               'delays': {'nmap': 1.0, 'nikto': 0.6, 'whatweb': 0.2}},
+    # Many users arriving at once with one scan each
+    'burst': {'users': 32, 'scans_per_user': 1, 'scan_type': 1,
+              'delays': {'nmap': 1.0, 'nikto': 0.6, 'whatweb': 0.2}},
+    # Header probes only, to measure per-scan overhead of the app itself
+    'headers': {'users': 16, 'scans_per_user': 8, 'scan_type': 4,
+                'delays': {'nmap': 0, 'nikto': 0, 'whatweb': 0}},
+}
+
+FINAL_STATUSES = ('completed', 'failed', 'cancelled')
+
+# A scan still unfinished after this many seconds is counted as timed out
+SCAN_TIMEOUT = 900
+
+# Serves the app on an ephemeral port and prints it for the benchmark
+SERVER_CODE = """
+import sys
+sys.path.insert(0, sys.argv[1])
+from werkzeug.serving import make_server
+import app
+server = make_server('127.0.0.1', 0, app.app, threaded=True)
+print(server.server_port, flush=True)
+server.serve_forever()
+"""
+
+STAGE_METRIC = re.compile(
+    r'^webscan_stage_duration_seconds_(sum|count)\{stage="([^"]+)"\} (\S+)$', re.MULTILINE)
+
+
+class TargetHandler(BaseHTTPRequestHandler):
+    """A small site with a typical mix of present and missing security headers"""
+
+    def _headers(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Server', 'Apache/2.4.49 (Unix)')
+        self.send_header('X-Powered-By', 'PHP/5.6.40')
+        self.send_header('X-Frame-Options', 'SAMEORIGIN')
+        self.send_header('Content-Security-Policy', "default-src 'self' 'unsafe-inline'")
+        self.send_header('Set-Cookie', 'PHPSESSID=bench; path=/')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_HEAD(self):
+        self._headers()
+
+    def do_GET(self):
+        self._headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_target():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), TargetHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def install_fake_tools(bin_dir):
+    """Wrapper scripts named after each tool that run fake_scanner.py"""
+    for tool in TOOLS:
+        path = os.path.join(bin_dir, tool)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" "{FAKE_SCANNER}" {tool} "$@"\n')
+        os.chmod(path, 0o755)
+
+
+def start_app(workdir, bin_dir, settings):
+    env = dict(os.environ)
+    env.update({
+        'PATH': bin_dir + os.pathsep + env.get('PATH', ''),
+        'WEBSCAN_SCANNER_AUTO_INSTALL': '0',
+        'WEBSCAN_REPORT_PREGENERATE': '0',
+        'BENCH_OUTPUT_SCALE': str(settings['output_scale']),
+    })
+    for tool, delay in settings['delays'].items():
+        env[f'BENCH_{tool.upper()}_DELAY'] = str(delay)
+    env.update(settings['env'])
+
+    log_path = os.path.join(workdir, 'app.log')
+    with open(log_path, 'w', encoding='utf-8') as log:
+        process = subprocess.Popen(
+            [sys.executable, '-c', SERVER_CODE, ROOT], cwd=workdir, env=env,
+            stdout=subprocess.PIPE, stderr=log, text=True
+        )
+    line = process.stdout.readline()
+    if not line.strip().isdigit():
+        process.kill()
+        process.wait()
+        raise RuntimeError(f'the app did not start:\n{app_log_tail(log_path)}')
+    return process, f'http://127.0.0.1:{int(line)}'
+
+
+def app_log_tail(path, lines=20):
+    """Last lines of the app's stderr, to show why it failed"""
+    try:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            return ''.join(f.readlines()[-lines:])
+    except OSError:
+        return ''
+
+
+def peak_rss_kb(pid):
+    """High-water RSS of a process, from /proc (Linux only)"""
+    try:
+        with open(f'/proc/{pid}/status', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile; None for no values"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(values):
+    return {
+        'count': len(values),
+        'p50': round(percentile(values, 0.5), 4) if values else None,
+        'p99': round(percentile(values, 0.99), 4) if values else None,
+        'max': round(max(values), 4) if values else None,
+    }
+
+
+def timed(samples, name, call):
+    start = time.perf_counter()
+    response = call()
+    samples.setdefault(name, []).append(time.perf_counter() - start)
+    return response
+
+
+def run_user(index, base_url, target, settings, samples, outcomes, lock):
+    """One user: verify, then run scans back to back, polling each one"""
+    local = {}
+    session = requests.Session()
+    session.post(f'{base_url}/verify_email',
+                 json={'email': f'benchuser{index:03d}@gmail.com'}, timeout=30)
+
+    for scan in range(settings['scans_per_user']):
+        started = time.perf_counter()
+        response = timed(local, 'scan_request', lambda: session.post(f'{base_url}/scan', json={
+            'scan_type': settings['scan_type'],
+            # A path per scan keeps the result cache from answering
+            'target': f'{target}/u{index}/s{scan}',
+            'force_refresh': True,
+        }, timeout=30))
+        scan_id = response.json().get('scan_id')
+        if not scan_id:
+            with lock:
+                outcomes['rejected'] = outcomes.get('rejected', 0) + 1
+            continue
+
+        status = None
+        while status not in FINAL_STATUSES:
+            if time.perf_counter() - started > SCAN_TIMEOUT:
+                status = 'timeout'
+                break
+            time.sleep(settings['poll_interval'])
+            record = timed(local, 'status_request', lambda: session.get(
+                f'{base_url}/scan_status/{scan_id}?view=summary', timeout=30)).json()
+            status = record.get('status')
+        local.setdefault('scan', []).append(time.perf_counter() - started)
+        if record.get('timings', {}).get('total') is not None:
+            local.setdefault('scan_server', []).append(record['timings']['total'])
+        scanner_rss = [result.get('resources', {}).get('peak_rss_kb') or 0
+                       for result in record.get('results', {}).values()]
+        local.setdefault('scanner_rss_kb', []).append(max(scanner_rss, default=0))
+
+        if status == 'completed' and settings['report_format'] != 'none':
+            report = timed(local, 'report', lambda: session.get(
+                f"{base_url}/download_report/{scan_id}?format={settings['report_format']}",
+                timeout=300))
+            if report.status_code != 200:
+                status = 'report_failed'
+
+        with lock:
+            outcomes[status] = outcomes.get(status, 0) + 1
+
+    with lock:
+        for name, values in local.items():
+            samples.setdefault(name, []).extend(values)
+
+
+def server_stages(base_url):
+    """Mean seconds per scan stage, from the app's /metrics"""
+    try:
+        text = requests.get(f'{base_url}/metrics', timeout=10).text
+    except requests.RequestException:
+        return {}
+    sums, counts = {}, {}
+    for kind, stage, value in STAGE_METRIC.findall(text):
+        (sums if kind == 'sum' else counts)[stage] = float(value)
+    return {stage: round(sums[stage] / counts[stage], 4)
+            for stage in sums if counts.get(stage)}
+
+
+def run_scenario(name, settings):
+    target_server = start_target()
+    target = f'127.0.0.1:{target_server.server_port}'
+    with tempfile.TemporaryDirectory() as workdir:
+        bin_dir = os.path.join(workdir, 'bin')
+        os.mkdir(bin_dir)
+        install_fake_tools(bin_dir)
+        process, base_url = start_app(workdir, bin_dir, settings)
+        try:
+            samples, outcomes, lock = {}, {}, threading.Lock()
+            users = [
+                threading.Thread(target=run_user, args=(
+                    index, base_url, target, settings, samples, outcomes, lock))
+                for index in range(settings['users'])
+            ]
+            start = time.perf_counter()
+            for user in users:
+                user.start()
+            for user in users:
+                user.join()
+            elapsed = time.perf_counter() - start
+
+            stages = server_stages(base_url)
+            server_rss = peak_rss_kb(process.pid)
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            target_server.shutdown()
+
+    completed = outcomes.get('completed', 0)
+    return {
+        'scenario': name,
+        'settings': {key: value for key, value in settings.items() if key != 'env'},
+        'seconds': round(elapsed, 3),
+        'outcomes': outcomes,
+        'scans_per_minute': round(60 * completed / elapsed, 2) if elapsed else 0,
+        'scan_latency': summarize(samples.get('scan', [])),
+        'scan_server_seconds': summarize(samples.get('scan_server', [])),
+        'scan_request_latency': summarize(samples.get('scan_request', [])),
+        'status_request_latency': summarize(samples.get('status_request', [])),
+        'report_render': summarize(samples.get('report', [])),
+        'server_peak_rss_kb': server_rss,
+        'scanner_peak_rss_kb': max(samples.get('scanner_rss_kb', []), default=None),
+        'stage_mean_seconds': stages,
+    }
+
+
+def print_result(result):
+    def ms(summary):
+        if not summary['count']:
+            return 'n/a'
+        return f"p50 {summary['p50'] * 1000:.0f} ms, p99 {summary['p99'] * 1000:.0f} ms"
+
+    settings = result['settings']
+    print(f"{result['scenario']}: {settings['users']} users x {settings['scans_per_user']} scans "
+          f"in {result['seconds']:.1f}s, {result['scans_per_minute']:.1f} scans/min, "
+          f"outcomes {result['outcomes']}")
+    print(f"  scan end to end   {ms(result['scan_latency'])}")
+    print(f"  POST /scan        {ms(result['scan_request_latency'])}")
+    print(f"  GET /scan_status  {ms(result['status_request_latency'])}")
+    report_label = f"report ({settings['report_format']})"
+    print(f"  {report_label:18}{ms(result['report_render'])}")
+    print(f"  peak RSS          server {result['server_peak_rss_kb']} kB, "
+          f"scanner {result['scanner_peak_rss_kb']} kB")
+    for stage, seconds in sorted(result['stage_mean_seconds'].items()):
+        print(f"    {stage:30} {seconds * 1000:9.1f} ms mean")
+
+
+def compare(previous, current):
+    """Print the change of the headline numbers against an earlier run"""
+    before = {result['scenario']: result for result in previous['results']}
+    for result in current['results']:
+        old = before.get(result['scenario'])
+        if old is None:
+            continue
+        print(f"{result['scenario']} vs {previous.get('commit') or 'previous run'}:")
+        for label, path in (('scans/min', ('scans_per_minute',)),
+                            ('scan p50', ('scan_latency', 'p50')),
+                            ('scan p99', ('scan_latency', 'p99')),
+                            ('status p99', ('status_request_latency', 'p99')),
+                            ('report p50', ('report_render', 'p50')),
+                            ('server RSS kB', ('server_peak_rss_kb',))):
+            a, b = old, result
+            for key in path:
+                a = a.get(key) if isinstance(a, dict) else None
+                b = b.get(key) if isinstance(b, dict) else None
+            if a and b is not None:
+                print(f"  {label:14} {a:>12} -> {b:<12} ({(b - a) / a * 100:+.1f}%)")
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='load scenario (repeatable, default: steady)')
+    parser.add_argument('--users', type=int, help='concurrent users')
+    parser.add_argument('--scans-per-user', type=int)
+    parser.add_argument('--scan-type', help='1/all, 2 nmap, 3 nikto, 4 headers, 5 whatweb')
+    for tool in TOOLS:
+        parser.add_argument(f'--{tool}-delay', type=float,
+                            help=f'seconds the fake {tool} takes to print its output')
+    parser.add_argument('--output-scale', type=int, default=1,
+                        help='repeat the recorded findings this many times')
+    parser.add_argument('--poll-interval', type=float, default=0.25)
+    parser.add_argument('--report-format', default='pdf',
+                        help='report fetched after each scan: pdf, html, json, sarif or none')
+    parser.add_argument('--env', action='append', default=[], metavar='NAME=VALUE',
+                        help='extra app setting, e.g. WEBSCAN_SCAN_WORKERS=8')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', help='earlier --json output to compare against')
+    args = parser.parse_args()
+
+    results = []
+    for name in args.scenario or ['steady']:
+        settings = dict(SCENARIOS[name], delays=dict(SCENARIOS[name]['delays']))
+        if args.users:
+            settings['users'] = args.users
+        if args.scans_per_user:
+            settings['scans_per_user'] = args.scans_per_user
+        if args.scan_type:
+            settings['scan_type'] = 'all' if args.scan_type == 'all' else int(args.scan_type)
+        for tool in TOOLS:
+            delay = getattr(args, f'{tool}_delay')
+            if delay is not None:
+                settings['delays'][tool] = delay
+        settings.update(
+            output_scale=args.output_scale,
+            poll_interval=args.poll_interval,
+            report_format=args.report_format,
+            env=dict(item.split('=', 1) for item in args.env),
+        )
+        result = run_scenario(name, settings)
+        print_result(result)
+        results.append(result)
+
+    output = {
+        'benchmark': 'scan_load',
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'results': results,
+    }
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(output, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(json.load(f), output)
+
+
+if __name__ == '__main__':
+    main()
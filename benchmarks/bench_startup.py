@@ -0,0 +1,101 @@
+"""Benchmark import-time startup cost of the app and its modules
+
+Imports each module in a fresh interpreter under `python -X importtime`,
+repeats that a few times, and reports the median wall time plus the
+slowest imports (cumulative microseconds) of the last run.
+
+    python benchmarks/bench_startup.py [--module app] [--runs 5] [--top 15]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULES = ['app', 'report_generator', 'google_sheet_logger',
+                   'email_verifier', 'Scanner_manager']
+
+
+def parse_importtime(stderr):
+    """(module, self_us, cumulative_us) for every line of -X importtime output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        name = name.strip()
+        if name == 'site':
+            # Everything so far was interpreter startup (site and .pth files)
+            rows = []
+            continue
+        rows.append((name, int(self_us), int(cumulative_us)))
+    return rows
+
+
+def time_import(module):
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - start
+    error = None
+    if proc.returncode != 0:
+        error = (proc.stderr.strip().splitlines() or ['import failed'])[-1]
+    return elapsed, parse_importtime(proc.stderr), error
+
+
+def bench(module, runs, top):
+    times = []
+    for _ in range(runs):
+        elapsed, rows, error = time_import(module)
+        if error:
+            return {'module': module, 'error': error}
+        times.append(elapsed)
+
+    slowest = sorted(rows, key=lambda row: row[2], reverse=True)[:top]
+    return {
+        'module': module,
+        'runs': runs,
+        'median_seconds': round(statistics.median(times), 4),
+        'min_seconds': round(min(times), 4),
+        'import_seconds': round(sum(cum for name, _, cum in rows if name == module) / 1e6, 4),
+        'slowest_imports': [
+            {'module': name, 'cumulative_ms': round(cum / 1000, 1), 'self_ms': round(own / 1000, 1)}
+            for name, own, cum in slowest
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--module', action='append',
+                        help='module to import (repeatable, default: the app and its components)')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    results = [bench(module, args.runs, args.top) for module in args.module or DEFAULT_MODULES]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for result in results:
+        if 'error' in result:
+            print(f"{result['module']}: import failed ({result['error']})")
+            continue
+        print(f"{result['module']}: {result['median_seconds'] * 1000:.0f} ms median "
+              f"process start + import ({result['runs']} runs), "
+              f"{result['import_seconds'] * 1000:.0f} ms in imports")
+        for row in result['slowest_imports']:
+            print(f"  {row['cumulative_ms']:9.1f} ms  {row['module']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Stand-in for nmap, nikto and whatweb that replays recorded output
+
+    python benchmarks/fake_scanner.py <nmap|nikto|whatweb> [tool arguments...]
+
+bench_scan_load.py puts wrapper scripts named after each tool on PATH, so
+the scanner manager runs this instead of the real tool. The output in
+fixtures/<tool>.* is streamed line by line, spread over the delay given
+in BENCH_<TOOL>_DELAY (seconds). BENCH_OUTPUT_SCALE repeats the findings
+(nmap ports, nikto items, whatweb plugins) to produce larger outputs.
+"""
+import os
+import re
+import sys
+import time
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+FIXTURE_FILES = {
+    'nmap': 'nmap.xml',
+    'nikto': 'nikto.txt',
+    'whatweb': 'whatweb.txt',
+}
+
+VERSIONS = {
+    'nmap': ('--version', 'Nmap version 7.94 ( https://nmap.org ) [benchmark stand-in]'),
+    'nikto': ('-Version', 'Nikto 2.5.0 [benchmark stand-in]'),
+    'whatweb': ('--version', 'WhatWeb version 0.5.5 [benchmark stand-in]'),
+}
+
+NMAP_PORT = re.compile(r'<port protocol="(\w+)" portid="(\d+)">.*?</port>', re.DOTALL)
+
+
+def target_of(tool, args):
+    if tool == 'nikto' and '-h' in args:
+        return args[args.index('-h') + 1]
+    if tool == 'whatweb':
+        return args[0] if args else 'localhost'
+    return args[-1] if args else 'localhost'
+
+
+def scale_nmap(text, scale):
+    """Copies of every <port> with port numbers shifted by 1000 per copy"""
+    blocks = [(match.group(0), int(match.group(2))) for match in NMAP_PORT.finditer(text)]
+    extra = [
+        block.replace(f'portid="{portid}"', f'portid="{portid + 1000 * copy}"', 1)
+        for copy in range(1, scale) for block, portid in blocks
+    ]
+    return text.replace('</ports>', '\n'.join(extra) + '\n</ports>', 1)
+
+
+def scale_lines(lines, scale, repeat):
+    """Each line for which `repeat(line)` is true, `scale` times"""
+    scaled = []
+    for line in lines:
+        scaled.append(line)
+        if repeat(line):
+            scaled.extend(line.rstrip('\n') + f' (copy {copy})\n' for copy in range(1, scale))
+    return scaled
+
+
+def render(tool, target, scale):
+    with open(os.path.join(FIXTURES, FIXTURE_FILES[tool]), encoding='utf-8') as f:
+        text = f.read().replace('__TARGET__', target)
+    if scale > 1 and tool == 'nmap':
+        text = scale_nmap(text, scale)
+    lines = text.splitlines(keepends=True)
+    if scale > 1 and tool == 'nikto':
+        lines = scale_lines(lines, scale, lambda line: line.startswith('+ /'))
+    elif scale > 1 and tool == 'whatweb':
+        lines = scale_lines(lines, scale, lambda line: line.startswith('[ '))
+    return lines
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in FIXTURE_FILES:
+        sys.exit(f"usage: {sys.argv[0]} <{'|'.join(FIXTURE_FILES)}> [args...]")
+    tool, args = sys.argv[1], sys.argv[2:]
+
+    flag, version = VERSIONS[tool]
+    if args[:1] == [flag]:
+        print(version)
+        return
+
+    delay = float(os.environ.get(f'BENCH_{tool.upper()}_DELAY', '0'))
+    scale = max(1, int(os.environ.get('BENCH_OUTPUT_SCALE', '1')))
+    lines = render(tool, target_of(tool, args), scale)
+
+    pause = delay / len(lines) if lines else 0
+    for line in lines:
+        sys.stdout.write(line)
+        sys.stdout.flush()
+        if pause:
+            time.sleep(pause)
+
+
+if __name__ == '__main__':
+    main()
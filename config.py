@@ -0,0 +1,139 @@
+import os
+
+# Runtime settings, overridable through environment variables
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+# Maximum number of scanner subprocesses an "all" scan runs at the same time
+SCANNER_CONCURRENCY = _env_int('WEBSCAN_SCANNER_CONCURRENCY', 4)
+
+# Scan scheduler: worker pool size, queue capacity and per-user concurrency
+SCAN_WORKERS = _env_int('WEBSCAN_SCAN_WORKERS', 4)
+SCAN_QUEUE_SIZE = _env_int('WEBSCAN_SCAN_QUEUE_SIZE', 1000)
+SCAN_PER_USER_LIMIT = _env_int('WEBSCAN_SCAN_PER_USER_LIMIT', 2)
+# Workers bulk (batch) scans may occupy; the rest stay free for interactive scans
+SCAN_BULK_WORKERS = _env_int('WEBSCAN_SCAN_BULK_WORKERS', max(1, SCAN_WORKERS - 1))
+
+# Where scans run: "local" (the web app's own worker pool) or "queue" (the web
+# app only enqueues; worker.py processes take the jobs from JOB_QUEUE_URL and
+# write to the result store). With the sqlite result store the workers share
+# its files, so they run on the web app's host; with a redis:// queue and the
+# redis result store, web apps and workers may run on any number of hosts.
+SCAN_EXECUTION = os.environ.get('WEBSCAN_EXECUTION', 'local')
+# SQLite path (or sqlite:///path) or a redis:// URL
+JOB_QUEUE_URL = os.environ.get('WEBSCAN_JOB_QUEUE', 'data/jobs.db')
+# Seconds a worker holds a job without renewing it before it is requeued,
+# seconds an idle worker waits between polls, and runs before a job is failed
+JOB_LEASE = _env_int('WEBSCAN_JOB_LEASE', 60)
+JOB_POLL_INTERVAL = _env_int('WEBSCAN_JOB_POLL_INTERVAL', 1)
+JOB_MAX_ATTEMPTS = _env_int('WEBSCAN_JOB_MAX_ATTEMPTS', 3)
+# Scans each worker.py process runs at the same time
+WORKER_CONCURRENCY = _env_int('WEBSCAN_WORKER_CONCURRENCY', SCAN_WORKERS)
+
+# Scan result store: "sqlite" (persistent, on local disk), "redis" (records,
+# raw outputs, batches, baselines and queue-mode events in Redis) or "memory"
+RESULT_STORE_BACKEND = os.environ.get('WEBSCAN_RESULT_STORE', 'sqlite')
+RESULT_DB_PATH = os.environ.get('WEBSCAN_RESULT_DB', 'data/scans.db')
+RESULT_BLOB_DIR = os.environ.get('WEBSCAN_RESULT_BLOB_DIR', 'data/outputs')
+# Redis of the "redis" result store; the job queue's by default
+RESULT_REDIS_URL = os.environ.get(
+    'WEBSCAN_RESULT_REDIS',
+    JOB_QUEUE_URL if JOB_QUEUE_URL.startswith(('redis://', 'rediss://', 'unix://'))
+    else 'redis://localhost:6379/0'
+)
+RESULT_CACHE_SIZE = _env_int('WEBSCAN_RESULT_CACHE_SIZE', 256)
+RESULT_CACHE_TTL = _env_int('WEBSCAN_RESULT_CACHE_TTL', 30)
+# Finished scans are evicted after this many seconds or beyond this count
+RESULT_RETENTION = _env_int('WEBSCAN_RESULT_RETENTION', 7 * 24 * 3600)
+RESULT_MAX_COMPLETED = _env_int('WEBSCAN_RESULT_MAX_COMPLETED', 10000)
+# Seconds between saves of a running scan's progress when scans run in
+# worker processes, whose records the web app only sees through the store
+RESULT_PROGRESS_INTERVAL = _env_int('WEBSCAN_RESULT_PROGRESS_INTERVAL', 1)
+
+# Bytes of each scanner's stdout kept in memory (most recent output wins)
+SCANNER_OUTPUT_LIMIT = _env_int('WEBSCAN_SCANNER_OUTPUT_LIMIT', 256 * 1024)
+
+# Scan event streams: SSE keepalive interval and long-poll wait, in seconds
+SSE_KEEPALIVE = _env_int('WEBSCAN_SSE_KEEPALIVE', 15)
+LONG_POLL_TIMEOUT = _env_int('WEBSCAN_LONG_POLL_TIMEOUT', 25)
+
+# Declarative vulnerability classification rules (JSON, or YAML with PyYAML)
+RULES_PATH = os.environ.get(
+    'WEBSCAN_RULES_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules', 'vulnerability_rules.json')
+)
+
+# Scanner result cache: entries kept, and seconds each scanner's results stay fresh
+SCAN_CACHE_SIZE = _env_int('WEBSCAN_SCAN_CACHE_SIZE', 512)
+SCAN_CACHE_TTLS = {
+    'nmap': _env_int('WEBSCAN_SCAN_CACHE_TTL_NMAP', 3600),
+    'nikto': _env_int('WEBSCAN_SCAN_CACHE_TTL_NIKTO', 3600),
+    'whatweb': _env_int('WEBSCAN_SCAN_CACHE_TTL_WHATWEB', 1800),
+    'curl': _env_int('WEBSCAN_SCAN_CACHE_TTL_CURL', 300),
+}
+
+# Scanner tool registry: full refresh interval and PATH change polling, in seconds
+TOOL_REFRESH_INTERVAL = _env_int('WEBSCAN_TOOL_REFRESH_INTERVAL', 3600)
+TOOL_POLL_INTERVAL = _env_int('WEBSCAN_TOOL_POLL_INTERVAL', 10)
+# Install missing scanners in the background when the app starts
+SCANNER_AUTO_INSTALL = os.environ.get('WEBSCAN_SCANNER_AUTO_INSTALL', '1') == '1'
+
+# PDF reports: render workers, cache directory and age, and whether to
+# render right after a scan instead of on the first download
+REPORT_WORKERS = _env_int('WEBSCAN_REPORT_WORKERS', 2)
+REPORTS_DIR = os.environ.get('WEBSCAN_REPORTS_DIR', 'reports')
+REPORT_CACHE_MAX_AGE = _env_int('WEBSCAN_REPORT_CACHE_MAX_AGE', 7 * 24 * 3600)
+REPORT_PREGENERATE = os.environ.get('WEBSCAN_REPORT_PREGENERATE', '0') == '1'
+
+# Google Sheets logging: rows per append_rows call, seconds before a partial
+# batch is shipped, and the local spool of rows not shipped yet (each process
+# spools to its own "<name>.<pid>.jsonl" next to it)
+SHEETS_BATCH_SIZE = _env_int('WEBSCAN_SHEETS_BATCH_SIZE', 50)
+SHEETS_FLUSH_INTERVAL = _env_int('WEBSCAN_SHEETS_FLUSH_INTERVAL', 5)
+SHEETS_SPOOL_PATH = os.environ.get('WEBSCAN_SHEETS_SPOOL', 'data/sheets_spool.jsonl')
+
+# Local scan log used when Google Sheets is unavailable ('csv' or 'jsonl').
+# Rotated by size or age; rotated files are gzipped and the newest kept.
+# Each process writes its own "<name>.<pid>.csv"; history() reads them all,
+# and LOG_FILE_BACKUPS counts the rotated files of every process together.
+LOG_FILE_PATH = os.environ.get('WEBSCAN_LOG_FILE', 'logs/scan_logs.csv')
+LOG_FILE_FORMAT = os.environ.get('WEBSCAN_LOG_FORMAT', 'csv')
+LOG_FILE_MAX_BYTES = _env_int('WEBSCAN_LOG_MAX_BYTES', 10 * 1024 * 1024)
+LOG_FILE_ROTATE_INTERVAL = _env_int('WEBSCAN_LOG_ROTATE_INTERVAL', 24 * 3600)
+LOG_FILE_BACKUPS = _env_int('WEBSCAN_LOG_BACKUPS', 30)
+
+# Gmail verification verdicts cached per address
+VERIFY_CACHE_SIZE = _env_int('WEBSCAN_VERIFY_CACHE_SIZE', 10000)
+VERIFY_CACHE_TTL = _env_int('WEBSCAN_VERIFY_CACHE_TTL', 3600)
+
+# Batch scans: most targets one request may expand to, and hosts per
+# grouped nmap invocation
+BATCH_MAX_TARGETS = _env_int('WEBSCAN_BATCH_MAX_TARGETS', 256)
+NMAP_GROUP_SIZE = _env_int('WEBSCAN_NMAP_GROUP_SIZE', 16)
+
+# In-process HTTP header probe (the 'curl' scanner): per-request timeout,
+# redirects followed, pooled connections and TLS verification (1/0)
+HEADER_PROBE_TIMEOUT = _env_int('WEBSCAN_HEADER_PROBE_TIMEOUT', 15)
+HEADER_PROBE_MAX_REDIRECTS = _env_int('WEBSCAN_HEADER_PROBE_MAX_REDIRECTS', 10)
+HEADER_PROBE_POOL_SIZE = _env_int('WEBSCAN_HEADER_PROBE_POOL_SIZE', 20)
+HEADER_PROBE_VERIFY_TLS = _env_int('WEBSCAN_HEADER_PROBE_VERIFY_TLS', 1)
+
+# Limits applied to every scanner subprocess and the tools it spawns
+# (0 = unlimited): CPU seconds, address space in MB, open files, niceness
+SCANNER_CPU_LIMIT = _env_int('WEBSCAN_SCANNER_CPU_LIMIT', 900)
+SCANNER_MEMORY_LIMIT_MB = _env_int('WEBSCAN_SCANNER_MEMORY_LIMIT_MB', 2048)
+SCANNER_MAX_FILES = _env_int('WEBSCAN_SCANNER_MAX_FILES', 4096)
+SCANNER_NICE = _env_int('WEBSCAN_SCANNER_NICE', 10)
+
+# Longest a whole scan may take, in seconds; its scanners share this budget.
+# Requests may ask for a shorter deadline, never a longer one.
+SCAN_DEADLINE = _env_int('WEBSCAN_SCAN_DEADLINE', 900)
+
+# Record Prometheus metrics and serve them on /metrics (1/0)
+METRICS_ENABLED = os.environ.get('WEBSCAN_METRICS', '1') == '1'
@@ -1,59 +1,165 @@
 import re
-import requests
-import dns.resolver
-import smtplib
+import threading
+import config
+from ttl_cache import TTLCache
 
-def verify_gmail(email):
-    """Verify if a Gmail ID exists"""
-    if not email or not re.match(r'^[a-zA-Z0-9._%+-]+@gmail\.com$', email):
-        return False
-    
-    # Method 1: Check MX records for gmail.com
-    try:
-        mx_records = dns.resolver.resolve('gmail.com', 'MX')
-        if not mx_records:
+# Patterns compiled once instead of on every verification
+GMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@gmail\.com$')
+USERNAME_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+$')
+
+# Gmail doesn't allow consecutive dots, or a dot at the start or end
+INVALID_USERNAME_PATTERN = re.compile(r'\.\.|^\.|\.$')
+
+# MX lookups that failed are retried after this many seconds
+MX_FAILURE_TTL = 60
+
+
+def dns_mx_lookup(domain):
+    """MX hosts of a domain and the TTL of the answer, via dnspython"""
+    import dns.resolver
+    answer = dns.resolver.resolve(domain, 'MX')
+    return [str(record.exchange) for record in answer], answer.rrset.ttl
+
+
+async def dns_mx_lookup_async(domain):
+    """dns_mx_lookup() on the running event loop, via dns.asyncresolver"""
+    import dns.asyncresolver
+    answer = await dns.asyncresolver.resolve(domain, 'MX')
+    return [str(record.exchange) for record in answer], answer.rrset.ttl
+
+
+class EmailVerifier:
+    """Gmail address verification with cached MX lookups and verdicts
+
+    `resolver(domain)` returns (mx_hosts, ttl); the answer is cached for
+    the DNS TTL. Verdicts per address are kept in an expiring LRU.
+    verify_async() does the same with `async_resolver`, for asgi_app.py.
+    """
+
+    def __init__(self, resolver=dns_mx_lookup, cache_size=10000, cache_ttl=3600,
+                 async_resolver=dns_mx_lookup_async):
+        self.resolver = resolver
+        self.async_resolver = async_resolver
+        self.mx_cache = TTLCache(maxsize=64, ttl=MX_FAILURE_TTL)
+        self.verdicts = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._mx_lock = threading.Lock()
+        self._mx_lookups = {}
+
+    def mx_records(self, domain):
+        """Cached MX hosts of a domain; None if the lookup failed"""
+        entry = self.mx_cache.get(domain)
+        if entry is not None:
+            return entry[0]
+        with self._mx_lock:
+            # Another thread may have resolved it while we waited
+            entry = self.mx_cache.get(domain)
+            if entry is not None:
+                return entry[0]
+            try:
+                hosts, ttl = self.resolver(domain)
+            except Exception:
+                hosts, ttl = None, MX_FAILURE_TTL
+            self.mx_cache.set(domain, (hosts,), ttl=max(ttl, 1))
+            return hosts
+
+    async def mx_records_async(self, domain):
+        """mx_records() without blocking the event loop"""
+        # Imported here so the sync app does not load asyncio
+        import asyncio
+        entry = self.mx_cache.get(domain)
+        if entry is not None:
+            return entry[0]
+        # Concurrent callers share one lookup per domain
+        lookup = self._mx_lookups.get(domain)
+        if lookup is None:
+            lookup = asyncio.ensure_future(self._resolve_async(domain))
+            self._mx_lookups[domain] = lookup
+            lookup.add_done_callback(lambda _: self._mx_lookups.pop(domain, None))
+        return await asyncio.shield(lookup)
+
+    async def _resolve_async(self, domain):
+        try:
+            hosts, ttl = await self.async_resolver(domain)
+        except Exception:
+            hosts, ttl = None, MX_FAILURE_TTL
+        self.mx_cache.set(domain, (hosts,), ttl=max(ttl, 1))
+        return hosts
+
+    def verify(self, email):
+        """Verify if a Gmail ID exists"""
+        if not email or not GMAIL_PATTERN.match(email):
             return False
-    except:
-        # DNS resolution failed, try next method
-        pass
-    
-    # Method 2: SMTP verification (simplified)
-    # Note: This is a basic check. For production, use a proper email verification service
-    try:
-        # Extract username from email
-        username = email.split('@')[0]
-        
-        # Check if username format is valid
-        if len(username) < 6 or len(username) > 30:
+
+        key = email.lower()
+        verdict = self.verdicts.get(key)
+        if verdict is None:
+            verdict = self._check(email, self.mx_records('gmail.com'))
+            self.verdicts.set(key, verdict)
+        return verdict
+
+    async def verify_async(self, email):
+        """verify() with a non-blocking MX lookup"""
+        if not email or not GMAIL_PATTERN.match(email):
             return False
-        
-        # Check if username contains only valid characters
-        if not re.match(r'^[a-zA-Z0-9._%+-]+$', username):
+
+        key = email.lower()
+        verdict = self.verdicts.get(key)
+        if verdict is None:
+            verdict = self._check(email, await self.mx_records_async('gmail.com'))
+            self.verdicts.set(key, verdict)
+        return verdict
+
+    def _check(self, email, mx_records):
+        # Method 1: Check MX records for gmail.com
+        # An empty answer rejects; a failed lookup falls through to the next method
+        if mx_records is not None and not mx_records:
             return False
-        
-        # For Gmail, we can also check if it's a valid format
-        # Gmail usernames can have dots but they're ignored
-        # So "john.doe" and "johndoe" are the same
-        
-        # Additional check: Gmail doesn't allow certain patterns
-        invalid_patterns = [
-            r'\.\.',  # Consecutive dots
-            r'^\.',   # Starting with dot
-            r'\.$',   # Ending with dot
-        ]
-        
-        for pattern in invalid_patterns:
-            if re.search(pattern, username):
+
+        # Method 2: SMTP verification (simplified)
+        # Note: This is a basic check. For production, use a proper email verification service
+        try:
+            # Extract username from email
+            username = email.split('@')[0]
+
+            # Check if username format is valid
+            if len(username) < 6 or len(username) > 30:
+                return False
+
+            # Check if username contains only valid characters
+            if not USERNAME_PATTERN.match(username):
                 return False
-        
-        # Method 3: Use Google's People API (requires API key)
-        # This is the most reliable but requires Google API setup
-        
-        return True
-        
-    except Exception as e:
-        print(f"Email verification error: {e}")
-        return False
+
+            # For Gmail, we can also check if it's a valid format
+            # Gmail usernames can have dots but they're ignored
+            # So "john.doe" and "johndoe" are the same
+            if INVALID_USERNAME_PATTERN.search(username):
+                return False
+
+            # Method 3: Use Google's People API (requires API key)
+            # This is the most reliable but requires Google API setup
+
+            return True
+
+        except Exception as e:
+            print(f"Email verification error: {e}")
+            return False
+
+
+# Process-wide verifier, shared by every request
+_verifier = EmailVerifier(
+    cache_size=config.VERIFY_CACHE_SIZE,
+    cache_ttl=config.VERIFY_CACHE_TTL
+)
+
+
+def verify_gmail(email):
+    """Verify if a Gmail ID exists"""
+    return _verifier.verify(email)
+
+
+async def verify_gmail_async(email):
+    """verify_gmail() for asyncio callers"""
+    return await _verifier.verify_async(email)
 
 # For production, use a service like:
 # - Hunter.io
@@ -1,10 +1,225 @@
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 from datetime import datetime
+import atexit
+import json
 import os
+import queue
+import random
+import threading
+import time
+import config
+from log_sink import RotatingLogSink, per_process_path, process_paths, read_process_logs
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; other processes' spools are then left alone
+    fcntl = None
+
+
+class SheetsLogShipper:
+    """Ships log rows to a sheet in batches from a background thread
+
+    Every row is first appended to a local spool file, so rows that could
+    not be shipped yet (API errors, rate limits, shutdown) are replayed on
+    the next start. `sheet` only needs an append_rows(rows, ...) method,
+    which lets a local stub stand in for gspread.
+
+    Each process spools to its own file (per_process_path of `spool_path`),
+    locked while the process runs; spools of processes that exited with
+    rows unshipped are taken over on start.
+    """
+
+    def __init__(self, sheet, spool_path, batch_size=50, flush_interval=5.0,
+                 backoff_base=1.0, backoff_max=300.0, shutdown_retries=2, process_id=None):
+        self.sheet = sheet
+        self.shared_spool_path = spool_path
+        self.spool_path = per_process_path(spool_path, process_id)
+        self.offset_path = self.spool_path + '.offset'
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.shutdown_retries = shutdown_retries
+
+        self._queue = queue.Queue()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._flush_requested = threading.Event()
+        self._unshipped = 0
+
+        directory = os.path.dirname(spool_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._spool = open(self.spool_path, 'ab')
+        if fcntl is not None:
+            fcntl.flock(self._spool, fcntl.LOCK_EX)
+        self._spool_size = self._spool.tell()
+        self._recover()
+        self._adopt_orphans()
+
+        self._thread = threading.Thread(target=self._run, name='sheets-shipper')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def enqueue(self, row):
+        """Durably record a row and queue it for the next batch"""
+        line = (json.dumps(row) + '\n').encode('utf-8')
+        with self._cond:
+            self._spool.write(line)
+            self._spool.flush()
+            os.fsync(self._spool.fileno())
+            self._spool_size += len(line)
+            self._unshipped += 1
+            self._queue.put((row, self._spool_size))
+
+    def flush(self, timeout=None):
+        """Ship everything queued so far; True if nothing is left unshipped"""
+        self._flush_requested.set()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._unshipped and self._thread.is_alive():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining if remaining is not None else 1.0)
+            return self._unshipped == 0
+
+    def close(self, timeout=30):
+        """Flush queued rows and stop the shipper thread"""
+        self._stop.set()
+        self._thread.join(timeout)
+        with self._cond:
+            self._spool.close()
+
+    def _recover(self):
+        # Queue rows a previous process with our id spooled but never shipped
+        for row, offset in _spooled_rows(self.spool_path, self.offset_path):
+            self._unshipped += 1
+            self._queue.put((row, offset))
+        if self._unshipped:
+            print(f"Replaying {self._unshipped} unshipped Google Sheets log rows")
+
+    def _adopt_orphans(self):
+        # Move the unshipped rows of exited processes into our own spool.
+        # Their spools are unlocked; a running process holds its lock.
+        if fcntl is None:
+            return
+        adopted = 0
+        for path in process_paths(self.shared_spool_path):
+            if path == self.spool_path:
+                continue
+            try:
+                orphan = open(path, 'rb')
+            except OSError:
+                continue
+            with orphan:
+                try:
+                    fcntl.flock(orphan, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    # Another process may have adopted and removed it meanwhile
+                    if os.fstat(orphan.fileno()).st_ino != os.stat(path).st_ino:
+                        continue
+                except OSError:
+                    continue
+                for row, _ in _spooled_rows(path, path + '.offset'):
+                    self.enqueue(row)
+                    adopted += 1
+                for leftover in (path, path + '.offset'):
+                    try:
+                        os.remove(leftover)
+                    except OSError:
+                        pass
+        if adopted:
+            print(f"Took over {adopted} unshipped Google Sheets log rows of exited processes")
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = 0.5 if deadline is None else max(0, min(0.5, deadline - time.monotonic()))
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            except queue.Empty:
+                pass
+
+            stopping = self._stop.is_set()
+            due = deadline is not None and time.monotonic() >= deadline
+            if batch and (len(batch) >= self.batch_size or due or stopping
+                          or self._flush_requested.is_set()):
+                if not self._ship(batch):
+                    # Left in the spool for the next start
+                    return
+                batch = []
+                deadline = None
+                if self._queue.empty():
+                    self._flush_requested.clear()
+
+            if stopping and not batch and self._queue.empty():
+                return
+
+    def _ship(self, batch):
+        rows = [row for row, _ in batch]
+        attempt = 0
+        while True:
+            try:
+                self.sheet.append_rows(rows, value_input_option='RAW')
+                break
+            except Exception as e:
+                attempt += 1
+                if self._stop.is_set() and attempt > self.shutdown_retries:
+                    print(f"Giving up on {len(rows)} Google Sheets rows at shutdown: {e}")
+                    return False
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+                delay *= random.uniform(0.5, 1.0)
+                print(f"Failed to log to Google Sheets ({e}), retrying in {delay:.1f}s")
+                self._stop.wait(delay)
+
+        self._commit(batch[-1][1], len(batch))
+        return True
+
+    def _commit(self, offset, count):
+        with self._cond:
+            self._unshipped -= count
+            if not self._unshipped and offset == self._spool_size:
+                # Everything is shipped, start a fresh spool
+                self._spool.truncate(0)
+                self._spool.seek(0)
+                self._spool_size = offset = 0
+            tmp_path = self.offset_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                f.write(str(offset))
+            os.replace(tmp_path, self.offset_path)
+            self._cond.notify_all()
+
+
+def _spooled_rows(spool_path, offset_path):
+    """(row, end offset) of the rows a spool holds past its shipped offset"""
+    try:
+        with open(offset_path) as f:
+            offset = int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        offset = 0
+
+    rows = []
+    with open(spool_path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            offset += len(line)
+            try:
+                rows.append((json.loads(line), offset))
+            except ValueError:
+                continue
+    return rows
+
+
+# Columns of the local scan log
+LOG_FIELDS = ['timestamp', 'gmail', 'scan_type', 'target', 'vuln_stage']
+# Time each row was written; rows are in this order in every process's log
+LOG_ORDER_FIELD = 'logged_at'
+
 
 class GoogleSheetsLogger:
-    def __init__(self):
+    def __init__(self, sheet=None):
         self.scope = ['https://spreadsheets.google.com/feeds',
                       'https://www.googleapis.com/auth/drive']
         
@@ -12,9 +227,17 @@ class GoogleSheetsLogger:
         # https://console.developers.google.com/
         self.credentials_file = 'config/google_credentials.json'
         self.sheet_name = 'WebScan Logs'
+        self.sheet = sheet
+        self.client = None
         
         try:
-            if os.path.exists(self.credentials_file):
+            if sheet is not None:
+                # Caller-provided sheet (or a local stub), no OAuth needed
+                pass
+            elif os.path.exists(self.credentials_file):
+                # Imported here: gspread and oauth2client are slow to import
+                import gspread
+                from oauth2client.service_account import ServiceAccountCredentials
                 self.creds = ServiceAccountCredentials.from_json_keyfile_name(
                     self.credentials_file, self.scope)
                 self.client = gspread.authorize(self.creds)
@@ -25,6 +248,31 @@ class GoogleSheetsLogger:
         except Exception as e:
             print(f"Failed to initialize Google Sheets: {e}")
             self.client = None
+            self.sheet = None
+        
+        # Local fallback log, written by its own thread to this process's file
+        self.file_sink = RotatingLogSink(
+            config.LOG_FILE_PATH,
+            LOG_FIELDS,
+            fmt=config.LOG_FILE_FORMAT,
+            max_bytes=config.LOG_FILE_MAX_BYTES,
+            rotate_interval=config.LOG_FILE_ROTATE_INTERVAL,
+            backup_count=config.LOG_FILE_BACKUPS,
+            stamp_field=LOG_ORDER_FIELD,
+            per_process=True
+        )
+        atexit.register(self.file_sink.close)
+        
+        # Rows are shipped in batches off the scan threads
+        self.shipper = None
+        if self.sheet is not None:
+            self.shipper = SheetsLogShipper(
+                self.sheet,
+                config.SHEETS_SPOOL_PATH,
+                batch_size=config.SHEETS_BATCH_SIZE,
+                flush_interval=config.SHEETS_FLUSH_INTERVAL
+            )
+            atexit.register(self.shipper.close)
     
     def setup_sheet(self):
         """Create or get the logging sheet"""
@@ -39,9 +287,9 @@ class GoogleSheetsLogger:
             self.sheet.append_row(headers)
     
     def log_scan(self, scan_data):
-        """Log scan data to Google Sheets"""
+        """Queue scan data for the next batch shipped to Google Sheets"""
         try:
-            if self.client:
+            if self.shipper:
                 row = [
                     scan_data['timestamp'],
                     scan_data['gmail'],
@@ -49,19 +297,21 @@ class GoogleSheetsLogger:
                     scan_data['target'],
                     scan_data['vuln_stage']
                 ]
-                self.sheet.append_row(row)
-                print("Successfully logged to Google Sheets")
+                self.shipper.enqueue(row)
             else:
                 # Log to local file as fallback
                 self.log_to_file(scan_data)
         except Exception as e:
-            print(f"Failed to log to Google Sheets: {e}")
+            print(f"Failed to queue Google Sheets log row: {e}")
             self.log_to_file(scan_data)
     
     def log_to_file(self, scan_data):
-        """Fallback logging to local file"""
-        log_file = 'scan_logs.txt'
-        with open(log_file, 'a') as f:
-            f.write(f"{scan_data['timestamp']},{scan_data['gmail']},"
-                   f"{scan_data['scan_type']},{scan_data['target']},"
-                   f"{scan_data['vuln_stage']}\n")
+        """Fallback logging to the local rotating log"""
+        self.file_sink.write(scan_data)
+    
+    def history(self, since=None, until=None, **filters):
+        """Stream logged scans from the local logs of all processes, e.g. history(gmail=...)"""
+        self.file_sink.flush()
+        return read_process_logs(config.LOG_FILE_PATH, config.LOG_FILE_FORMAT,
+                                 order_field=LOG_ORDER_FIELD,
+                                 since=since, until=until, **filters)
@@ -0,0 +1,243 @@
+import re
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Headers every response should carry, with the note shown when present.
+# Strict-Transport-Security only counts for HTTPS responses.
+SECURITY_HEADERS = {
+    'strict-transport-security': 'HSTS is implemented - Good',
+    'content-security-policy': 'CSP is implemented - Good',
+    'x-frame-options': 'Clickjacking protection - Good',
+    'x-content-type-options': 'MIME sniffing protection - Good',
+    'referrer-policy': 'Referrer policy is set - Good',
+    'permissions-policy': 'Permissions policy is set - Good',
+}
+
+# Canonical spelling of header names in reports
+HEADER_TITLES = {
+    'strict-transport-security': 'Strict-Transport-Security',
+    'content-security-policy': 'Content-Security-Policy',
+    'x-frame-options': 'X-Frame-Options',
+    'x-content-type-options': 'X-Content-Type-Options',
+    'referrer-policy': 'Referrer-Policy',
+    'permissions-policy': 'Permissions-Policy',
+    'x-xss-protection': 'X-XSS-Protection',
+}
+
+# Six months, the minimum max-age accepted for HSTS preloading
+HSTS_MIN_MAX_AGE = 15552000
+
+# Points taken off the header score per configuration issue
+ISSUE_PENALTY = 5
+
+HSTS_MAX_AGE = re.compile(r'max-age\s*=\s*"?(\d+)"?', re.IGNORECASE)
+
+
+class HeaderProbe:
+    """HTTP header probe on a pooled, keep-alive requests session
+
+    Replaces forking `curl -I -L` per target: connections are reused across
+    probes, and the result holds parsed header maps as well as curl-style
+    text for the rule engine.
+    """
+
+    def __init__(self, timeout=15, max_redirects=10, pool_size=20, verify_tls=True,
+                 user_agent='WebScan-Professional/1.0'):
+        self.timeout = timeout
+        self.verify_tls = verify_tls
+        self.session = requests.Session()
+        self.session.max_redirects = max_redirects
+        self.session.headers['User-Agent'] = user_agent
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def probe(self, target, timeout=None):
+        """HEAD the target, following redirects; falls back to GET if HEAD is refused"""
+        url = target if '://' in target else f'http://{target}'
+        timeout = timeout or self.timeout
+        start = time.monotonic()
+        response = self.session.head(
+            url, allow_redirects=True, timeout=timeout, verify=self.verify_tls
+        )
+        if response.status_code in (405, 501):
+            # Body is never read; the connection goes back to the pool on close
+            response = self.session.get(
+                url, allow_redirects=True, timeout=timeout,
+                verify=self.verify_tls, stream=True
+            )
+            response.close()
+
+        hops = list(response.history) + [response]
+        return {
+            'url': response.url,
+            'status': response.status_code,
+            'headers': header_map(response),
+            'set_cookies': set_cookie_headers(response),
+            'redirects': [{'url': hop.url, 'status': hop.status_code} for hop in response.history],
+            'raw': ''.join(raw_headers(hop) for hop in hops),
+            'elapsed': round(time.monotonic() - start, 3),
+        }
+
+    def close(self):
+        self.session.close()
+
+
+def header_map(response):
+    """Response headers keyed by lower-case name; repeated headers are joined"""
+    return {name.lower(): value for name, value in response.headers.items()}
+
+
+def set_cookie_headers(response):
+    """Every Set-Cookie header of a response, unmerged"""
+    raw = getattr(response.raw, 'headers', None)
+    if raw is not None and hasattr(raw, 'getlist'):
+        return raw.getlist('Set-Cookie')
+    cookie = response.headers.get('Set-Cookie')
+    return [cookie] if cookie else []
+
+
+def raw_headers(response):
+    """One response's status line and headers, as curl -I prints them"""
+    version = {10: 'HTTP/1.0', 11: 'HTTP/1.1', 20: 'HTTP/2'}.get(
+        getattr(response.raw, 'version', 11), 'HTTP/1.1')
+    lines = [f'{version} {response.status_code} {response.reason or ""}'.rstrip()]
+    # The raw urllib3 headers keep repeated headers (Set-Cookie) apart
+    headers = getattr(response.raw, 'headers', None) or response.headers
+    lines.extend(f'{name}: {value}' for name, value in headers.items())
+    return '\r\n'.join(lines) + '\r\n\r\n'
+
+
+def parse_csp(value):
+    """Content-Security-Policy directives mapped to their source lists"""
+    directives = {}
+    for part in value.split(';'):
+        tokens = part.split()
+        if tokens:
+            directives.setdefault(tokens[0].lower(), [t.lower() for t in tokens[1:]])
+    return directives
+
+
+def parse_cookie(header):
+    """Name and security attributes of one Set-Cookie header"""
+    parts = [part.strip() for part in header.split(';')]
+    attributes = {}
+    for part in parts[1:]:
+        key, _, value = part.partition('=')
+        attributes[key.strip().lower()] = value.strip()
+    return {
+        'name': parts[0].split('=', 1)[0].strip(),
+        'secure': 'secure' in attributes,
+        'httponly': 'httponly' in attributes,
+        'samesite': attributes.get('samesite') or None,
+    }
+
+
+def _issue(rule_id, severity, title, description, recommendation):
+    return {'rule_id': rule_id, 'severity': severity, 'title': title,
+            'description': description, 'recommendation': recommendation}
+
+
+def analyze_security_headers(headers, set_cookies=(), url=''):
+    """Security review of a parsed header map
+
+    Returns present/missing headers and a score as before, plus the parsed
+    HSTS, CSP and cookie settings and a list of configuration issues.
+    """
+    https = url.lower().startswith('https://')
+    present = []
+    missing = []
+    issues = []
+
+    for name, description in SECURITY_HEADERS.items():
+        if name in headers:
+            present.append(description)
+        elif name != 'strict-transport-security' or https:
+            missing.append(f"Missing {HEADER_TITLES[name]}")
+    if 'x-xss-protection' in headers:
+        # Deprecated, so only reported when present
+        present.append('XSS protection - Good')
+
+    hsts = None
+    if 'strict-transport-security' in headers:
+        value = headers['strict-transport-security']
+        match = HSTS_MAX_AGE.search(value)
+        hsts = {
+            'max_age': int(match.group(1)) if match else None,
+            'include_subdomains': 'includesubdomains' in value.lower(),
+            'preload': 'preload' in value.lower(),
+        }
+        if hsts['max_age'] is None or hsts['max_age'] < HSTS_MIN_MAX_AGE:
+            issues.append(_issue(
+                'header-hsts-max-age', 'Medium', 'HSTS max-age too short',
+                f"Strict-Transport-Security max-age is {hsts['max_age']} seconds.",
+                'Set max-age to at least 15552000 seconds (180 days)'))
+
+    csp = None
+    if 'content-security-policy' in headers:
+        csp = parse_csp(headers['content-security-policy'])
+        scripts = csp.get('script-src', csp.get('default-src'))
+        if scripts is None:
+            issues.append(_issue(
+                'header-csp-no-script-src', 'Medium', 'CSP does not restrict scripts',
+                'The policy has neither script-src nor default-src.',
+                'Add a script-src or default-src directive'))
+        else:
+            if "'unsafe-inline'" in scripts:
+                issues.append(_issue(
+                    'header-csp-unsafe-inline', 'Medium', "CSP allows 'unsafe-inline' scripts",
+                    'Inline scripts are allowed, which defeats most XSS protection.',
+                    "Remove 'unsafe-inline' and use nonces or hashes"))
+            if "'unsafe-eval'" in scripts:
+                issues.append(_issue(
+                    'header-csp-unsafe-eval', 'Low', "CSP allows 'unsafe-eval'",
+                    'eval() and similar functions are allowed.',
+                    "Remove 'unsafe-eval'"))
+            if any(source in ('*', 'http:', 'https:', 'data:') for source in scripts):
+                issues.append(_issue(
+                    'header-csp-wildcard', 'Medium', 'CSP allows scripts from any host',
+                    'script sources include a wildcard or bare scheme.',
+                    'List the script origins explicitly'))
+
+    if 'x-content-type-options' in headers and headers['x-content-type-options'].strip().lower() != 'nosniff':
+        issues.append(_issue(
+            'header-xcto-value', 'Low', 'Invalid X-Content-Type-Options value',
+            f"X-Content-Type-Options is '{headers['x-content-type-options']}'.",
+            'Set X-Content-Type-Options to nosniff'))
+
+    if 'x-frame-options' in headers and headers['x-frame-options'].strip().upper() not in ('DENY', 'SAMEORIGIN'):
+        issues.append(_issue(
+            'header-xfo-value', 'Low', 'Invalid X-Frame-Options value',
+            f"X-Frame-Options is '{headers['x-frame-options']}'.",
+            'Set X-Frame-Options to DENY or SAMEORIGIN'))
+    elif 'x-frame-options' not in headers and csp and 'frame-ancestors' in csp:
+        # frame-ancestors supersedes X-Frame-Options
+        missing.remove('Missing X-Frame-Options')
+        present.append('Clickjacking protection (CSP frame-ancestors) - Good')
+
+    cookies = [parse_cookie(header) for header in set_cookies]
+    for flag, label, severity in (('secure', 'Secure', 'Medium'),
+                                  ('httponly', 'HttpOnly', 'Low'),
+                                  ('samesite', 'SameSite', 'Low')):
+        if flag == 'secure' and not https:
+            continue
+        names = [cookie['name'] for cookie in cookies if not cookie[flag]]
+        if names:
+            issues.append(_issue(
+                f'cookie-no-{flag}', severity, f'Cookies without the {label} flag',
+                f"Cookies set without {label}: {', '.join(names)}.",
+                f'Set the {label} attribute on every cookie'))
+
+    checked = len(present) + len(missing)
+    score = round(100 * len(present) / checked) if checked else 0
+    return {
+        'present': present,
+        'missing': missing,
+        'score': max(0, min(100, score) - ISSUE_PENALTY * len(issues)),
+        'issues': issues,
+        'hsts': hsts,
+        'csp': csp,
+        'cookies': cookies,
+    }
@@ -0,0 +1,421 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from scan_scheduler import PRIORITIES, QueueFullError
+
+
+class QueuedJob:
+    """A scan taken off the shared queue by a worker"""
+
+    def __init__(self, scan_id, user, args, priority, attempts):
+        self.scan_id = scan_id
+        self.user = user
+        self.args = args
+        self.priority = priority
+        # Including this one; above 1 means an earlier worker was lost
+        self.attempts = attempts
+
+
+class SQLiteJobQueue:
+    """Scan jobs in an SQLite table shared by the web app and the workers
+
+    Offers the ScanScheduler interface to the web tier (submit, cancel,
+    position, stats) plus claim/heartbeat/complete for worker.py. A claimed
+    job holds a lease that its worker renews; jobs whose lease runs out,
+    because the worker died, go back to the queue.
+
+    Interactive jobs are claimed before bulk ones, and users with fewer
+    running scans go first, up to `per_user_limit` running scans each.
+    """
+
+    def __init__(self, path, max_queue=1000, per_user_limit=2):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_queue = max_queue
+        self.per_user_limit = max(1, per_user_limit)
+        self._local = threading.local()
+        with self._transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    scan_id TEXT UNIQUE NOT NULL,
+                    user TEXT,
+                    priority INTEGER NOT NULL,
+                    args TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    worker TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    enqueued_at REAL,
+                    lease_until REAL
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, priority, seq)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit; writes take the lock up front in _transaction()
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def submit(self, scan_id, user, *args, priority='interactive'):
+        """Queue a scan, raising QueueFullError when the queue is at capacity"""
+        self.submit_many([(scan_id, user, args)], priority=priority)
+
+    def submit_many(self, jobs, priority='interactive'):
+        """Queue several (scan_id, user, args) jobs; all of them or none"""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        now = time.time()
+        with self._transaction() as conn:
+            queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE state = 'queued'").fetchone()[0]
+            if queued + len(jobs) > self.max_queue:
+                raise QueueFullError('Scan queue is full, please retry later')
+            conn.executemany(
+                'INSERT INTO jobs (scan_id, user, priority, args, state, enqueued_at) '
+                "VALUES (?, ?, ?, ?, 'queued', ?)",
+                [(scan_id, user, PRIORITIES.index(priority), json.dumps(list(args)), now)
+                 for scan_id, user, args in jobs]
+            )
+
+    def cancel(self, scan_id):
+        """Remove a queued scan and return True; flag a running one for its worker"""
+        with self._transaction() as conn:
+            row = conn.execute('SELECT state FROM jobs WHERE scan_id = ?', (scan_id,)).fetchone()
+            if row is None:
+                return False
+            if row[0] == 'queued':
+                conn.execute('DELETE FROM jobs WHERE scan_id = ?', (scan_id,))
+                return True
+            conn.execute('UPDATE jobs SET cancel_requested = 1 WHERE scan_id = ?', (scan_id,))
+            return False
+
+    def position(self, scan_id):
+        """1-based position of a queued scan in claim order, ignoring per-user turns"""
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT priority, seq FROM jobs WHERE scan_id = ? AND state = 'queued'", (scan_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE state = 'queued' "
+            'AND (priority < ? OR (priority = ? AND seq <= ?))',
+            (row[0], row[0], row[1])
+        ).fetchone()[0]
+
+    def stats(self):
+        """Snapshot of queue depth and running jobs across all workers"""
+        rows = self._connect().execute(
+            'SELECT state, priority, COUNT(*), COUNT(DISTINCT worker) FROM jobs '
+            'GROUP BY state, priority'
+        ).fetchall()
+        queued = {priority: 0 for priority in PRIORITIES}
+        running = {priority: 0 for priority in PRIORITIES}
+        for state, priority, count, _ in rows:
+            (queued if state == 'queued' else running)[PRIORITIES[priority]] += count
+        return {
+            'queued': sum(queued.values()),
+            'queued_by_priority': queued,
+            'running': sum(running.values()),
+            'running_bulk': running['bulk'],
+        }
+
+    def claim(self, worker_id, priorities=PRIORITIES, lease=60):
+        """Take the next job for a worker, or None if there is nothing to run"""
+        now = time.time()
+        ranks = [PRIORITIES.index(priority) for priority in priorities]
+        placeholders = ', '.join('?' for _ in ranks)
+        running_jobs = ("(SELECT COUNT(*) FROM jobs r WHERE r.state = 'running' "
+                        'AND r.user = j.user)')
+        with self._transaction() as conn:
+            # Jobs of workers that stopped renewing their lease
+            conn.execute(
+                "UPDATE jobs SET state = 'queued', worker = NULL "
+                "WHERE state = 'running' AND lease_until < ?", (now,))
+            row = conn.execute(
+                'SELECT seq, scan_id, user, priority, args, attempts FROM jobs j '
+                f"WHERE state = 'queued' AND priority IN ({placeholders}) "
+                f'AND {running_jobs} < ? '
+                f'ORDER BY priority, {running_jobs}, seq LIMIT 1',
+                ranks + [self.per_user_limit]
+            ).fetchone()
+            if row is None:
+                return None
+            seq, scan_id, user, priority, args, attempts = row
+            conn.execute(
+                "UPDATE jobs SET state = 'running', worker = ?, attempts = ?, lease_until = ? "
+                'WHERE seq = ?', (worker_id, attempts + 1, now + lease, seq))
+        return QueuedJob(scan_id, user, tuple(json.loads(args)), PRIORITIES[priority],
+                         attempts + 1)
+
+    def heartbeat(self, worker_id, scan_ids, lease=60):
+        """Renew the leases of a worker's running jobs"""
+        if not scan_ids:
+            return
+        placeholders = ', '.join('?' for _ in scan_ids)
+        with self._transaction() as conn:
+            conn.execute(
+                f'UPDATE jobs SET lease_until = ? WHERE worker = ? AND scan_id IN ({placeholders})',
+                [time.time() + lease, worker_id] + list(scan_ids))
+
+    def cancel_requested(self, scan_ids):
+        """Those of `scan_ids` that were cancelled while running"""
+        if not scan_ids:
+            return set()
+        placeholders = ', '.join('?' for _ in scan_ids)
+        rows = self._connect().execute(
+            f'SELECT scan_id FROM jobs WHERE cancel_requested = 1 AND scan_id IN ({placeholders})',
+            list(scan_ids)
+        ).fetchall()
+        return {row[0] for row in rows}
+
+    def complete(self, scan_id, worker_id):
+        """Drop a finished job, unless its lease has passed to another worker"""
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM jobs WHERE scan_id = ? AND worker = ?', (scan_id, worker_id))
+
+
+class RedisJobQueue:
+    """Scan jobs in Redis instead of the SQLite jobs table
+
+    One list per priority holds queued scan_ids, a hash per job its
+    arguments, a sorted set the running jobs by lease expiry and a hash
+    the running jobs per user. Needs the `redis` package. As with
+    SQLiteJobQueue, users with fewer running scans go first, up to
+    `per_user_limit` running scans each; otherwise jobs are claimed in
+    FIFO order per priority.
+
+    This is only the queue. For workers on other hosts than the web app,
+    scan records, events, batches and baselines must be shared too, with
+    the redis result store (WEBSCAN_RESULT_STORE=redis); the sqlite one
+    lives on the web app's local disk.
+    """
+
+    # Checks the capacity and queues the jobs in one step, so concurrent
+    # submits cannot both pass the check
+    SUBMIT_SCRIPT = """
+        local queued = 0
+        for i = 1, #KEYS do
+            queued = queued + redis.call('LLEN', KEYS[i])
+        end
+        local count = (#ARGV - 4) / 3
+        if queued + count > tonumber(ARGV[1]) then
+            return false
+        end
+        local queue = KEYS[tonumber(ARGV[2])]
+        for i = 5, #ARGV, 3 do
+            redis.call('HSET', ARGV[3] .. ARGV[i], 'user', ARGV[i + 1], 'priority', ARGV[4],
+                       'args', ARGV[i + 2], 'attempts', 0, 'worker', '')
+            redis.call('RPUSH', queue, ARGV[i])
+        end
+        return count
+    """
+
+    # Takes the first job of the users with the fewest running jobs, below
+    # the per-user limit, and moves it to the running set in one step, so a
+    # worker dying mid-claim cannot drop it from both
+    CLAIM_SCRIPT = """
+        local limit = tonumber(ARGV[4])
+        local best, best_user, best_running
+        for _, scan_id in ipairs(redis.call('LRANGE', KEYS[1], 0, -1)) do
+            local user = redis.call('HGET', ARGV[3] .. scan_id, 'user') or ''
+            local running = tonumber(redis.call('HGET', KEYS[3], user) or '0')
+            if running < limit and (not best or running < best_running) then
+                best, best_user, best_running = scan_id, user, running
+                if running == 0 then
+                    break
+                end
+            end
+        end
+        if not best then
+            return false
+        end
+        local job = ARGV[3] .. best
+        redis.call('LREM', KEYS[1], 1, best)
+        redis.call('ZADD', KEYS[2], ARGV[1], best)
+        redis.call('HINCRBY', KEYS[3], best_user, 1)
+        redis.call('HSET', job, 'worker', ARGV[2])
+        redis.call('HINCRBY', job, 'attempts', 1)
+        return {best, redis.call('HGETALL', job)}
+    """
+
+    # Puts jobs whose lease ran out back at the head of their queue
+    REQUEUE_SCRIPT = """
+        local expired = redis.call('ZRANGEBYSCORE', KEYS[1], 0, ARGV[1])
+        for _, scan_id in ipairs(expired) do
+            redis.call('ZREM', KEYS[1], scan_id)
+            local job = ARGV[2] .. scan_id
+            local priority, user = unpack(redis.call('HMGET', job, 'priority', 'user'))
+            if user and redis.call('HINCRBY', KEYS[2], user, -1) <= 0 then
+                redis.call('HDEL', KEYS[2], user)
+            end
+            -- A job whose hash is gone was completed meanwhile
+            if priority then
+                redis.call('HSET', job, 'worker', '')
+                redis.call('LPUSH', ARGV[3] .. priority, scan_id)
+            end
+        end
+        return #expired
+    """
+
+    # Drops a finished job, unless its lease has passed to another worker
+    COMPLETE_SCRIPT = """
+        local job = ARGV[2] .. ARGV[1]
+        if redis.call('HGET', job, 'worker') ~= ARGV[3] then
+            return 0
+        end
+        local user = redis.call('HGET', job, 'user')
+        if redis.call('ZREM', KEYS[1], ARGV[1]) == 1 and user
+                and redis.call('HINCRBY', KEYS[3], user, -1) <= 0 then
+            redis.call('HDEL', KEYS[3], user)
+        end
+        redis.call('SREM', KEYS[2], ARGV[1])
+        redis.call('DEL', job)
+        return 1
+    """
+
+    def __init__(self, url, max_queue=1000, per_user_limit=2, prefix='webscan'):
+        import redis
+
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.max_queue = max_queue
+        self.per_user_limit = max(1, per_user_limit)
+        self.prefix = prefix
+        self._submit_script = self.redis.register_script(self.SUBMIT_SCRIPT)
+        self._claim_script = self.redis.register_script(self.CLAIM_SCRIPT)
+        self._requeue_script = self.redis.register_script(self.REQUEUE_SCRIPT)
+        self._complete_script = self.redis.register_script(self.COMPLETE_SCRIPT)
+
+    def _queue(self, priority):
+        return f'{self.prefix}:queue:{priority}'
+
+    def _job(self, scan_id):
+        return f'{self.prefix}:job:{scan_id}'
+
+    @property
+    def _running(self):
+        return f'{self.prefix}:running'
+
+    @property
+    def _running_users(self):
+        return f'{self.prefix}:running_users'
+
+    @property
+    def _cancelled(self):
+        return f'{self.prefix}:cancelled'
+
+    def submit(self, scan_id, user, *args, priority='interactive'):
+        """Queue a scan, raising QueueFullError when the queue is at capacity"""
+        self.submit_many([(scan_id, user, args)], priority=priority)
+
+    def submit_many(self, jobs, priority='interactive'):
+        """Queue several (scan_id, user, args) jobs; all of them or none"""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        if not jobs:
+            return
+        fields = []
+        for scan_id, user, args in jobs:
+            fields += [scan_id, user or '', json.dumps(list(args))]
+        queued = self._submit_script(
+            keys=[self._queue(p) for p in PRIORITIES],
+            args=[self.max_queue, PRIORITIES.index(priority) + 1, self._job(''), priority]
+            + fields)
+        if not queued:
+            raise QueueFullError('Scan queue is full, please retry later')
+
+    def cancel(self, scan_id):
+        """Remove a queued scan and return True; flag a running one for its worker"""
+        for priority in PRIORITIES:
+            if self.redis.lrem(self._queue(priority), 0, scan_id):
+                self.redis.delete(self._job(scan_id))
+                return True
+        if self.redis.zscore(self._running, scan_id) is not None:
+            self.redis.sadd(self._cancelled, scan_id)
+        return False
+
+    def position(self, scan_id):
+        """1-based position of a queued scan in claim order"""
+        offset = 0
+        for priority in PRIORITIES:
+            index = self.redis.lpos(self._queue(priority), scan_id)
+            if index is not None:
+                return offset + index + 1
+            offset += self.redis.llen(self._queue(priority))
+        return None
+
+    def stats(self):
+        """Snapshot of queue depth and running jobs across all workers"""
+        queued = {priority: self.redis.llen(self._queue(priority)) for priority in PRIORITIES}
+        return {
+            'queued': sum(queued.values()),
+            'queued_by_priority': queued,
+            'running': self.redis.zcard(self._running),
+        }
+
+    def _requeue_expired(self):
+        self._requeue_script(keys=[self._running, self._running_users],
+                             args=[time.time(), self._job(''), self._queue('')])
+
+    def claim(self, worker_id, priorities=PRIORITIES, lease=60):
+        """Take the next job for a worker, or None if there is nothing to run"""
+        self._requeue_expired()
+        for priority in priorities:
+            claimed = self._claim_script(
+                keys=[self._queue(priority), self._running, self._running_users],
+                args=[time.time() + lease, worker_id, self._job(''), self.per_user_limit])
+            if not claimed:
+                continue
+            scan_id, fields = claimed
+            job = dict(zip(fields[::2], fields[1::2]))
+            return QueuedJob(scan_id, job.get('user'), tuple(json.loads(job.get('args', '[]'))),
+                             priority, int(job.get('attempts', 1)))
+        return None
+
+    def heartbeat(self, worker_id, scan_ids, lease=60):
+        """Renew the leases of a worker's running jobs"""
+        if scan_ids:
+            self.redis.zadd(self._running, {scan_id: time.time() + lease for scan_id in scan_ids},
+                            xx=True)
+
+    def cancel_requested(self, scan_ids):
+        """Those of `scan_ids` that were cancelled while running"""
+        return {scan_id for scan_id in scan_ids if self.redis.sismember(self._cancelled, scan_id)}
+
+    def complete(self, scan_id, worker_id):
+        """Drop a finished job, unless its lease has passed to another worker"""
+        self._complete_script(keys=[self._running, self._cancelled, self._running_users],
+                              args=[scan_id, self._job(''), worker_id])
+
+
+def create_job_queue(settings):
+    """Job queue named by WEBSCAN_JOB_QUEUE: a redis:// URL or an SQLite path"""
+    url = settings.JOB_QUEUE_URL
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisJobQueue(url, max_queue=settings.SCAN_QUEUE_SIZE,
+                             per_user_limit=settings.SCAN_PER_USER_LIMIT)
+    if url.startswith('sqlite:///'):
+        url = url[len('sqlite:///'):]
+    return SQLiteJobQueue(url, max_queue=settings.SCAN_QUEUE_SIZE,
+                          per_user_limit=settings.SCAN_PER_USER_LIMIT)
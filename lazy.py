@@ -0,0 +1,36 @@
+import threading
+
+
+class LazyObject:
+    """Stand-in that builds the real object on first use
+
+    Construction happens once, under a lock, in whichever thread touches
+    the object first; attribute access is then forwarded to it.
+    """
+
+    def __init__(self, factory, name=None):
+        self._factory = factory
+        self._name = name or getattr(factory, '__name__', 'object')
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+                instance = self._instance
+        return instance
+
+    @property
+    def initialized(self):
+        return self._instance is not None
+
+    def __getattr__(self, name):
+        # Only reached for attributes the proxy itself does not have
+        return getattr(self.get(), name)
+
+    def __repr__(self):
+        state = 'initialized' if self.initialized else 'not initialized'
+        return f"<LazyObject {self._name} ({state})>"
@@ -0,0 +1,346 @@
+import csv
+import glob
+import gzip
+import heapq
+import io
+import json
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; files of exited processes are then left alone
+    fcntl = None
+
+FORMATS = ('csv', 'jsonl')
+
+# Suffix of rotated files: the time they were closed
+ROTATED_TIME_FORMAT = '%Y%m%dT%H%M%S'
+
+_STOP = object()
+
+
+class RotatingLogSink:
+    """Append-only record log written by a single background thread
+
+    Records are dicts with the keys in `fields`, encoded as CSV (with a
+    header row) or JSON lines. The current file is rotated once it grows past
+    `max_bytes` or gets older than `rotate_interval` seconds; rotated files
+    are gzipped and only the newest `backup_count` are kept.
+
+    With `stamp_field`, the writer thread sets that field to the time each
+    record is written, so it increases in file order (see read_process_logs).
+
+    With `per_process`, the sink writes per_process_path(path) and locks it
+    while it is open. `backup_count` then covers the rotated files of every
+    process sharing `path`, and the current files of processes that exited
+    are rotated when the sink starts.
+    """
+
+    def __init__(self, path, fields, fmt='csv', max_bytes=10 * 1024 * 1024,
+                 rotate_interval=86400, backup_count=30, stamp_field=None,
+                 per_process=False, process_id=None):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown log format {fmt}")
+        self.shared_path = path
+        self.per_process = per_process
+        self.path = per_process_path(path, process_id) if per_process else path
+        self.fields = list(fields)
+        self.stamp_field = stamp_field
+        if stamp_field and stamp_field not in self.fields:
+            self.fields.append(stamp_field)
+        self.fmt = fmt
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backup_count = backup_count
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._queue = queue.Queue()
+        self._file = None
+        self._opened_at = None
+        if per_process:
+            self._rotate_orphans()
+        self._writer = threading.Thread(target=self._run, name='log-sink')
+        self._writer.daemon = True
+        self._writer.start()
+
+    def write(self, record):
+        """Queue a record; it is written by the sink's thread"""
+        self._queue.put(record)
+
+    def flush(self):
+        """Block until every record queued so far is on disk"""
+        if not self._writer.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def close(self, timeout=10):
+        self._queue.put(_STOP)
+        self._writer.join(timeout)
+
+    # Writer thread
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            # Drain whatever else is waiting, so a burst is one write + flush
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = False
+            for item in batch:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    self._flush_file()
+                    item.set()
+                else:
+                    try:
+                        self._write_record(item)
+                    except Exception as e:
+                        print(f"Failed to write log record: {e}")
+            self._flush_file()
+
+            if stop:
+                if self._file:
+                    self._file.close()
+                    self._file = None
+                return
+
+    def _write_record(self, record):
+        if self._file is None:
+            self._open()
+        elif self._should_rotate():
+            self._rotate()
+            self._open()
+
+        if self.stamp_field:
+            record = dict(record, **{self.stamp_field: datetime.now().isoformat()})
+        if self.fmt == 'csv':
+            self._csv.writerow({key: record.get(key, '') for key in self.fields})
+        else:
+            self._file.write(json.dumps({key: record.get(key) for key in self.fields}) + '\n')
+
+    def _open(self):
+        if self.fmt == 'csv' and csv_header(self.path) not in (None, self.fields):
+            # Written with other columns, e.g. before stamp_field was added
+            rotate_file(self.path)
+            self._prune()
+        exists = os.path.exists(self.path) and os.path.getsize(self.path) > 0
+        self._file = open(self.path, 'a', newline='', encoding='utf-8')
+        if self.per_process and fcntl is not None:
+            try:
+                fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                # Another sink of this process has it; it is not an orphan either way
+                pass
+        self._opened_at = time.time()
+        if self.fmt == 'csv':
+            self._csv = csv.DictWriter(self._file, fieldnames=self.fields)
+            if not exists:
+                self._csv.writeheader()
+
+    def _flush_file(self):
+        if self._file:
+            self._file.flush()
+
+    def _should_rotate(self):
+        if self._file.tell() >= self.max_bytes:
+            return True
+        return self.rotate_interval and time.time() - self._opened_at >= self.rotate_interval
+
+    def _rotate(self):
+        # Closed after the rotation, so the lock keeps other sinks off the
+        # file meanwhile (Windows cannot remove an open file, and has no lock)
+        self._file.flush()
+        if fcntl is None:
+            self._file.close()
+        rotate_file(self.path)
+        self._file.close()
+        self._file = None
+        self._prune()
+
+    def _prune(self):
+        paths = process_paths(self.shared_path) if self.per_process else [self.path]
+        prune_rotated(paths, self.backup_count)
+
+    def _rotate_orphans(self):
+        # Current files of exited processes are unlocked; a running sink holds its lock
+        if fcntl is None:
+            return
+        for path in process_paths(self.shared_path):
+            if path == self.path:
+                continue
+            try:
+                orphan = open(path, 'rb')
+            except OSError:
+                continue
+            with orphan:
+                try:
+                    fcntl.flock(orphan, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    # Another sink may have rotated it meanwhile
+                    if os.fstat(orphan.fileno()).st_ino != os.stat(path).st_ino:
+                        continue
+                    closed_at = datetime.fromtimestamp(os.fstat(orphan.fileno()).st_mtime)
+                    rotate_file(path, closed_at)
+                except OSError:
+                    continue
+        self._prune()
+
+    # Reading
+
+    def read(self, since=None, until=None, **filters):
+        """Records in write order, streamed from the rotated and current files
+
+        `since` / `until` bound the record's timestamp field (ISO strings or
+        datetimes); other keyword arguments must equal the record's value.
+        Rotated files closed before `since` are skipped without being opened.
+        """
+        self.flush()
+        return read_log(self.path, self.fmt, since=since, until=until, **filters)
+
+
+def per_process_path(path, pid=None):
+    """`path` keyed by a process id: "logs/scan_logs.csv" -> "logs/scan_logs.<pid>.csv"
+
+    Processes sharing a data directory (gunicorn workers, several worker.py)
+    each write their own file, so none rotates or truncates another's.
+    """
+    root, ext = os.path.splitext(path)
+    return f"{root}.{os.getpid() if pid is None else pid}{ext}"
+
+
+def process_paths(path):
+    """per_process_path() of every process that left a file (current or rotated)
+
+    The unkeyed `path` itself, written before files were kept per process,
+    comes first if it (or a rotation of it) exists.
+    """
+    root, ext = os.path.splitext(path)
+    keyed = re.compile(re.escape(root) + r'\.(\d+)' + re.escape(ext) + r'(\..*)?$')
+    pids = set()
+    for filename in glob.glob(glob.escape(root) + '.*'):
+        match = keyed.match(filename)
+        if match:
+            pids.add(int(match.group(1)))
+    paths = [per_process_path(path, pid) for pid in sorted(pids)]
+    if os.path.exists(path) or rotated_files(path):
+        paths.insert(0, path)
+    return paths
+
+
+def csv_header(path):
+    """Column names of a CSV log, or None if it is missing or empty"""
+    try:
+        with open(path, newline='', encoding='utf-8') as f:
+            return next(csv.reader(f), None)
+    except OSError:
+        return None
+
+
+def rotate_file(path, closed_at=None):
+    """Gzip a log to "<path>.<closed_at>.gz" and remove it; returns the new file"""
+    stamp = (closed_at or datetime.now()).strftime(ROTATED_TIME_FORMAT)
+    target = f"{path}.{stamp}.gz"
+    counter = 1
+    while os.path.exists(target):
+        target = f"{path}.{stamp}-{counter}.gz"
+        counter += 1
+
+    with open(path, 'rb') as src, gzip.open(target, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(path)
+    return target
+
+
+def prune_rotated(paths, keep):
+    """Remove all but the `keep` newest rotated files of the logs at `paths`"""
+    files = sorted((_rotation_key(f, path), f) for path in paths for f in rotated_files(path))
+    for _, old in files[:-keep or None]:
+        try:
+            os.remove(old)
+        except OSError:
+            pass
+
+
+def _rotation_key(filename, path):
+    # "<path>.<stamp>[-<n>].gz" -> (stamp, n)
+    stamp, _, counter = filename[len(path) + 1:-len('.gz')].partition('-')
+    return stamp, int(counter) if counter.isdigit() else 0
+
+
+def rotated_files(path):
+    """Rotated files of a log, oldest first"""
+    files = glob.glob(glob.escape(path) + '.*.gz')
+    return sorted(files, key=lambda f: _rotation_key(f, path))
+
+
+def _rotated_at(filename, path):
+    try:
+        return datetime.strptime(_rotation_key(filename, path)[0], ROTATED_TIME_FORMAT)
+    except ValueError:
+        return None
+
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def read_log(path, fmt='csv', since=None, until=None, time_field='timestamp', **filters):
+    """Generator over the records of a (possibly rotated) log"""
+    since, until = _iso(since), _iso(until)
+    files = rotated_files(path)
+    if since:
+        files = [f for f in files
+                 if (_rotated_at(f, path) is None or _rotated_at(f, path).isoformat() >= since)]
+    if os.path.exists(path):
+        files.append(path)
+
+    for filename in files:
+        if filename.endswith('.gz'):
+            handle = io.TextIOWrapper(gzip.open(filename, 'rb'), encoding='utf-8', newline='')
+        else:
+            handle = open(filename, newline='', encoding='utf-8')
+        with handle:
+            if fmt == 'csv':
+                records = csv.DictReader(handle)
+            else:
+                records = (json.loads(line) for line in handle if line.strip())
+            for record in records:
+                stamp = str(record.get(time_field) or '')
+                if since and stamp < since:
+                    continue
+                if until and stamp > until:
+                    continue
+                if all(str(record.get(key)) == str(value) for key, value in filters.items()):
+                    yield record
+
+
+def read_process_logs(path, fmt='csv', time_field='timestamp', order_field=None, **kwargs):
+    """read_log() over the logs of every process (see per_process_path)
+
+    Each process's records are in write order, so the logs are merged on
+    `order_field`, the sinks' stamp_field. Records written without it fall
+    back to `time_field`.
+    """
+    def key(record):
+        return str((order_field and record.get(order_field)) or record.get(time_field) or '')
+
+    return heapq.merge(
+        *(read_log(p, fmt, time_field=time_field, **kwargs) for p in process_paths(path)),
+        key=key
+    )
@@ -0,0 +1,252 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+import config
+
+# Histogram buckets in seconds, from header probes up to full nikto runs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+                   30, 60, 120, 300, 600, 900)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """A named metric with one series per combination of label values"""
+
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.enabled = True
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """(suffix, label values, extra labels, value) of every series"""
+        with self._lock:
+            return [('', key, (), value) for key, value in sorted(self._series.items())]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for suffix, key, extra, value in self.samples():
+            lines.append(f'{self.name}{suffix}{_format_labels(self.labelnames, key, extra)} '
+                         f'{_format_value(value)}')
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """A value that goes up and down; `function` computes it at scrape time"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def set(self, value, **labels):
+        if not self.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = value
+
+    def inc(self, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        if self.function is None:
+            return super().samples()
+        # function() returns a value, or {label values tuple: value}
+        value = self.function()
+        if isinstance(value, dict):
+            return [('', tuple(map(str, key)), (), v) for key, v in sorted(value.items())]
+        return [('', (), (), value)]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        if not self.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0}
+            series['counts'][bisect.bisect_left(self.buckets, value)] += 1
+            series['sum'] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the block takes"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def observe_body(self, body, started, **labels):
+        """Observe the time since `started` (a perf_counter() value) to produce a body
+
+        A str or bytes body is complete and observed at once. A chunked one
+        is returned wrapped, and observed once its last chunk is produced.
+        """
+        if isinstance(body, (str, bytes)):
+            self.observe(time.perf_counter() - started, **labels)
+            return body
+        return self._observe_chunks(body, started, labels)
+
+    def _observe_chunks(self, chunks, started, labels):
+        try:
+            yield from chunks
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            series = sorted((key, list(s['counts']), s['sum']) for key, s in self._series.items())
+        samples = []
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                samples.append(('_bucket', key, (('le', _format_value(bound)),), cumulative))
+            samples.append(('_sum', key, (), total))
+            samples.append(('_count', key, (), cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    """The process's metrics, rendered in the Prometheus text format
+
+    Recording is a dict update under a per-metric lock; the text is only
+    built when /metrics is scraped. A disabled registry records nothing.
+    """
+
+    def __init__(self, enabled=True):
+        self.metrics = []
+        self.enabled = enabled
+
+    def register(self, metric):
+        metric.enabled = self.enabled
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), function=None):
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+        for metric in self.metrics:
+            metric.enabled = enabled
+
+    def render(self):
+        parts = []
+        for metric in self.metrics:
+            try:
+                parts.append(metric.render())
+            except Exception as e:
+                # A failing gauge callback must not break the whole scrape
+                print(f"Metric {metric.name} failed: {e}")
+        return '\n'.join(parts) + '\n'
+
+
+class StageClock:
+    """Times the stages of one scan into a dict and the stage histogram
+
+    The stage that raised is kept in `failed`, so an error can be traced
+    to the step it came from.
+    """
+
+    def __init__(self, timings):
+        self.timings = timings
+        self.failed = None
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.failed = name
+            STAGE_ERRORS.inc(stage=name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[name] = round(self.timings.get(name, 0) + elapsed, 4)
+            STAGE_SECONDS.observe(elapsed, stage=name)
+
+
+REGISTRY = MetricsRegistry(enabled=config.METRICS_ENABLED)
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'webscan_stage_duration_seconds', 'Time spent in each stage of a scan', ['stage'])
+STAGE_ERRORS = REGISTRY.counter(
+    'webscan_stage_errors_total', 'Scan stages that raised an exception', ['stage'])
+SCANNER_SECONDS = REGISTRY.histogram(
+    'webscan_scanner_duration_seconds', 'Wall time of each scanner run by a scan',
+    ['scanner', 'outcome'])
+SCANS_FINISHED = REGISTRY.counter(
+    'webscan_scans_finished_total', 'Scans that reached a final status', ['status'])
+SCAN_SECONDS = REGISTRY.histogram(
+    'webscan_scan_duration_seconds', 'Wall time of whole scans, queueing excluded')
+SUBPROCESSES = REGISTRY.gauge(
+    'webscan_subprocesses_in_flight', 'Scanner subprocesses currently running', ['scanner'])
+REPORT_SECONDS = REGISTRY.histogram(
+    'webscan_report_render_seconds', 'Latency of report downloads, cache hits included',
+    ['format'])
@@ -0,0 +1,170 @@
+import re
+import xml.etree.ElementTree as ET
+
+CVE_PATTERN = re.compile(r'CVE-\d{4}-\d{4,7}')
+# vulners lists "CVE-2021-41773  7.5  https://vulners.com/..."
+CVSS_PATTERN = re.compile(r'(CVE-\d{4}-\d{4,7})\s+(\d{1,2}(?:\.\d)?)\b')
+# "State: VULNERABLE" / "LIKELY VULNERABLE", but not "NOT VULNERABLE"
+VULNERABLE_PATTERN = re.compile(r'(?<!NOT )VULNERABLE')
+
+# Script output kept in each record, the rest is dropped
+SCRIPT_OUTPUT_LIMIT = 500
+
+
+class NmapXMLParser:
+    """Incremental parser for `nmap -oX` output
+
+    Feed it the XML as it arrives; every finished <host> is turned into
+    compact port and script records and then discarded, so memory stays
+    constant however many hosts the scan covers.
+    """
+
+    def __init__(self):
+        self.ports = []
+        self.findings = []
+        self._parser = ET.XMLPullParser(events=('start', 'end'))
+        self._root = None
+
+    def feed(self, data):
+        """Parse more XML, returning the script records it completed"""
+        try:
+            self._parser.feed(data)
+        except ET.ParseError:
+            pass
+        return self._drain()
+
+    def close(self):
+        try:
+            self._parser.close()
+        except ET.ParseError:
+            # Truncated XML from a killed or failed nmap run
+            pass
+        return self._drain()
+
+    def _drain(self):
+        new_findings = []
+        try:
+            for event, elem in self._parser.read_events():
+                if event == 'start':
+                    if self._root is None:
+                        self._root = elem
+                    continue
+                if elem.tag == 'host':
+                    ports, findings = parse_host(elem)
+                    self.ports.extend(ports)
+                    self.findings.extend(findings)
+                    new_findings.extend(findings)
+                    # Hosts are processed, drop them from the tree
+                    self._root.clear()
+        except ET.ParseError:
+            pass
+        return new_findings
+
+
+def parse_host(host):
+    """Port and script records for one <host> element"""
+    address = None
+    for addr in host.findall('address'):
+        if address is None or addr.get('addrtype') in ('ipv4', 'ipv6'):
+            address = addr.get('addr')
+    hostname_elem = host.find('hostnames/hostname')
+    hostname = hostname_elem.get('name') if hostname_elem is not None else None
+    host_label = address or hostname
+
+    ports = []
+    findings = []
+    for port in host.findall('ports/port'):
+        state = port.find('state')
+        service = port.find('service')
+        record = {
+            'host': host_label,
+            'hostname': hostname,
+            'port': int(port.get('portid', 0)),
+            'protocol': port.get('protocol'),
+            'state': state.get('state') if state is not None else None,
+            'service': service.get('name') if service is not None else None,
+            'product': service.get('product') if service is not None else None,
+            'version': service.get('version') if service is not None else None,
+        }
+        ports.append(record)
+        for script in port.findall('script'):
+            findings.append(parse_script(script, record))
+
+    host_record = {'host': host_label, 'hostname': hostname, 'port': None,
+                   'protocol': None, 'service': None}
+    for script in host.findall('hostscript/script'):
+        findings.append(parse_script(script, host_record))
+
+    return ports, findings
+
+
+def parse_script(script, location):
+    """Compact record of one NSE script result"""
+    output = script.get('output', '')
+    # Structured output carries the CVE ids and vulnerability state too
+    text = ' '.join([output] + [elem.text or '' for elem in script.iter('elem')])
+
+    cvss = {}
+    for cve, score in CVSS_PATTERN.findall(text):
+        cvss.setdefault(cve, float(score))
+    cves = list(dict.fromkeys(CVE_PATTERN.findall(text)))
+
+    vulnerable = bool(VULNERABLE_PATTERN.search(text))
+    return {
+        'host': location['host'],
+        'hostname': location.get('hostname'),
+        'port': location['port'],
+        'protocol': location['protocol'],
+        'service': location['service'],
+        'script': script.get('id'),
+        'vulnerable': vulnerable,
+        'cves': [{'id': cve, 'cvss': cvss.get(cve)} for cve in cves],
+        'output': output.strip()[:SCRIPT_OUTPUT_LIMIT],
+    }
+
+
+def parse_nmap_xml(source):
+    """Parse a complete nmap XML file or file object in a single pass"""
+    ports = []
+    findings = []
+    root = None
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+            continue
+        if elem.tag == 'host':
+            host_ports, host_findings = parse_host(elem)
+            ports.extend(host_ports)
+            findings.extend(host_findings)
+            root.clear()
+    return ports, findings
+
+
+def format_nmap_summary(ports, findings):
+    """Readable text summary of parsed nmap records"""
+    lines = []
+    by_host = {}
+    for port in ports:
+        by_host.setdefault(port['host'], {'ports': [], 'findings': []})['ports'].append(port)
+    for finding in findings:
+        by_host.setdefault(finding['host'], {'ports': [], 'findings': []})['findings'].append(finding)
+
+    for host, data in by_host.items():
+        lines.append(f"Host {host}")
+        for port in data['ports']:
+            service = ' '.join(
+                part for part in (port['service'], port['product'], port['version']) if part
+            )
+            lines.append(f"  {port['port']}/{port['protocol']} {port['state']} {service}".rstrip())
+        for finding in data['findings']:
+            if not (finding['vulnerable'] or finding['cves']):
+                continue
+            where = f"{finding['port']}/{finding['protocol']}" if finding['port'] else 'host'
+            state = 'VULNERABLE' if finding['vulnerable'] else 'possible'
+            cves = ', '.join(cve['id'] for cve in finding['cves'][:10])
+            more = len(finding['cves']) - 10
+            if more > 0:
+                cves += f' (+{more} more)'
+            lines.append(f"  [{finding['script']}] {where} {state} {cves}".rstrip())
+    return '\n'.join(lines) + ('\n' if lines else '')
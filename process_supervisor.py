@@ -0,0 +1,252 @@
+import errno
+import os
+import shutil
+import signal
+import subprocess
+import time
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; limits are then skipped
+    resource = None
+
+# Seconds between SIGTERM and SIGKILL when a process tree is stopped
+KILL_GRACE = 2.0
+
+
+# Wrapper commands that set the limits before the tool's first instruction
+PRLIMIT = shutil.which('prlimit')
+NICE = shutil.which('nice')
+
+
+class ResourceLimits:
+    """rlimits and niceness applied to a tool process as it starts
+
+    A value of None (or 0) leaves that limit unset. Limits are inherited by
+    everything the tool spawns.
+    """
+
+    def __init__(self, cpu_seconds=None, memory_bytes=None, max_files=None, nice=None):
+        self.cpu_seconds = cpu_seconds
+        self.memory_bytes = memory_bytes
+        self.max_files = max_files
+        self.nice = nice
+
+    def _limits(self):
+        """(prlimit option, rlimit, soft value) of each limit that is set"""
+        if resource is None:
+            return []
+        limits = []
+        for option, limit, value in (('--cpu', resource.RLIMIT_CPU, self.cpu_seconds),
+                                     ('--as', resource.RLIMIT_AS, self.memory_bytes),
+                                     ('--nofile', resource.RLIMIT_NOFILE, self.max_files)):
+            if value:
+                # The tool inherits our hard limit; the soft one may not exceed it
+                _, hard = resource.getrlimit(limit)
+                if hard != resource.RLIM_INFINITY:
+                    value = min(value, hard)
+                limits.append((option, limit, value))
+        return limits
+
+    def wrap(self, cmd):
+        """`cmd` run through prlimit(1) and nice(1), or None if they are missing
+
+        Unlike a preexec_fn this is safe in a threaded process, and the
+        limits are in place before the tool can spawn anything.
+        """
+        prefix = []
+        limits = self._limits()
+        if limits:
+            if PRLIMIT is None:
+                return None
+            prefix += [PRLIMIT] + [f'{option}={value}:' for option, _, value in limits] + ['--']
+        if self.nice:
+            if NICE is None:
+                return None
+            prefix += [NICE, '-n', str(self.nice)]
+        return prefix + list(cmd)
+
+    def apply(self, pid):
+        """Set the limits on a process that is already running
+
+        The fallback when wrap() cannot be used: anything the tool spawned
+        before this call runs unlimited.
+        """
+        if self.nice and hasattr(os, 'setpriority'):
+            try:
+                os.setpriority(os.PRIO_PROCESS, pid,
+                               min(19, os.getpriority(os.PRIO_PROCESS, 0) + self.nice))
+            except (ProcessLookupError, PermissionError):
+                pass
+        # prlimit(2) is Linux-only; elsewhere the tools run unlimited
+        if not hasattr(resource, 'prlimit'):
+            return
+        for _, limit, value in self._limits():
+            try:
+                _, hard = resource.prlimit(pid, limit)
+                resource.prlimit(pid, limit, (value, hard))
+            except (ProcessLookupError, PermissionError):
+                # Already exited, nothing left to limit
+                return
+
+
+def start_process(cmd, limits=None):
+    """Start a tool in a new session, i.e. its own process group"""
+    posix = os.name == 'posix'
+    wrapped = None
+    if posix and limits:
+        wrapped = limits.wrap(cmd)
+        # The wrapper would only report a missing tool through its exit code
+        if wrapped is not None and shutil.which(cmd[0]) is None:
+            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), cmd[0])
+    process = subprocess.Popen(
+        wrapped or cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE, start_new_session=posix
+    )
+    if posix and limits and wrapped is None:
+        limits.apply(process.pid)
+    return process
+
+
+def kill_tree(process, grace=KILL_GRACE):
+    """Stop a tool and everything it spawned: SIGTERM, then SIGKILL"""
+    if not hasattr(os, 'killpg'):
+        if process.poll() is None:
+            process.kill()
+        return
+    for sig, wait in ((signal.SIGTERM, grace), (signal.SIGKILL, None)):
+        try:
+            os.killpg(process.pid, sig)
+        except (ProcessLookupError, PermissionError):
+            return
+        if wait is None:
+            return
+        deadline = time.monotonic() + wait
+        while process.poll() is None and time.monotonic() < deadline:
+            time.sleep(0.05)
+        if process.poll() is not None:
+            # Leader is gone; sweep whatever is left of its group
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+            return
+
+
+def kill_group(process):
+    """SIGKILL what is left of a tool's process group, e.g. background children"""
+    if hasattr(os, 'killpg'):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+
+def _vm_hwm_kb(pid):
+    try:
+        with open(f'/proc/{pid}/status', encoding='ascii', errors='replace') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _group_members(pgid):
+    members = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', encoding='ascii', errors='replace') as f:
+                # Fields after "(comm)": state, ppid, pgrp, ...
+                fields = f.read().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if len(fields) > 2 and fields[2] == str(pgid):
+            members.append(int(entry))
+    return members
+
+
+class PeakRSS:
+    """Peak resident memory of a tool's process group, sampled from /proc
+
+    wait4()'s ru_maxrss cannot be used: it also counts the memory of the
+    web process the tool was started from. VmHWM only covers the tool's own
+    address space. The leader is sampled on every call and the whole group
+    once per `group_interval` seconds; the peak is that of the largest
+    process. Growth after the last sample is missed.
+    """
+
+    def __init__(self, pgid, group_interval=1.0):
+        self.pgid = pgid
+        self.group_interval = group_interval
+        self.available = os.path.exists('/proc/self/status')
+        self.peaks = {}
+        self._next_group_scan = 0
+
+    def sample(self):
+        if not self.available:
+            return
+        pids = [self.pgid]
+        now = time.monotonic()
+        if now >= self._next_group_scan:
+            self._next_group_scan = now + self.group_interval
+            pids = _group_members(self.pgid) or pids
+        for pid in pids:
+            hwm = _vm_hwm_kb(pid)
+            if hwm is not None and hwm > self.peaks.get(pid, 0):
+                self.peaks[pid] = hwm
+
+    @property
+    def peak_kb(self):
+        return max(self.peaks.values(), default=None)
+
+
+def try_reap(process):
+    """(returncode, rusage) once the tool has exited, else None
+
+    Reaps it, so Popen must not wait for it again. rusage is None where
+    wait4() is not available.
+    """
+    if not hasattr(os, 'wait4'):
+        returncode = process.poll()
+        return None if returncode is None else (returncode, None)
+    pid, status, usage = os.wait4(process.pid, os.WNOHANG)
+    if not pid:
+        return None
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return process.returncode, usage
+
+
+def wait_for_exit(process, timeout, sampler=None):
+    """Reap a tool, sampling its memory meanwhile; (returncode, rusage)
+
+    Raises subprocess.TimeoutExpired if it has not exited within `timeout`.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        if sampler is not None:
+            sampler.sample()
+        exited = try_reap(process)
+        if exited is not None:
+            return exited
+        if time.monotonic() >= deadline:
+            raise subprocess.TimeoutExpired(process.args, timeout)
+        time.sleep(0.02)
+
+
+def describe_usage(rusage, sampler, started):
+    """Resource usage dict kept with each scanner result"""
+    usage = {}
+    if sampler is not None and sampler.peak_kb is not None:
+        usage['peak_rss_kb'] = sampler.peak_kb
+    if rusage is not None:
+        usage.update({
+            'cpu_user_seconds': round(rusage.ru_utime, 3),
+            'cpu_system_seconds': round(rusage.ru_stime, 3),
+            'cpu_seconds': round(rusage.ru_utime + rusage.ru_stime, 3),
+        })
+    usage['wall_seconds'] = round(time.monotonic() - started, 3)
+    return usage
@@ -1,25 +1,37 @@
 from datetime import datetime
 import json
 import os
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
-import plotly.graph_objects as go
-import plotly.utils
-import base64
-from io import BytesIO
+from functools import lru_cache
+from xml.sax.saxutils import escape
+import config
+from report_model import RECOMMENDATIONS, SEVERITY_LEVELS, severity_counts
+from rule_engine import RuleEngine
 
-def generate_professional_report(scan_results):
+# Vulnerability rules, compiled once at import
+RULE_ENGINE = RuleEngine.from_file(config.RULES_PATH)
+
+# Bar colors of the severity levels, in chart order (ReportLab color names)
+SEVERITY_BAR_COLORS = ('red', 'orange', 'yellow', 'green')
+
+# Nikto item counts above which unclassified findings get each severity
+NIKTO_SEVERITY_THRESHOLDS = ((10, 'Critical'), (5, 'High'), (2, 'Medium'))
+
+def generate_professional_report(scan_results, report_filename=None):
     """Generate a professional 5+ years experience level security report"""
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    report_filename = f"reports/security_scan_{timestamp}.pdf"
+    # ReportLab is imported on first render, keeping it out of app startup
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.lib.enums import TA_CENTER
+    
+    if report_filename is None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        report_filename = f"reports/security_scan_{timestamp}.pdf"
     
     # Ensure reports directory exists
-    os.makedirs('reports', exist_ok=True)
+    os.makedirs(os.path.dirname(report_filename) or '.', exist_ok=True)
     
     # Create PDF document
     doc = SimpleDocTemplate(
@@ -70,9 +82,10 @@ def generate_professional_report(scan_results):
         'Default': colors.gray
     }
     
+    # Paragraphs parse their text as markup, so scanner-derived text is escaped
     summary_text = f"""
     This report presents the findings of a comprehensive security assessment conducted on 
-    <b>{scan_results['target']}</b> on <b>{scan_results['timestamp']}</b>. 
+    <b>{escape(str(scan_results['target']))}</b> on <b>{escape(str(scan_results['timestamp']))}</b>. 
     The assessment utilized multiple scanning tools to identify potential vulnerabilities 
     and security misconfigurations.
     <br/><br/>
@@ -84,6 +97,20 @@ def generate_professional_report(scan_results):
     elements.append(Paragraph(summary_text, styles['Normal']))
     elements.append(Spacer(1, 20))
     
+    # Changes since the previous scan of this target
+    delta = scan_results.get('delta')
+    if delta:
+        elements.append(Paragraph("CHANGES SINCE LAST SCAN", heading_style))
+        elements.append(Paragraph(
+            f"Compared with scan {delta['baseline_scan_id']} of {delta['baseline_timestamp']}: "
+            f"<b>{len(delta['new'])}</b> new, <b>{len(delta['resolved'])}</b> resolved, "
+            f"<b>{len(delta['changed'])}</b> changed.", styles['Normal']))
+        for title, key in (('New', 'new'), ('Resolved', 'resolved'), ('Changed', 'changed')):
+            for item in delta[key]:
+                elements.append(Paragraph(
+                    f"  • {title}: [{item['scanner']}] {escape(item['label'])}", styles['Normal']))
+        elements.append(Spacer(1, 20))
+    
     # Scan Information
     elements.append(Paragraph("SCAN INFORMATION", heading_style))
     scan_info = [
@@ -112,34 +139,10 @@ def generate_professional_report(scan_results):
     elements.append(Paragraph("VULNERABILITY SUMMARY", heading_style))
     
     # Create severity distribution
-    severity_counts = {'Critical': 0, 'High': 0, 'Medium': 0, 'Low': 0}
-    for vuln in scan_results.get('vulnerabilities', []):
-        severity = vuln.get('severity', 'Low')
-        if severity in severity_counts:
-            severity_counts[severity] += 1
-    
-    # Generate chart using Plotly
-    fig = go.Figure(data=[
-        go.Bar(
-            x=list(severity_counts.keys()),
-            y=list(severity_counts.values()),
-            marker_color=['red', 'orange', 'yellow', 'green']
-        )
-    ])
+    counts = severity_counts(scan_results.get('vulnerabilities', []))
     
-    fig.update_layout(
-        title="Vulnerability Severity Distribution",
-        xaxis_title="Severity Level",
-        yaxis_title="Number of Findings",
-        showlegend=False
-    )
-    
-    # Convert plot to image
-    img_bytes = fig.to_image(format="png", width=600, height=400)
-    img_buffer = BytesIO(img_bytes)
-    
-    # Add chart to PDF
-    elements.append(Image(img_buffer, width=5*inch, height=3*inch))
+    # Add chart to PDF (vector graphics, cached per distinct distribution)
+    elements.append(severity_chart(tuple(counts[level] for level in SEVERITY_LEVELS)))
     elements.append(Spacer(1, 20))
     
     # Detailed Findings
@@ -147,11 +150,11 @@ def generate_professional_report(scan_results):
     
     for i, vuln in enumerate(scan_results.get('vulnerabilities', []), 1):
         vuln_text = f"""
-        <b>{i}. {vuln.get('title', 'Unknown Vulnerability')}</b><br/>
-        <b>Severity:</b> {vuln.get('severity', 'Low')}<br/>
-        <b>Description:</b> {vuln.get('description', 'No description provided')}<br/>
-        <b>Impact:</b> {vuln.get('impact', 'Impact not specified')}<br/>
-        <b>Recommendation:</b> {vuln.get('recommendation', 'No recommendation provided')}<br/>
+        <b>{i}. {escape(str(vuln.get('title', 'Unknown Vulnerability')))}</b><br/>
+        <b>Severity:</b> {escape(str(vuln.get('severity', 'Low')))}<br/>
+        <b>Description:</b> {escape(str(vuln.get('description', 'No description provided')))}<br/>
+        <b>Impact:</b> {escape(str(vuln.get('impact', 'Impact not specified')))}<br/>
+        <b>Recommendation:</b> {escape(str(vuln.get('recommendation', 'No recommendation provided')))}<br/>
         """
         elements.append(Paragraph(vuln_text, styles['Normal']))
         elements.append(Spacer(1, 10))
@@ -171,12 +174,12 @@ def generate_professional_report(scan_results):
                 if security['present']:
                     elements.append(Paragraph("✓ Present Security Headers:", styles['Normal']))
                     for header in security['present']:
-                        elements.append(Paragraph(f"  • {header}", styles['Normal']))
+                        elements.append(Paragraph(f"  • {escape(header)}", styles['Normal']))
                 
                 if security['missing']:
                     elements.append(Paragraph("✗ Missing Security Headers:", styles['Normal']))
                     for header in security['missing']:
-                        elements.append(Paragraph(f"  • {header}", styles['Normal']))
+                        elements.append(Paragraph(f"  • {escape(header)}", styles['Normal']))
                 
                 elements.append(Paragraph(f"Security Score: {security['score']}/100", styles['Normal']))
             else:
@@ -184,25 +187,15 @@ def generate_professional_report(scan_results):
                 output = scanner_result.get('output', 'No output')
                 if len(output) > 500:
                     output = output[:500] + "... (truncated)"
-                elements.append(Paragraph(output.replace('\n', '<br/>'), styles['Code']))
+                elements.append(Paragraph(escape(output).replace('\n', '<br/>'), styles['Code']))
             
             elements.append(Spacer(1, 10))
     
     # Recommendations
     elements.append(Paragraph("RECOMMENDATIONS", heading_style))
     
-    recommendations = [
-        "1. Implement missing security headers identified in the curl analysis",
-        "2. Address critical and high severity vulnerabilities immediately",
-        "3. Conduct regular security assessments using multiple scanning tools",
-        "4. Keep all systems and applications patched and updated",
-        "5. Implement a Web Application Firewall (WAF) for additional protection",
-        "6. Conduct penetration testing for critical applications",
-        "7. Develop and maintain an incident response plan"
-    ]
-    
-    for rec in recommendations:
-        elements.append(Paragraph(rec, styles['Normal']))
+    for i, rec in enumerate(RECOMMENDATIONS, 1):
+        elements.append(Paragraph(f"{i}. {rec}", styles['Normal']))
         elements.append(Spacer(1, 5))
     
     # Footer
@@ -218,6 +211,50 @@ def generate_professional_report(scan_results):
     
     return report_filename
 
+def severity_chart(counts):
+    """Bar chart of finding counts per severity, drawn with ReportLab graphics"""
+    # Flowables keep layout state, so every report gets its own copy
+    return _severity_chart(counts).copy()
+
+@lru_cache(maxsize=128)
+def _severity_chart(counts):
+    from reportlab.lib import colors
+    from reportlab.lib.units import inch
+    from reportlab.graphics.shapes import Drawing, Group, String
+    from reportlab.graphics.charts.barcharts import VerticalBarChart
+    
+    width, height = 5*inch, 3*inch
+    drawing = Drawing(width, height)
+    
+    drawing.add(String(width / 2, height - 14, "Vulnerability Severity Distribution",
+                       fontName='Helvetica-Bold', fontSize=12, textAnchor='middle'))
+    
+    chart = VerticalBarChart()
+    chart.x = 50
+    chart.y = 40
+    chart.width = width - 70
+    chart.height = height - 80
+    chart.data = [list(counts)]
+    chart.barWidth = 20
+    chart.strokeColor = None
+    chart.categoryAxis.categoryNames = list(SEVERITY_LEVELS)
+    chart.valueAxis.valueMin = 0
+    chart.valueAxis.valueMax = max(max(counts), 1)
+    chart.valueAxis.valueStep = max(1, (max(counts) + 4) // 5)
+    chart.bars.strokeColor = None
+    for i, color in enumerate(SEVERITY_BAR_COLORS):
+        chart.bars[(0, i)].fillColor = getattr(colors, color)
+    drawing.add(chart)
+    
+    drawing.add(String(width / 2, 8, "Severity Level", fontName='Helvetica', fontSize=9,
+                       textAnchor='middle'))
+    # Vertical axis title, rotated 90 degrees
+    y_label = Group(String(0, 0, "Number of Findings", fontName='Helvetica', fontSize=9,
+                           textAnchor='middle'))
+    y_label.transform = (0, 1, -1, 0, 14, chart.y + chart.height / 2)
+    drawing.add(y_label)
+    return drawing
+
 def analyze_vulnerabilities(results):
     """Analyze scanner results to extract vulnerabilities"""
     vulnerabilities = []
@@ -226,8 +263,11 @@ def analyze_vulnerabilities(results):
     if 'nmap' in results and results['nmap'].get('success'):
         nmap_output = results['nmap'].get('output', '')
         
-        # Look for vulnerability patterns in Nmap output
-        if "VULNERABLE" in nmap_output or "CVE-" in nmap_output:
+        if 'findings' in results['nmap']:
+            # Structured records parsed from nmap's XML output
+            vulnerabilities.extend(analyze_nmap_findings(results['nmap']['findings']))
+        elif "VULNERABLE" in nmap_output or "CVE-" in nmap_output:
+            # Look for vulnerability patterns in plain-text Nmap output
             vulnerabilities.append({
                 'title': 'Potential Vulnerabilities Detected by Nmap',
                 'severity': 'High',
@@ -240,28 +280,43 @@ def analyze_vulnerabilities(results):
     if 'nikto' in results and results['nikto'].get('success'):
         nikto_output = results['nikto'].get('output', '')
         
-        # Count Nikto findings
-        finding_count = nikto_output.count('+')
-        if finding_count > 10:
-            severity = 'Critical'
-        elif finding_count > 5:
-            severity = 'High'
-        elif finding_count > 2:
-            severity = 'Medium'
-        else:
-            severity = 'Low'
+        # Nikto reports one item per "+ " line; the scanner already picked
+        # them out while streaming
+        items = results['nikto'].get('findings')
+        if items is None:
+            items = [line for line in nikto_output.splitlines() if line.startswith('+ ')]
+        
+        # Classify the items with the rule engine, then summarise the rest
+        classified, matched_lines = RULE_ENGINE.classify('nikto', '\n'.join(items))
+        vulnerabilities.extend(classified)
+        
+        finding_count = max(0, len(items) - matched_lines)
+        severity = 'Low'
+        for threshold, level in NIKTO_SEVERITY_THRESHOLDS:
+            if finding_count > threshold:
+                severity = level
+                break
         
         if finding_count > 0:
             vulnerabilities.append({
-                'title': f'Web Server Vulnerabilities ({finding_count} findings)',
+                'title': f'Other Web Server Findings ({finding_count} findings)',
                 'severity': severity,
                 'description': 'Nikto web scanner identified multiple potential vulnerabilities',
                 'impact': 'Web application may be exposed to various attacks',
                 'recommendation': 'Review Nikto findings and apply necessary patches and configurations'
             })
     
+    # Analyze WhatWeb technology fingerprints
+    if 'whatweb' in results and results['whatweb'].get('success'):
+        vulnerabilities.extend(
+            RULE_ENGINE.findings('whatweb', results['whatweb'].get('output', ''))
+        )
+    
     # Analyze curl security headers
     if 'curl' in results and results['curl'].get('success'):
+        vulnerabilities.extend(
+            RULE_ENGINE.findings('curl', results['curl'].get('headers', ''))
+        )
         security = results['curl'].get('security_analysis', {})
         missing_count = len(security.get('missing', []))
         
@@ -282,6 +337,90 @@ def analyze_vulnerabilities(results):
                 'impact': 'Increased risk of XSS, clickjacking, and other web attacks',
                 'recommendation': 'Implement missing security headers in web server configuration'
             })
+        
+        # Weak HSTS, CSP and cookie settings found by the header analysis
+        for issue in security.get('issues', []):
+            vulnerabilities.append({
+                'title': issue['title'],
+                'severity': issue['severity'],
+                'description': issue['description'],
+                'impact': 'Weakens the protection the header is meant to provide',
+                'recommendation': issue['recommendation'],
+                'rule_id': issue['rule_id']
+            })
+    
+    return vulnerabilities
+
+def cvss_severity(score):
+    """Map a CVSS base score to a report severity"""
+    if score is None:
+        return 'High'
+    if score >= 9.0:
+        return 'Critical'
+    if score >= 7.0:
+        return 'High'
+    if score >= 4.0:
+        return 'Medium'
+    return 'Low'
+
+def analyze_nmap_findings(findings):
+    """One vulnerability per CVE (or per vulnerable script without CVEs)"""
+    by_cve = {}
+    vulnerabilities = []
+    
+    for finding in findings:
+        where = finding['host']
+        if finding.get('port'):
+            where = f"{where}:{finding['port']}/{finding['protocol']}"
+        
+        for cve in finding.get('cves', []):
+            entry = by_cve.setdefault(cve['id'], {
+                'cvss': cve.get('cvss'),
+                'locations': [],
+                'scripts': set(),
+                'vulnerable': False
+            })
+            if cve.get('cvss') is not None:
+                entry['cvss'] = max(entry['cvss'] or 0, cve['cvss'])
+            if where not in entry['locations']:
+                entry['locations'].append(where)
+            entry['scripts'].add(finding['script'])
+            entry['vulnerable'] = entry['vulnerable'] or finding.get('vulnerable')
+        
+        if finding.get('vulnerable') and not finding.get('cves'):
+            # Prefer a dedicated rule for well-known scripts
+            classified = RULE_ENGINE.findings(
+                'nmap', f"{finding['script']}\n{finding.get('output', '')}")
+            if classified:
+                for vulnerability in classified:
+                    vulnerability['title'] = f"{vulnerability['title']} on {where}"
+                vulnerabilities.extend(classified)
+                continue
+            vulnerabilities.append({
+                'title': f"{finding['script']} reported a vulnerability on {where}",
+                'severity': 'High',
+                'description': finding.get('output') or f"Nmap script {finding['script']} flagged the service as vulnerable",
+                'impact': 'The affected service may be exploitable',
+                'recommendation': 'Review the script output and patch or reconfigure the service',
+                'rule_id': f"nmap-{finding['script']}",
+                'rule_title': f"{finding['script']} reported a vulnerability"
+            })
+    
+    for cve_id, entry in by_cve.items():
+        severity = cvss_severity(entry['cvss'])
+        score = f" (CVSS {entry['cvss']})" if entry['cvss'] is not None else ''
+        locations = ', '.join(entry['locations'][:5])
+        if len(entry['locations']) > 5:
+            locations += f" and {len(entry['locations']) - 5} more"
+        state = 'confirmed vulnerable' if entry['vulnerable'] else 'potentially affected'
+        vulnerabilities.append({
+            'title': f"{cve_id}{score} on {locations}",
+            'rule_title': cve_id,
+            'severity': severity,
+            'description': f"Nmap ({', '.join(sorted(entry['scripts']))}) reports {locations} as {state} by {cve_id}",
+            'impact': 'Known vulnerability in an exposed service version',
+            'recommendation': f"Review {cve_id} and upgrade or patch the affected service"
+        })
     
     return vulnerabilities
 
@@ -0,0 +1,110 @@
+import re
+from datetime import datetime
+
+REPORT_SCHEMA_VERSION = 1
+
+SEVERITY_LEVELS = ('Critical', 'High', 'Medium', 'Low')
+
+# General advice closing every report
+RECOMMENDATIONS = [
+    "Implement missing security headers identified in the curl analysis",
+    "Address critical and high severity vulnerabilities immediately",
+    "Conduct regular security assessments using multiple scanning tools",
+    "Keep all systems and applications patched and updated",
+    "Implement a Web Application Firewall (WAF) for additional protection",
+    "Conduct penetration testing for critical applications",
+    "Develop and maintain an incident response plan"
+]
+
+# Characters of each scanner's raw output kept in the report
+OUTPUT_EXCERPT_LIMIT = 2000
+
+CVE_PATTERN = re.compile(r'CVE-\d{4}-\d{4,7}')
+
+
+def severity_counts(vulnerabilities):
+    """Number of findings per severity level, in SEVERITY_LEVELS order"""
+    counts = {level: 0 for level in SEVERITY_LEVELS}
+    for vuln in vulnerabilities:
+        severity = vuln.get('severity', 'Low')
+        if severity in counts:
+            counts[severity] += 1
+    return counts
+
+
+def base_title(title):
+    """A finding's title without per-scan counts such as "(3 occurrences)\""""
+    return re.sub(r'\s*\([^)]*\)', '', title).strip() or title
+
+
+def finding_id(vuln):
+    """Stable identifier of a finding's kind, used as the SARIF rule id"""
+    if vuln.get('rule_id'):
+        return vuln['rule_id']
+    cve = CVE_PATTERN.search(vuln.get('title', ''))
+    if cve:
+        return cve.group()
+    # Drop counts such as "(3 findings)" so repeated scans share ids
+    title = base_title(vuln.get('title', 'finding'))
+    slug = re.sub(r'[^a-z0-9]+', '-', title.lower()).strip('-')
+    return slug or 'finding'
+
+
+def build_report_model(scan_results):
+    """Renderer-independent report content built from a scan record"""
+    vulnerabilities = scan_results.get('vulnerabilities', [])
+
+    findings = []
+    for vuln in vulnerabilities:
+        title = vuln.get('title', 'Unknown Vulnerability')
+        description = vuln.get('description', 'No description provided')
+        findings.append({
+            'id': finding_id(vuln),
+            'title': title,
+            # The finding's kind, shared by every scan that reports it
+            'rule_title': vuln.get('rule_title') or base_title(title),
+            'rule_description': vuln.get('rule_description') or description,
+            'severity': vuln.get('severity', 'Low'),
+            'description': description,
+            'impact': vuln.get('impact', 'Impact not specified'),
+            'recommendation': vuln.get('recommendation', 'No recommendation provided'),
+        })
+
+    scanners = {}
+    for name, result in scan_results.get('results', {}).items():
+        entry = {'success': bool(result.get('success'))}
+        if result.get('error') and not result.get('success'):
+            entry['error'] = result['error']
+        if result.get('resources'):
+            entry['resources'] = result['resources']
+        if 'security_analysis' in result:
+            entry['security_analysis'] = result['security_analysis']
+        output = result.get('output') or result.get('headers') or ''
+        if output:
+            entry['output_excerpt'] = output[:OUTPUT_EXCERPT_LIMIT]
+            entry['output_truncated'] = len(output) > OUTPUT_EXCERPT_LIMIT
+        scanners[name] = entry
+
+    model = {
+        'schema_version': REPORT_SCHEMA_VERSION,
+        'generated_at': datetime.now().isoformat(),
+        'scan': {
+            'scan_id': scan_results.get('scan_id'),
+            'target': scan_results.get('target'),
+            'timestamp': scan_results.get('timestamp'),
+            'scan_type': scan_results.get('scan_type'),
+            'requested_by': scan_results.get('gmail'),
+        },
+        'summary': {
+            'vuln_stage': scan_results.get('vuln_stage', 'Unknown'),
+            'total_findings': len(findings),
+            'by_severity': severity_counts(vulnerabilities),
+        },
+        'findings': findings,
+        'scanners': scanners,
+        'recommendations': list(RECOMMENDATIONS),
+    }
+    # Differences from the target's previous scan, when there was one
+    if scan_results.get('delta'):
+        model['delta'] = scan_results['delta']
+    return model
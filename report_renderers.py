@@ -0,0 +1,196 @@
+import json
+from datetime import datetime, timezone
+from html import escape
+
+from report_model import SEVERITY_LEVELS
+
+SARIF_SCHEMA = 'https://json.schemastore.org/sarif-2.1.0.json'
+
+# SARIF result level and GitHub-style security-severity score per severity
+SARIF_LEVELS = {'Critical': 'error', 'High': 'error', 'Medium': 'warning', 'Low': 'note'}
+SARIF_SECURITY_SEVERITY = {'Critical': '9.5', 'High': '8.0', 'Medium': '5.5', 'Low': '2.0'}
+
+
+def sarif_time(timestamp):
+    """A record's ISO timestamp as SARIF's UTC dateTime, e.g. 2024-01-02T03:04:05.678Z
+
+    Records without an offset hold the server's local time. Returns None
+    when the timestamp is missing or unreadable.
+    """
+    try:
+        moment = datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return None
+    return moment.astimezone(timezone.utc).isoformat(timespec='milliseconds')[:-6] + 'Z'
+
+
+class JSONRenderer:
+    mimetype = 'application/json'
+    extension = 'json'
+
+    def render(self, model):
+        return json.dumps(model, indent=2)
+
+
+class SARIFRenderer:
+    """SARIF 2.1.0 log with one rule per finding kind"""
+
+    mimetype = 'application/sarif+json'
+    extension = 'sarif'
+
+    def render(self, model):
+        target = model['scan']['target']
+        rules = {}
+        results = []
+        # baselineState of each finding, when the scan has a comparable baseline
+        states = {}
+        delta_findings = (model.get('delta') or {}).get('findings')
+        if delta_findings:
+            states.update((item['key'], 'new') for item in delta_findings['new'])
+            states.update((item['key'], 'updated') for item in delta_findings['changed'])
+        for finding in model['findings']:
+            # Described by the rule's own title, not one finding's counts or hosts
+            rules.setdefault(finding['id'], {
+                'id': finding['id'],
+                'name': finding['rule_title'],
+                'shortDescription': {'text': finding['rule_title']},
+                'fullDescription': {'text': finding['rule_description']},
+                'help': {'text': finding['recommendation']},
+                'properties': {
+                    'security-severity': SARIF_SECURITY_SEVERITY.get(finding['severity'], '2.0'),
+                    'tags': ['security'],
+                },
+            })
+            result = {
+                'ruleId': finding['id'],
+                'level': SARIF_LEVELS.get(finding['severity'], 'note'),
+                'message': {'text': f"{finding['title']}: {finding['description']}"},
+                'locations': [{
+                    'physicalLocation': {'artifactLocation': {'uri': target}}
+                }],
+                'properties': {
+                    'severity': finding['severity'],
+                    'impact': finding['impact'],
+                },
+            }
+            if delta_findings is not None:
+                result['baselineState'] = states.get(finding['id'], 'unchanged')
+            results.append(result)
+
+        invocation = {'executionSuccessful': True}
+        started = sarif_time(model['scan']['timestamp'])
+        if started:
+            invocation['startTimeUtc'] = started
+        sarif = {
+            '$schema': SARIF_SCHEMA,
+            'version': '2.1.0',
+            'runs': [{
+                'tool': {'driver': {
+                    'name': 'WebScan Professional',
+                    'version': '1.0',
+                    'rules': list(rules.values()),
+                }},
+                'automationDetails': {'id': f"webscan/{model['scan']['scan_id']}"},
+                'invocations': [invocation],
+                'results': results,
+            }],
+        }
+        return json.dumps(sarif, indent=2)
+
+
+class HTMLRenderer:
+    """Self-contained HTML report, produced as a stream of chunks"""
+
+    mimetype = 'text/html'
+    extension = 'html'
+
+    def render(self, model):
+        scan = model['scan']
+        summary = model['summary']
+
+        yield ('<!DOCTYPE html>\n<html lang="en">\n<head>\n<meta charset="UTF-8">\n'
+               f"<title>Security Assessment - {escape(str(scan['target']))}</title>\n"
+               '<style>body{font-family:Roboto,Arial,sans-serif;max-width:960px;margin:auto;'
+               'padding:24px;color:#2c3e50}table{border-collapse:collapse}td,th{border:1px solid #ccc;'
+               'padding:6px 10px;text-align:left}pre{background:#f0f0f0;padding:10px;overflow-x:auto}'
+               '.severity-critical{color:#c0392b}.severity-high{color:#e67e22}'
+               '.severity-medium{color:#b7950b}.severity-low{color:#27ae60}</style>\n</head>\n<body>\n')
+        yield '<h1>Web Application Security Assessment Report</h1>\n'
+
+        yield '<h2>Executive Summary</h2>\n'
+        yield (f"<p>Assessment of <b>{escape(str(scan['target']))}</b> on "
+               f"<b>{escape(str(scan['timestamp']))}</b>.</p>\n"
+               f"<p><b>Overall Risk Level: {escape(summary['vuln_stage'])}</b> &mdash; "
+               f"{summary['total_findings']} potential security issues identified.</p>\n")
+
+        delta = model.get('delta')
+        if delta:
+            yield '<h2>Changes Since Last Scan</h2>\n'
+            yield (f"<p>Compared with scan {escape(str(delta['baseline_scan_id']))} of "
+                   f"{escape(str(delta['baseline_timestamp']))}.</p>\n")
+            if delta['unchanged']:
+                yield '<p>No changes detected.</p>\n'
+            for title, key in (('New', 'new'), ('Resolved', 'resolved'), ('Changed', 'changed')):
+                if delta[key]:
+                    yield f"<h3>{title} ({len(delta[key])})</h3>\n<ul>\n"
+                    for item in delta[key]:
+                        yield f"<li>[{escape(item['scanner'])}] {escape(item['label'])}</li>\n"
+                    yield '</ul>\n'
+
+        yield '<h2>Scan Information</h2>\n<table>\n'
+        for label, key in (('Target', 'target'), ('Scan Date', 'timestamp'),
+                           ('Scan Type', 'scan_type'), ('Requested By', 'requested_by'),
+                           ('Scan ID', 'scan_id')):
+            yield f"<tr><th>{label}</th><td>{escape(str(scan[key]))}</td></tr>\n"
+        yield '</table>\n'
+
+        yield '<h2>Vulnerability Summary</h2>\n<table>\n'
+        for level in SEVERITY_LEVELS:
+            yield (f'<tr><th class="severity-{level.lower()}">{level}</th>'
+                   f"<td>{summary['by_severity'][level]}</td></tr>\n")
+        yield '</table>\n'
+
+        yield '<h2>Detailed Findings</h2>\n'
+        for i, finding in enumerate(model['findings'], 1):
+            yield (f"<div><h3>{i}. {escape(finding['title'])}</h3>\n"
+                   f'<p class="severity-{finding["severity"].lower()}"><b>Severity:</b> '
+                   f"{escape(finding['severity'])}</p>\n"
+                   f"<p><b>Description:</b> {escape(finding['description'])}</p>\n"
+                   f"<p><b>Impact:</b> {escape(finding['impact'])}</p>\n"
+                   f"<p><b>Recommendation:</b> {escape(finding['recommendation'])}</p></div>\n")
+
+        yield '<h2>Scanner Outputs</h2>\n'
+        for name, scanner in model['scanners'].items():
+            yield f"<h3>{escape(name.upper())} Results</h3>\n"
+            if not scanner['success']:
+                yield f"<p>Scanner failed: {escape(scanner.get('error', 'unknown error'))}</p>\n"
+                continue
+            security = scanner.get('security_analysis')
+            if security:
+                yield '<ul>\n'
+                for header in security.get('present', []):
+                    yield f"<li>&#10003; {escape(header)}</li>\n"
+                for header in security.get('missing', []):
+                    yield f"<li>&#10007; {escape(header)}</li>\n"
+                yield f"</ul>\n<p>Security Score: {security.get('score', 0)}/100</p>\n"
+            if scanner.get('output_excerpt'):
+                more = '\n... (truncated)' if scanner.get('output_truncated') else ''
+                yield f"<pre>{escape(scanner['output_excerpt'])}{more}</pre>\n"
+
+        yield '<h2>Recommendations</h2>\n<ol>\n'
+        for rec in model['recommendations']:
+            yield f"<li>{escape(rec)}</li>\n"
+        yield '</ol>\n'
+
+        yield (f"<p><i>Report generated by WebScan Professional v1.0 on "
+               f"{escape(model['generated_at'])}</i><br>\n"
+               '<i>This report is confidential and intended for authorized personnel only.</i></p>\n'
+               '</body>\n</html>\n')
+
+
+# Report formats served by /download_report, besides the PDF
+RENDERERS = {
+    'json': JSONRenderer(),
+    'sarif': SARIFRenderer(),
+    'html': HTMLRenderer(),
+}
@@ -0,0 +1,130 @@
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from metrics import STAGE_SECONDS
+
+# Record fields that determine a report's content
+REPORT_FIELDS = ('scan_id', 'timestamp', 'target', 'scan_type', 'gmail',
+                 'vuln_stage', 'vulnerabilities', 'results')
+
+
+def report_content_hash(record):
+    """Stable hash of the parts of a scan record that end up in its report"""
+    content = {field: record.get(field) for field in REPORT_FIELDS}
+    encoded = json.dumps(content, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+def _render(record, path):
+    # Runs in a worker process; ReportLab is imported there, not in the web tier
+    from report_generator import generate_professional_report
+
+    start = time.perf_counter()
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    generate_professional_report(record, report_filename=tmp_path)
+    os.replace(tmp_path, path)
+    # Seconds spent rendering, recorded by the web process
+    return time.perf_counter() - start
+
+
+class ReportService:
+    """Renders PDF reports in a process pool and caches them on disk
+
+    Reports are keyed by scan_id plus a hash of the record's content, so a
+    cached PDF is reused until the scan it describes changes.
+    """
+
+    def __init__(self, directory='reports', workers=2, start_method='spawn',
+                 max_age=7 * 24 * 3600, render_timeout=300):
+        self.directory = directory
+        self.workers = workers
+        self.start_method = start_method
+        self.max_age = max_age
+        self.render_timeout = render_timeout
+
+        self._executor = None
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._last_prune = 0
+
+    def _pool(self):
+        # Called with the lock held; the pool is only started on first use
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(self.start_method)
+            )
+        return self._executor
+
+    def report_path(self, record):
+        name = f"{record['scan_id']}_{report_content_hash(record)}.pdf"
+        return os.path.join(self.directory, name)
+
+    def submit(self, record):
+        """Start rendering a report unless it is cached or already rendering"""
+        path = self.report_path(record)
+        with self._lock:
+            future = self._pending.get(path)
+            if future is not None:
+                return path, future
+            if os.path.exists(path):
+                return path, None
+            os.makedirs(self.directory, exist_ok=True)
+            future = self._pool().submit(_render, record, path)
+            self._pending[path] = future
+        future.add_done_callback(lambda done: self._finished(path, done))
+        return path, future
+
+    def render(self, record):
+        """Path of the record's PDF report, rendering it on first request"""
+        path, future = self.submit(record)
+        if future is not None:
+            future.result(timeout=self.render_timeout)
+        self._maybe_prune()
+        return path
+
+    async def render_async(self, record):
+        """render() for asyncio callers: awaits the render without holding a thread"""
+        import asyncio
+        path, future = self.submit(record)
+        if future is not None:
+            # Shielded: a client that disconnects must not cancel a shared render
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)),
+                                   self.render_timeout)
+        self._maybe_prune()
+        return path
+
+    def prefetch(self, record):
+        """Render a report ahead of time without waiting for it"""
+        self.submit(record)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _finished(self, path, future):
+        with self._lock:
+            self._pending.pop(path, None)
+        if not future.cancelled() and future.exception() is None:
+            STAGE_SECONDS.observe(future.result(), stage='generate_professional_report')
+
+    def _maybe_prune(self):
+        now = time.time()
+        with self._lock:
+            if now - self._last_prune < 3600:
+                return
+            self._last_prune = now
+        for path in glob.glob(os.path.join(self.directory, '*.pdf')):
+            try:
+                if now - os.path.getmtime(path) > self.max_age:
+                    os.remove(path)
+            except OSError:
+                pass
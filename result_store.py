@@ -0,0 +1,511 @@
+import copy
+import gzip
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from ttl_cache import TTLCache
+
+# Scanner result fields holding raw tool output; kept on disk, not in the DB
+RAW_OUTPUT_FIELDS = ('output', 'headers')
+
+# Statuses after which a scan record no longer changes
+TERMINAL_STATUSES = ('completed', 'failed', 'cancelled')
+
+
+class BlobStore:
+    """Gzip-compressed raw scanner outputs, one file per scan"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, scan_id):
+        return os.path.join(self.directory, f'{scan_id}.json.gz')
+
+    def write(self, scan_id, outputs):
+        path = self._path(scan_id)
+        tmp_path = path + '.tmp'
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(outputs, f)
+        os.replace(tmp_path, path)
+
+    def read(self, scan_id):
+        try:
+            with gzip.open(self._path(scan_id), 'rt', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def delete(self, scan_id):
+        try:
+            os.remove(self._path(scan_id))
+        except FileNotFoundError:
+            pass
+
+
+class RedisBlobStore:
+    """Gzip-compressed raw scanner outputs as Redis values, one per scan"""
+
+    def __init__(self, url, prefix='webscan'):
+        import redis
+
+        # Compressed bytes, so responses are not decoded
+        self.redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _key(self, scan_id):
+        return f'{self.prefix}:outputs:{scan_id}'
+
+    def write(self, scan_id, outputs):
+        self.redis.set(self._key(scan_id), gzip.compress(json.dumps(outputs).encode('utf-8')))
+
+    def read(self, scan_id):
+        data = self.redis.get(self._key(scan_id))
+        return json.loads(gzip.decompress(data)) if data else {}
+
+    def delete(self, scan_id):
+        self.redis.delete(self._key(scan_id))
+
+
+class MemoryBackend:
+    """Non-persistent backend, mainly for development"""
+
+    def __init__(self):
+        self._records = {}
+        self._batches = {}
+        self._lock = threading.Lock()
+
+    def save(self, record):
+        with self._lock:
+            self._records[record['scan_id']] = (time.time(), json.dumps(record))
+
+    def load(self, scan_id):
+        with self._lock:
+            item = self._records.get(scan_id)
+        return json.loads(item[1]) if item else None
+
+    def delete(self, scan_id):
+        with self._lock:
+            self._records.pop(scan_id, None)
+
+    def expired(self, older_than, keep_latest):
+        """scan_ids of finished scans past retention or beyond the size cap"""
+        with self._lock:
+            finished = sorted(
+                (updated_at, scan_id)
+                for scan_id, (updated_at, data) in self._records.items()
+                if json.loads(data).get('status') in TERMINAL_STATUSES
+            )
+        excess = max(0, len(finished) - keep_latest)
+        return [scan_id for i, (updated_at, scan_id) in enumerate(finished)
+                if i < excess or updated_at < older_than]
+
+    def unfinished(self):
+        """scan_ids of scans still queued or running"""
+        with self._lock:
+            return [scan_id for scan_id, (updated_at, data) in self._records.items()
+                    if json.loads(data).get('status') not in TERMINAL_STATUSES]
+
+    def save_batch(self, batch):
+        with self._lock:
+            self._batches[batch['batch_id']] = (time.time(), json.dumps(batch))
+
+    def load_batch(self, batch_id):
+        with self._lock:
+            item = self._batches.get(batch_id)
+        return json.loads(item[1]) if item else None
+
+    def delete_batches(self, older_than):
+        with self._lock:
+            for batch_id, (created_at, _) in list(self._batches.items()):
+                if created_at < older_than:
+                    del self._batches[batch_id]
+
+
+class SQLiteBackend:
+    """Scan records in an SQLite database running in WAL mode"""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._local = threading.local()
+        self._setup()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _setup(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS scans (
+                    scan_id TEXT PRIMARY KEY,
+                    gmail TEXT,
+                    timestamp TEXT,
+                    status TEXT,
+                    updated_at REAL,
+                    record TEXT NOT NULL
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_scans_gmail ON scans (gmail)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_scans_timestamp ON scans (timestamp)')
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_scans_status_updated '
+                'ON scans (status, updated_at)'
+            )
+            # /scan_batch requests: the batch's targets and their scan_ids
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS batches (
+                    batch_id TEXT PRIMARY KEY,
+                    created_at REAL,
+                    record TEXT NOT NULL
+                )
+            """)
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_batches_created ON batches (created_at)')
+
+    def save(self, record):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO scans '
+                '(scan_id, gmail, timestamp, status, updated_at, record) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (record['scan_id'], record.get('gmail'), record.get('timestamp'),
+                 record.get('status'), time.time(), json.dumps(record))
+            )
+
+    def load(self, scan_id):
+        row = self._connect().execute(
+            'SELECT record FROM scans WHERE scan_id = ?', (scan_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete(self, scan_id):
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM scans WHERE scan_id = ?', (scan_id,))
+
+    def expired(self, older_than, keep_latest):
+        """scan_ids of finished scans past retention or beyond the size cap"""
+        placeholders = ', '.join('?' for _ in TERMINAL_STATUSES)
+        rows = self._connect().execute(
+            f'SELECT scan_id FROM scans WHERE status IN ({placeholders}) '
+            'AND (updated_at < ? OR scan_id NOT IN ('
+            f'  SELECT scan_id FROM scans WHERE status IN ({placeholders}) '
+            '  ORDER BY updated_at DESC LIMIT ?))',
+            TERMINAL_STATUSES + (older_than,) + TERMINAL_STATUSES + (keep_latest,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def unfinished(self):
+        """scan_ids of scans still queued or running"""
+        placeholders = ', '.join('?' for _ in TERMINAL_STATUSES)
+        rows = self._connect().execute(
+            f'SELECT scan_id FROM scans WHERE status IS NULL OR status NOT IN ({placeholders})',
+            TERMINAL_STATUSES
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def save_batch(self, batch):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO batches (batch_id, created_at, record) '
+                'VALUES (?, ?, ?)',
+                (batch['batch_id'], time.time(), json.dumps(batch))
+            )
+
+    def load_batch(self, batch_id):
+        row = self._connect().execute(
+            'SELECT record FROM batches WHERE batch_id = ?', (batch_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete_batches(self, older_than):
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM batches WHERE created_at < ?', (older_than,))
+
+
+class RedisBackend:
+    """Scan records and batches in Redis, shared by hosts that run scans
+
+    Records and batches are JSON strings. A sorted set orders finished
+    scans by their last save and another orders batches by creation, for
+    eviction; a set holds the scans still queued or running. Needs the
+    `redis` package.
+    """
+
+    def __init__(self, url, prefix='webscan'):
+        import redis
+
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+
+    def _scan(self, scan_id):
+        return f'{self.prefix}:scan:{scan_id}'
+
+    def _batch(self, batch_id):
+        return f'{self.prefix}:batch:{batch_id}'
+
+    @property
+    def _finished(self):
+        return f'{self.prefix}:scans:finished'
+
+    @property
+    def _unfinished(self):
+        return f'{self.prefix}:scans:unfinished'
+
+    @property
+    def _batches(self):
+        return f'{self.prefix}:batches'
+
+    def save(self, record):
+        scan_id = record['scan_id']
+        pipe = self.redis.pipeline()
+        pipe.set(self._scan(scan_id), json.dumps(record))
+        if record.get('status') in TERMINAL_STATUSES:
+            pipe.zadd(self._finished, {scan_id: time.time()})
+            pipe.srem(self._unfinished, scan_id)
+        else:
+            pipe.sadd(self._unfinished, scan_id)
+            pipe.zrem(self._finished, scan_id)
+        pipe.execute()
+
+    def load(self, scan_id):
+        data = self.redis.get(self._scan(scan_id))
+        return json.loads(data) if data else None
+
+    def delete(self, scan_id):
+        pipe = self.redis.pipeline()
+        pipe.delete(self._scan(scan_id))
+        pipe.zrem(self._finished, scan_id)
+        pipe.srem(self._unfinished, scan_id)
+        pipe.execute()
+
+    def expired(self, older_than, keep_latest):
+        """scan_ids of finished scans past retention or beyond the size cap"""
+        expired = self.redis.zrangebyscore(self._finished, '-inf', f'({older_than}')
+        excess = self.redis.zcard(self._finished) - keep_latest
+        if excess > 0:
+            expired += self.redis.zrange(self._finished, 0, excess - 1)
+        return list(dict.fromkeys(expired))
+
+    def unfinished(self):
+        """scan_ids of scans still queued or running"""
+        return list(self.redis.smembers(self._unfinished))
+
+    def save_batch(self, batch):
+        pipe = self.redis.pipeline()
+        pipe.set(self._batch(batch['batch_id']), json.dumps(batch))
+        pipe.zadd(self._batches, {batch['batch_id']: time.time()})
+        pipe.execute()
+
+    def load_batch(self, batch_id):
+        data = self.redis.get(self._batch(batch_id))
+        return json.loads(data) if data else None
+
+    def delete_batches(self, older_than):
+        batch_ids = self.redis.zrangebyscore(self._batches, '-inf', f'({older_than}')
+        if not batch_ids:
+            return
+        pipe = self.redis.pipeline()
+        pipe.delete(*[self._batch(batch_id) for batch_id in batch_ids])
+        pipe.zrem(self._batches, *batch_ids)
+        pipe.execute()
+
+
+class ResultStore:
+    """Scan records backed by a persistent store
+
+    Records of scans that are still queued or running are kept as live dicts
+    so scan threads can keep updating them, inside editing(); get() returns
+    a copy taken under the same lock. Once a scan finishes its record
+    is persisted, raw tool outputs are moved to compressed blobs and only a
+    small LRU/TTL cache of finished records stays in memory.
+
+    With `keep_active` off, unfinished records are read back from the
+    backend instead, for scans run by another process (worker.py).
+    """
+
+    def __init__(self, backend, blobs, cache_size=256, cache_ttl=30,
+                 retention=7 * 24 * 3600, max_completed=10000,
+                 evict_interval=300, keep_active=True):
+        self.backend = backend
+        self.keep_active = keep_active
+        self.blobs = blobs
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self.retention = retention
+        self.max_completed = max_completed
+        self.evict_interval = evict_interval
+
+        self._active = {}
+        # Reentrant, so a record being edited can also be saved
+        self._lock = threading.RLock()
+        self._last_eviction = 0
+
+    @contextmanager
+    def editing(self):
+        """Hold while changing a live record, so readers never copy it half-changed"""
+        with self._lock:
+            yield
+
+    def save(self, record):
+        """Store a scan record, offloading it once the scan has finished"""
+        scan_id = record['scan_id']
+        with self._lock:
+            stripped, outputs = strip_outputs(record)
+            stripped = copy.deepcopy(stripped)
+            finished = stripped.get('status') in TERMINAL_STATUSES
+            if self.keep_active and not finished:
+                self._active[scan_id] = record
+        if not finished:
+            self.backend.save(stripped)
+            return
+
+        if outputs:
+            self.blobs.write(scan_id, outputs)
+        self.backend.save(stripped)
+        self.cache.set(scan_id, stripped)
+        with self._lock:
+            self._active.pop(scan_id, None)
+        self._maybe_evict()
+
+    def get(self, scan_id, include_outputs=True):
+        """Return a scan record, or None if it is unknown"""
+        with self._lock:
+            record = self._active.get(scan_id)
+            if record is not None:
+                if not include_outputs:
+                    record = strip_outputs(record)[0]
+                return copy.deepcopy(record)
+
+        record = self.cache.get(scan_id)
+        if record is None:
+            record = self.backend.load(scan_id)
+            if record is None:
+                return None
+            if record.get('status') in TERMINAL_STATUSES:
+                self.cache.set(scan_id, record)
+
+        if include_outputs:
+            return merge_outputs(record, self.blobs.read(scan_id))
+        # The cached dict is shared by every reader
+        return copy.deepcopy(record)
+
+    def delete(self, scan_id):
+        with self._lock:
+            self._active.pop(scan_id, None)
+        self.cache.pop(scan_id)
+        self.backend.delete(scan_id)
+        self.blobs.delete(scan_id)
+
+    def __contains__(self, scan_id):
+        return self.get(scan_id, include_outputs=False) is not None
+
+    def save_batch(self, batch):
+        """Store a batch of scans, readable by every process sharing the store"""
+        self.backend.save_batch(batch)
+
+    def get_batch(self, batch_id):
+        return self.backend.load_batch(batch_id)
+
+    def fail_unfinished(self, error):
+        """Mark every queued or running scan failed; returns how many
+
+        For startup of the web app's local worker pool: its scans do not
+        survive a restart, and records left 'running' would never finish
+        or be evicted.
+        """
+        failed = 0
+        for scan_id in self.backend.unfinished():
+            record = self.backend.load(scan_id)
+            if record is None or record.get('status') in TERMINAL_STATUSES:
+                continue
+            record['status'] = 'failed'
+            record['error'] = error
+            self.save(record)
+            failed += 1
+        return failed
+
+    def evict(self):
+        """Drop finished scans past retention or beyond the size cap"""
+        older_than = time.time() - self.retention
+        evicted = self.backend.expired(older_than, self.max_completed)
+        for scan_id in evicted:
+            self.delete(scan_id)
+        # Batches are kept as long as their scans can be
+        self.backend.delete_batches(older_than)
+        return len(evicted)
+
+    def _maybe_evict(self):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_eviction < self.evict_interval:
+                return
+            self._last_eviction = now
+        try:
+            self.evict()
+        except Exception as e:
+            print(f"Failed to evict old scan results: {e}")
+
+
+def strip_outputs(record):
+    """Split a record into a copy without raw outputs and the outputs"""
+    stripped = dict(record)
+    stripped['results'] = {}
+    outputs = {}
+    for scanner, result in record.get('results', {}).items():
+        if not isinstance(result, dict):
+            stripped['results'][scanner] = result
+            continue
+        raw = {field: result[field] for field in RAW_OUTPUT_FIELDS if field in result}
+        if raw:
+            outputs[scanner] = raw
+        stripped['results'][scanner] = {
+            key: value for key, value in result.items() if key not in raw
+        }
+    return stripped, outputs
+
+
+def merge_outputs(record, outputs):
+    """Return a copy of a stripped record with its raw outputs restored"""
+    merged = copy.deepcopy(record)
+    for scanner, raw in outputs.items():
+        merged['results'].setdefault(scanner, {}).update(raw)
+    return merged
+
+
+def create_result_store(settings):
+    """Build the result store described by the config module"""
+    if settings.RESULT_STORE_BACKEND == 'redis':
+        backend = RedisBackend(settings.RESULT_REDIS_URL)
+        blobs = RedisBlobStore(settings.RESULT_REDIS_URL)
+    else:
+        if settings.RESULT_STORE_BACKEND == 'memory':
+            backend = MemoryBackend()
+        else:
+            backend = SQLiteBackend(settings.RESULT_DB_PATH)
+        blobs = BlobStore(settings.RESULT_BLOB_DIR)
+    return ResultStore(
+        backend,
+        blobs,
+        cache_size=settings.RESULT_CACHE_SIZE,
+        cache_ttl=settings.RESULT_CACHE_TTL,
+        retention=settings.RESULT_RETENTION,
+        max_completed=settings.RESULT_MAX_COMPLETED,
+        keep_active=settings.SCAN_EXECUTION != 'queue'
+    )
@@ -0,0 +1,359 @@
+import heapq
+import json
+import re
+from functools import cached_property
+from operator import itemgetter
+
+SEVERITIES = ('Critical', 'High', 'Medium', 'Low')
+
+# Example lines kept per matched rule
+MAX_SAMPLES = 5
+
+# Shortest literal prefix worth indexing; rules with a shorter one would
+# stop the combined search at nearly every line
+MIN_PREFIX = 3
+
+REGEX_METACHARACTERS = frozenset('.^$*+?{}[]()|')
+QUANTIFIERS = frozenset('*+?{')
+
+
+class RuleError(Exception):
+    """Raised for malformed rule definitions"""
+
+
+class Rule:
+    def __init__(self, data):
+        missing = [key for key in ('id', 'scanner', 'title', 'severity') if key not in data]
+        if missing:
+            raise RuleError(f"Rule {data.get('id', '?')} is missing {', '.join(missing)}")
+        if data['severity'] not in SEVERITIES:
+            raise RuleError(f"Rule {data['id']} has unknown severity {data['severity']}")
+        if ('keyword' in data) == ('pattern' in data):
+            raise RuleError(f"Rule {data['id']} needs exactly one of keyword or pattern")
+
+        self.id = data['id']
+        self.scanner = data['scanner']
+        self.keyword = data.get('keyword')
+        self.pattern = data.get('pattern')
+        self.title = data['title']
+        self.severity = data['severity']
+        self.description = data.get('description', '')
+        self.impact = data.get('impact', '')
+        self.recommendation = data.get('recommendation', '')
+
+        if self.pattern:
+            try:
+                re.compile(self.pattern)
+            except re.error as e:
+                raise RuleError(f"Rule {self.id} has an invalid pattern: {e}")
+
+
+class CompiledRuleSet:
+    """All rules of one scanner, matched in a single pass over the output
+
+    Every rule that starts with at least MIN_PREFIX literal characters (all
+    longer keywords, and patterns such as ``/\\.git/``) is indexed by that
+    prefix in one trie-shaped regex. One search of the output finds each
+    position where some prefix occurs, and the rules sharing it are checked
+    right there: a keyword has already matched, a pattern is matched at
+    that position. Adding rules grows the trie, not the number of passes.
+    Rules without a usable prefix would stop the search at almost every
+    line, so each of them is searched for on its own.
+
+    Counts are those of one findall per rule: a rule's matches do not
+    overlap each other, but matches of different rules may (a .git path
+    that is also a backup file fires both rules).
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        # Rules starting with a prefix: {prefix: [(rule, regex or None)]}
+        by_prefix = {}
+        # Rules searched for on their own: [(rule, regex)]
+        self.searched = []
+        for rule in rules:
+            if rule.keyword:
+                prefix, regex = rule.keyword.lower(), None
+            else:
+                prefix = literal_prefix(rule.pattern)
+                regex = re.compile(rule.pattern, re.IGNORECASE | re.MULTILINE)
+            if len(prefix) < MIN_PREFIX:
+                self.searched.append((rule, regex or re.compile(re.escape(rule.keyword), re.IGNORECASE)))
+            else:
+                by_prefix.setdefault(prefix, []).append((rule, regex))
+
+        trie = build_trie(by_prefix)
+        # The search finds the longest prefix at a position; rules whose
+        # prefix is shorter match there too
+        self.dispatch = {
+            word: [(rule, regex, len(word[:end]))
+                   for end in range(1, len(word) + 1)
+                   for rule, regex in by_prefix.get(word[:end], ())]
+            for word in by_prefix
+        }
+        # Offsets inside a found prefix where another prefix may start; the
+        # search resumes after the prefix, so these are checked separately
+        self.rechecks = {word: inner_starts(trie, word) for word in by_prefix}
+        self.prefix_regex = trie_pattern(trie) if by_prefix else None
+
+    @cached_property
+    def finder(self):
+        """The prefix search over lower-cased text"""
+        return re.compile(self.prefix_regex)
+
+    @cached_property
+    def finder_ignorecase(self):
+        """The prefix search for text whose length changes when lower-cased"""
+        return re.compile(self.prefix_regex, re.IGNORECASE)
+
+    def scan(self, text):
+        """One pass over `text` for every rule
+
+        Returns {rule_id: [rule, count, samples]} and the number of distinct
+        lines that matched at least one rule.
+        """
+        hits = {}
+        if not self.rules or not text:
+            return hits, 0
+
+        matched_lines = 0
+        line_end = -1
+        sample = None
+        for position, rule in self.matches(text):
+            if position > line_end:
+                line_start = text.rfind('\n', 0, position) + 1
+                line_end = text.find('\n', position)
+                if line_end == -1:
+                    line_end = len(text)
+                sample = text[line_start:line_end].strip()
+                matched_lines += 1
+            hit = hits.get(rule.id)
+            if hit is None:
+                hit = hits[rule.id] = [rule, 0, []]
+            hit[1] += 1
+            if len(hit[2]) < MAX_SAMPLES and sample not in hit[2]:
+                hit[2].append(sample)
+        return hits, matched_lines
+
+    def matches(self, text):
+        """(position, rule) of every match in `text`, in text order"""
+        streams = [self.prefix_matches(text)]
+        streams += [searched_matches(rule, regex, text) for rule, regex in self.searched]
+        return heapq.merge(*streams, key=itemgetter(0))
+
+    def prefix_matches(self, text):
+        """(position, rule) of every match of the rules indexed by prefix"""
+        if self.prefix_regex is None:
+            return
+        folded, finder = text.lower(), self.finder
+        if len(folded) != len(text):
+            # A few characters lower-case to two; keep positions aligned
+            folded, finder = text, self.finder_ignorecase
+        # Where each rule's next match may start, as findall would resume
+        resume = {}
+        for match in finder.finditer(folded):
+            start, word = match.start(), match.group().lower()
+            yield from self.rules_at(text, start, word, resume)
+            for offset in self.rechecks[word]:
+                inner = finder.match(folded, start + offset)
+                if inner is not None:
+                    yield from self.rules_at(text, start + offset, inner.group().lower(), resume)
+
+    def rules_at(self, text, position, word, resume):
+        """(position, rule) of the rules matching where prefix `word` was found"""
+        for rule, regex, length in self.dispatch[word]:
+            if position < resume.get(rule, 0):
+                continue
+            if regex is None:
+                end = position + length
+            else:
+                match = regex.match(text, position)
+                if match is None:
+                    continue
+                end = max(match.end(), position + 1)
+            resume[rule] = end
+            yield position, rule
+
+
+def searched_matches(rule, regex, text):
+    """(position, rule) of every match of a rule searched for on its own"""
+    for match in regex.finditer(text):
+        yield match.start(), rule
+
+
+class RuleEngine:
+    """Declarative vulnerability rules, compiled once per scanner"""
+
+    def __init__(self, rules):
+        self.rules = [rule if isinstance(rule, Rule) else Rule(rule) for rule in rules]
+        by_scanner = {}
+        for rule in self.rules:
+            by_scanner.setdefault(rule.scanner, []).append(rule)
+        self.rule_sets = {
+            scanner: CompiledRuleSet(rules) for scanner, rules in by_scanner.items()
+        }
+
+    @classmethod
+    def from_file(cls, path):
+        """Load rules from a JSON or (with PyYAML installed) YAML file"""
+        with open(path, encoding='utf-8') as f:
+            if path.endswith(('.yml', '.yaml')):
+                # YAML rule files are optional, and PyYAML is slow to import
+                try:
+                    import yaml
+                except ImportError:
+                    raise RuleError('PyYAML is required for YAML rule files')
+                data = yaml.safe_load(f)
+            else:
+                data = json.load(f)
+        if isinstance(data, dict):
+            data = data.get('rules', [])
+        return cls(data)
+
+    def scan(self, scanner, text):
+        """Rule hits for one scanner's output, in rule file order
+
+        Returns a list of (rule, count, samples) and the number of output
+        lines that matched any rule.
+        """
+        rule_set = self.rule_sets.get(scanner)
+        if rule_set is None:
+            return [], 0
+        hits, matched_lines = rule_set.scan(text)
+        return [tuple(hits[rule.id]) for rule in rule_set.rules if rule.id in hits], matched_lines
+
+    def findings(self, scanner, text):
+        """Vulnerability entries for every rule matched in the output"""
+        return self.classify(scanner, text)[0]
+
+    def classify(self, scanner, text):
+        """Vulnerability entries plus the number of lines they account for"""
+        vulnerabilities = []
+        hits, matched_lines = self.scan(scanner, text)
+        for rule, count, samples in hits:
+            title = rule.title if count == 1 else f'{rule.title} ({count} occurrences)'
+            description = rule.description
+            if samples:
+                description = f"{description} Evidence: {'; '.join(samples)}".strip()
+            vulnerabilities.append({
+                'title': title,
+                'severity': rule.severity,
+                'description': description,
+                'impact': rule.impact,
+                'recommendation': rule.recommendation,
+                'rule_id': rule.id,
+                # Without the count and evidence, for per-rule summaries (SARIF)
+                'rule_title': rule.title,
+                'rule_description': rule.description
+            })
+        return vulnerabilities, matched_lines
+
+
+def build_trie(words):
+    """Nested {char: node} dicts of `words`; '' marks the end of a word"""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = None
+    return trie
+
+
+def trie_regex(words):
+    """Regex matching any of `words`, with shared prefixes factored out"""
+    return trie_pattern(build_trie(words))
+
+
+def trie_pattern(trie):
+    """Regex for a trie built by build_trie, preferring the longest word"""
+    def build(node):
+        branches = [re.escape(char) + build(child)
+                    for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            # A shorter word ends here; the greedy ? still prefers the longer one
+            return '(?:' + body + ')?'
+        return body
+
+    return build(trie)
+
+
+def inner_starts(trie, word):
+    """Offsets inside `word` where a word of `trie` could start
+
+    A word starts there if one ends within the rest of `word`, or if the
+    rest of `word` is the beginning of a longer one.
+    """
+    offsets = []
+    for offset in range(1, len(word)):
+        node = trie
+        for char in word[offset:]:
+            node = node.get(char)
+            if node is None or '' in node:
+                break
+        if node is not None:
+            offsets.append(offset)
+    return offsets
+
+
+def literal_prefix(pattern):
+    """Lower-cased literal text every match of `pattern` starts with
+
+    Conservative: stops at the first character class, group, escape
+    sequence or other metacharacter, drops a literal that is quantified,
+    and gives up on patterns with a top-level alternation.
+    """
+    if has_top_level_alternation(pattern):
+        return ''
+    position = 0
+    while pattern.startswith('^', position):
+        # Only anchors the match; the rule's own regex still checks it
+        position += 1
+    chars = []
+    while position < len(pattern):
+        char = pattern[position]
+        if char == '\\':
+            escaped = pattern[position + 1:position + 2]
+            if not escaped or escaped.isalnum():
+                break
+            char, width = escaped, 2
+        elif char in REGEX_METACHARACTERS:
+            break
+        else:
+            width = 1
+        if pattern[position + width:position + width + 1] in QUANTIFIERS:
+            break
+        chars.append(char)
+        position += width
+    return ''.join(chars).lower()
+
+
+def has_top_level_alternation(pattern):
+    """Whether `pattern` has a | outside any group or character class"""
+    depth = 0
+    position = 0
+    while position < len(pattern):
+        char = pattern[position]
+        if char == '\\':
+            position += 2
+            continue
+        if char == '[':
+            # Skip the class; a ] right after [ or [^ is a literal
+            position += 1
+            if pattern.startswith('^', position):
+                position += 1
+            if pattern.startswith(']', position):
+                position += 1
+            while position < len(pattern) and pattern[position] != ']':
+                position += 2 if pattern[position] == '\\' else 1
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == '|' and depth == 0:
+            return True
+        position += 1
+    return False
@@ -0,0 +1,452 @@
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from datetime import datetime
+
+from ttl_cache import TTLCache
+
+# Result of a scanner run that was stopped by its scan being cancelled
+CANCELLED_RESULT = {'error': 'Scan cancelled', 'cancelled': True, 'success': False}
+
+# Result for a caller whose deadline passed while it waited on another run
+DEADLINE_RESULT = {'error': 'Scan deadline reached while waiting for a shared run',
+                   'success': False}
+
+
+def normalize_target(target):
+    """Canonical form of a target, so trivial spelling differences share a key"""
+    return target.strip().lower().rstrip('/')
+
+
+def cache_key(scanner, target, options):
+    return (normalize_target(target), scanner, tuple(options))
+
+
+def shared_key(key):
+    """A cache_key() as a string, for the shared tier"""
+    return json.dumps([key[0], key[1], list(key[2])])
+
+
+class ScanResultCache:
+    """Recent scanner results keyed on (target, scanner, options)
+
+    Successful results are kept for a per-scanner TTL. Identical scans that
+    are already running are coalesced: later callers wait for the running
+    one instead of starting another subprocess.
+
+    With a `shared` tier (worker.py processes), results are also cached
+    there and runs are claimed there, so scans in other processes reuse
+    them and wait on each other's runs too. Claims last `lease` seconds,
+    in case their process dies; waiting on another process's run polls
+    every `poll_interval` seconds.
+    """
+
+    def __init__(self, ttls, maxsize=512, default_ttl=600, shared=None, lease=900,
+                 poll_interval=0.5):
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+        self.cache = TTLCache(maxsize=maxsize, ttl=default_ttl)
+        self.shared = shared
+        self.lease = lease
+        self.poll_interval = poll_interval
+        # Owner of this process's claims in the shared tier
+        self.owner = uuid.uuid4().hex
+        # Claimed keys resolved by resolve(): key -> owner of the shared claim
+        self._shared_owners = {}
+        self._inflight = {}
+        # In-flight keys: callers waiting on them, and those all of whose
+        # waiters have given up (cancelled or out of time)
+        self._waiting = {}
+        self._given_up = set()
+        # Events set once every key of a watched run has been given up
+        self._watches = {}
+        self._lock = threading.Lock()
+
+    def key(self, scanner, target, options):
+        return cache_key(scanner, target, options)
+
+    def get_or_run(self, scanner, target, options, run, force_refresh=False, on_shared=None,
+                   cancel=None, deadline=None):
+        """Return a cached or in-flight result, or call `run` to produce one
+
+        A caller waiting on someone else's run stops waiting once its
+        `cancel` event is set or its `deadline` (a time.monotonic() value)
+        passes. If the run it waited on was itself cancelled, the caller
+        runs the scan instead.
+        """
+        key = self.key(scanner, target, options)
+        with self._lock:
+            if not force_refresh:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    return dict(copy.deepcopy(cached['result']), cached_at=cached['at'])
+            # A scan that is already running is as fresh as a forced one
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+
+        if not owner:
+            if on_shared:
+                on_shared()
+            result = self._wait(key, future, cancel, deadline)
+            if result.get('cancelled') and not (cancel and cancel.is_set()):
+                return self.get_or_run(scanner, target, options, run, force_refresh,
+                                       on_shared, cancel, deadline)
+            return copy.deepcopy(result)
+
+        claimed = False
+        try:
+            result = None
+            if self.shared is not None:
+                result = self._from_shared(key, force_refresh, on_shared, cancel, deadline)
+                claimed = result is None
+            if result is None:
+                result = run()
+                self._store(scanner, key, result)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            if result is CANCELLED_RESULT or result is DEADLINE_RESULT:
+                # This caller gave up waiting; the others here try again
+                future.set_result(CANCELLED_RESULT)
+                return dict(result)
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._finish(key)
+            if claimed:
+                self._release(key, self.owner)
+
+    def claim(self, scanner, targets, options, force_refresh=False, owner=None):
+        """Mark targets as in flight, for a caller that scans them together
+
+        Returns the targets the caller now owns (those neither cached nor
+        already running); each must later be passed to resolve(). Callers
+        of get_or_run() for an owned target wait for that result. In the
+        shared tier, targets reserved under `owner` (see reserve()) are
+        taken over.
+        """
+        owner = owner or self.owner
+        owned = []
+        with self._lock:
+            for target in targets:
+                key = self.key(scanner, target, options)
+                if key in self._inflight:
+                    continue
+                if not force_refresh and self.cache.get(key) is not None:
+                    continue
+                if self.shared is not None and not self._claim_shared(key, owner, force_refresh):
+                    continue
+                self._inflight[key] = Future()
+                self._shared_owners[key] = owner
+                owned.append(target)
+        return owned
+
+    def resolve(self, scanner, target, options, result):
+        """Publish the result of a claimed target"""
+        key = self.key(scanner, target, options)
+        self._store(scanner, key, result)
+        with self._lock:
+            future = self._finish(key)
+            owner = self._shared_owners.pop(key, None)
+        if owner is not None:
+            self._release(key, owner)
+        if future is not None:
+            future.set_result(result)
+
+    def _claim_shared(self, key, owner, force_refresh):
+        try:
+            if not force_refresh and self.shared.get(shared_key(key)):
+                return False
+            return self.shared.claim(shared_key(key), owner, self.lease)
+        except Exception as e:
+            # Without the shared tier, scans still run; they just are not shared
+            print(f"Shared scan cache unavailable: {e}")
+            return True
+
+    def _from_shared(self, key, force_refresh, on_shared, cancel, deadline):
+        """A result from the shared tier, waiting if another process is running it
+
+        Returns None once this process has claimed the run and should
+        scan itself: nothing is cached and nobody else is running it, or
+        the run it waited on ended without a result.
+        """
+        name = shared_key(key)
+        waited = False
+        try:
+            while True:
+                # After waiting, a forced run's result is as fresh as asked for
+                reuse = not force_refresh or waited
+                entry = self.shared.get(name) if reuse else None
+                if entry is None and self.shared.claim(name, self.owner, self.lease):
+                    # The run waited on may have stored its result and
+                    # released its claim between the lookup and the claim
+                    entry = self.shared.get(name) if reuse else None
+                    if entry is None:
+                        return None
+                    self.shared.release(name, self.owner)
+                if entry is not None:
+                    result = entry['result']
+                    if not waited:
+                        result = dict(result, cached_at=entry['at'])
+                    self.cache.set(key, entry, ttl=self._ttl(key))
+                    return result
+                if not waited and on_shared:
+                    on_shared()
+                waited = True
+                if cancel is not None and cancel.is_set():
+                    return CANCELLED_RESULT
+                if deadline is not None and time.monotonic() >= deadline:
+                    return DEADLINE_RESULT
+                if cancel is not None:
+                    cancel.wait(self.poll_interval)
+                else:
+                    time.sleep(self.poll_interval)
+        except Exception as e:
+            print(f"Shared scan cache unavailable: {e}")
+            return None
+
+    def _release(self, key, owner):
+        try:
+            self.shared.release(shared_key(key), owner)
+        except Exception as e:
+            print(f"Failed to release a shared scan: {e}")
+
+    def _ttl(self, key):
+        return self.ttls.get(key[1], self.default_ttl)
+
+    def watch(self, scanner, targets, options):
+        """An event set once nobody wants the claimed targets' results any more
+
+        That is when every target still in flight has had callers waiting on
+        it, and all of them were cancelled or ran out of time; callers that
+        have not asked yet (e.g. scans still queued) keep the run wanted.
+        Pass the event to unwatch() when the run is over.
+        """
+        event = threading.Event()
+        with self._lock:
+            self._watches[event] = {self.key(scanner, target, options) for target in targets}
+        return event
+
+    def unwatch(self, event):
+        with self._lock:
+            self._watches.pop(event, None)
+
+    def _wait(self, key, future, cancel, deadline):
+        with self._lock:
+            self._waiting[key] = self._waiting.get(key, 0) + 1
+            self._given_up.discard(key)
+        result = None
+        try:
+            while result is None:
+                try:
+                    return future.result(timeout=0.25)
+                except FutureTimeout:
+                    if cancel is not None and cancel.is_set():
+                        result = CANCELLED_RESULT
+                    elif deadline is not None and time.monotonic() >= deadline:
+                        result = DEADLINE_RESULT
+            return result
+        finally:
+            with self._lock:
+                self._waiting[key] -= 1
+                if not self._waiting[key]:
+                    del self._waiting[key]
+                    if result is not None and key in self._inflight:
+                        self._given_up.add(key)
+                        self._check_watches()
+
+    def _check_watches(self):
+        # Called with the lock held
+        for event, keys in self._watches.items():
+            pending = keys & self._inflight.keys()
+            if pending and pending <= self._given_up:
+                event.set()
+
+    def _finish(self, key):
+        # Called with the lock held; returns the key's future
+        self._given_up.discard(key)
+        return self._inflight.pop(key, None)
+
+    def _store(self, scanner, key, result):
+        if result.get('success'):
+            entry = {'result': copy.deepcopy(result), 'at': datetime.now().isoformat()}
+            ttl = self.ttls.get(scanner, self.default_ttl)
+            self.cache.set(key, entry, ttl=ttl)
+            if self.shared is not None:
+                try:
+                    self.shared.set(shared_key(key), entry, ttl)
+                except Exception as e:
+                    print(f"Failed to share a scan result: {e}")
+
+    def invalidate(self, scanner, target, options):
+        self.cache.pop(self.key(scanner, target, options))
+
+
+def reserve(shared, scanner, targets, options, owner, lease, force_refresh=False):
+    """Claim targets in a shared tier for a run that has not started yet
+
+    For the web app in queue mode, which queues a grouped run for a
+    worker: scans of these targets that other workers start meanwhile
+    wait for it instead of running the scanner on their own. The run takes
+    the claims over through ScanResultCache.claim(owner=owner). Returns
+    the targets reserved.
+    """
+    reserved = []
+    for target in targets:
+        name = shared_key(cache_key(scanner, target, options))
+        if not force_refresh and shared.get(name) is not None:
+            continue
+        if shared.claim(name, owner, lease):
+            reserved.append(target)
+    return reserved
+
+
+def unreserve(shared, scanner, targets, options, owner):
+    """Drop the claims `owner` still holds on targets"""
+    for target in targets:
+        shared.release(shared_key(cache_key(scanner, target, options)), owner)
+
+
+class SQLiteSharedResults:
+    """Shared tier of ScanResultCache in SQLite, for workers on one host
+
+    One table caches successful results until they expire, another holds
+    the runs in progress with their owner and lease.
+    """
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._local = threading.local()
+        self._last_prune = 0
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS scanner_results (
+                    key TEXT PRIMARY KEY,
+                    entry TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS scanner_runs (
+                    key TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    lease_until REAL NOT NULL
+                )
+            """)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute(
+            'SELECT entry FROM scanner_results WHERE key = ? AND expires_at > ?',
+            (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, entry, ttl):
+        now = time.time()
+        conn = self._connect()
+        conn.execute('INSERT OR REPLACE INTO scanner_results (key, entry, expires_at) '
+                     'VALUES (?, ?, ?)', (key, json.dumps(entry), now + ttl))
+        if now - self._last_prune > 3600:
+            self._last_prune = now
+            conn.execute('DELETE FROM scanner_results WHERE expires_at < ?', (now,))
+            conn.execute('DELETE FROM scanner_runs WHERE lease_until < ?', (now,))
+
+    def claim(self, key, owner, lease):
+        """Start (or renew) `owner`'s run of key, unless someone else's is running"""
+        now = time.time()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT owner, lease_until FROM scanner_runs WHERE key = ?',
+                               (key,)).fetchone()
+            claimed = row is None or row[0] == owner or row[1] < now
+            if claimed:
+                conn.execute('INSERT OR REPLACE INTO scanner_runs (key, owner, lease_until) '
+                             'VALUES (?, ?, ?)', (key, owner, now + lease))
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return claimed
+
+    def release(self, key, owner):
+        self._connect().execute('DELETE FROM scanner_runs WHERE key = ? AND owner = ?',
+                                (key, owner))
+
+
+class RedisSharedResults:
+    """Shared tier of ScanResultCache in Redis, for workers on any host
+
+    Results are values expiring with their TTL; a run in progress is a
+    key holding its owner, expiring with the lease. Needs the `redis`
+    package.
+    """
+
+    CLAIM_SCRIPT = """
+        local owner = redis.call('GET', KEYS[1])
+        if owner and owner ~= ARGV[1] then
+            return 0
+        end
+        redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+        return 1
+    """
+
+    RELEASE_SCRIPT = """
+        if redis.call('GET', KEYS[1]) == ARGV[1] then
+            return redis.call('DEL', KEYS[1])
+        end
+        return 0
+    """
+
+    def __init__(self, url, prefix='webscan'):
+        import redis
+
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self._claim_script = self.redis.register_script(self.CLAIM_SCRIPT)
+        self._release_script = self.redis.register_script(self.RELEASE_SCRIPT)
+
+    def get(self, key):
+        data = self.redis.get(f'{self.prefix}:scanner_result:{key}')
+        return json.loads(data) if data else None
+
+    def set(self, key, entry, ttl):
+        self.redis.set(f'{self.prefix}:scanner_result:{key}', json.dumps(entry),
+                       ex=max(1, int(ttl)))
+
+    def claim(self, key, owner, lease):
+        """Start (or renew) `owner`'s run of key, unless someone else's is running"""
+        return bool(self._claim_script(keys=[f'{self.prefix}:scanner_run:{key}'],
+                                       args=[owner, max(1, int(lease * 1000))]))
+
+    def release(self, key, owner):
+        self._release_script(keys=[f'{self.prefix}:scanner_run:{key}'], args=[owner])
+
+
+def create_shared_results(settings):
+    """Shared tier for scans run by worker.py processes, or None in local mode"""
+    if settings.SCAN_EXECUTION != 'queue':
+        return None
+    if settings.RESULT_STORE_BACKEND == 'redis':
+        return RedisSharedResults(settings.RESULT_REDIS_URL)
+    return SQLiteSharedResults(settings.RESULT_DB_PATH)
@@ -0,0 +1,421 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+
+# Event types after which a scan publishes nothing more
+FINAL_EVENTS = ('completed', 'failed', 'cancelled')
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class ScanChannel:
+    """Numbered events of one scan, with a condition to wait on
+
+    Threads wait on the condition; asyncio tasks (asgi_app.py) wait on a
+    future each, resolved on their event loop when something is published.
+    """
+
+    def __init__(self, max_events):
+        self.events = deque(maxlen=max_events)
+        self.last_id = 0
+        self.closed = False
+        self.cond = threading.Condition()
+        self._async_waiters = []
+
+    def publish(self, event, data):
+        with self.cond:
+            self.last_id += 1
+            self.events.append({'id': self.last_id, 'event': event, 'data': data})
+            if event in FINAL_EVENTS:
+                self.closed = True
+            self.cond.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+    def since(self, last_id):
+        # Called with the condition held
+        return [item for item in self.events if item['id'] > last_id]
+
+    def wait(self, last_id, timeout):
+        """Events newer than `last_id`, waiting up to `timeout` for one"""
+        with self.cond:
+            events = self.since(last_id)
+            if not events and not self.closed:
+                self.cond.wait(timeout)
+                events = self.since(last_id)
+            return events
+
+    async def wait_async(self, last_id, timeout):
+        """wait() for asyncio callers, without holding a thread"""
+        # Imported here so the sync app does not load asyncio
+        import asyncio
+        loop = asyncio.get_running_loop()
+        with self.cond:
+            events = self.since(last_id)
+            if events or self.closed:
+                return events
+            future = loop.create_future()
+            self._async_waiters.append((loop, future))
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self.cond:
+                if (loop, future) in self._async_waiters:
+                    self._async_waiters.remove((loop, future))
+        with self.cond:
+            return self.since(last_id)
+
+
+class ScanEventBus:
+    """In-process publish/subscribe of scan status transitions and deltas"""
+
+    def __init__(self, max_events=200, max_channels=1000):
+        self.max_events = max_events
+        self.max_channels = max_channels
+        self._channels = OrderedDict()
+        self._lock = threading.Lock()
+
+    def channel(self, scan_id, create=False):
+        with self._lock:
+            channel = self._channels.get(scan_id)
+            if channel is None and create:
+                channel = ScanChannel(self.max_events)
+                self._channels[scan_id] = channel
+                self._trim()
+            return channel
+
+    def publish(self, scan_id, event, data):
+        self.channel(scan_id, create=True).publish(event, data)
+
+    def _trim(self):
+        # Forget the oldest finished scans once there are too many channels
+        excess = len(self._channels) - self.max_channels
+        for scan_id in list(self._channels):
+            if excess <= 0:
+                break
+            if self._channels[scan_id].closed:
+                del self._channels[scan_id]
+                excess -= 1
+
+
+class StoredChannel:
+    """Events of one scan read from a stored event bus; same interface as ScanChannel"""
+
+    def __init__(self, bus, scan_id):
+        self.bus = bus
+        self.scan_id = scan_id
+
+    @property
+    def last_id(self):
+        return self.bus.last_id(self.scan_id)
+
+    @property
+    def events(self):
+        return self.since(0)
+
+    @property
+    def closed(self):
+        return self.bus.closed(self.scan_id)
+
+    def since(self, last_id):
+        return self.bus.since(self.scan_id, last_id)
+
+    def wait(self, last_id, timeout):
+        """Events newer than `last_id`, polling up to `timeout` for one"""
+        deadline = time.monotonic() + timeout
+        while True:
+            events = self.since(last_id)
+            if events or self.closed or time.monotonic() >= deadline:
+                return events
+            time.sleep(min(self.bus.poll_interval, max(0, deadline - time.monotonic())))
+
+    async def wait_async(self, last_id, timeout):
+        """wait() for asyncio callers; the queries run in the default executor
+
+        Waiting is left to the bus's shared poller, so a thousand held
+        connections cost one query per poll interval, not a thousand.
+        """
+        import asyncio
+        loop = asyncio.get_running_loop()
+        events, closed = await loop.run_in_executor(
+            None, lambda: (self.since(last_id), self.closed))
+        if events or closed:
+            return events
+        poller = self.bus.poller(loop)
+        future = poller.wait(self.scan_id, last_id)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            poller.discard(self.scan_id, future)
+        return await loop.run_in_executor(None, self.since, last_id)
+
+
+class EventPoller:
+    """Polls a stored event bus on behalf of every asyncio waiter of one event loop
+
+    Each `poll_interval` one query reads the newest event of all scans
+    that have waiters, and wakes those whose scan moved past the event
+    they have or finished. The polling task stops when nobody is waiting.
+    """
+
+    def __init__(self, bus, loop):
+        self.bus = bus
+        self.loop = loop
+        # scan_id -> [(last_id, future)]
+        self.waiters = {}
+        self.task = None
+
+    def wait(self, scan_id, last_id):
+        """A future resolved once the scan has events newer than `last_id`"""
+        future = self.loop.create_future()
+        self.waiters.setdefault(scan_id, []).append((last_id, future))
+        if self.task is None or self.task.done():
+            self.task = self.loop.create_task(self._run())
+        return future
+
+    def discard(self, scan_id, future):
+        waiters = [item for item in self.waiters.get(scan_id, ()) if item[1] is not future]
+        if waiters:
+            self.waiters[scan_id] = waiters
+        else:
+            self.waiters.pop(scan_id, None)
+
+    async def _run(self):
+        import asyncio
+        while self.waiters:
+            await asyncio.sleep(self.bus.poll_interval)
+            try:
+                heads = await self.loop.run_in_executor(None, self.bus.heads, list(self.waiters))
+            except Exception as e:
+                print(f"Failed to poll scan events: {e}")
+                continue
+            for scan_id, (head, closed) in heads.items():
+                for last_id, future in self.waiters.get(scan_id, ()):
+                    if head > last_id or closed:
+                        _wake(future)
+
+
+class PolledEventBus:
+    """Base of the event buses whose subscribers poll shared storage
+
+    Subclasses store the events and answer last_id(), closed(), since()
+    and heads() for StoredChannel and EventPoller.
+    """
+
+    def __init__(self, max_events, poll_interval, retention):
+        self.max_events = max_events
+        self.poll_interval = poll_interval
+        self.retention = retention
+        # Event loop -> its EventPoller
+        self._pollers = weakref.WeakKeyDictionary()
+        self._pollers_lock = threading.Lock()
+
+    def poller(self, loop):
+        with self._pollers_lock:
+            poller = self._pollers.get(loop)
+            if poller is None:
+                poller = self._pollers[loop] = EventPoller(self, loop)
+            return poller
+
+
+class SQLiteEventBus(PolledEventBus):
+    """Scan events kept in SQLite, so scans run by worker.py reach the web app
+
+    Publishing is an insert into the shared database; subscribers poll it
+    every `poll_interval` seconds instead of waiting on a condition.
+    """
+
+    def __init__(self, path, max_events=200, poll_interval=0.25, retention=24 * 3600):
+        super().__init__(max_events, poll_interval, retention)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._local = threading.local()
+        self._last_prune = 0
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS scan_events (
+                    scan_id TEXT NOT NULL,
+                    id INTEGER NOT NULL,
+                    event TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (scan_id, id)
+                )
+            """)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def channel(self, scan_id, create=False):
+        if not create:
+            row = self._connect().execute(
+                'SELECT 1 FROM scan_events WHERE scan_id = ? LIMIT 1', (scan_id,)
+            ).fetchone()
+            if row is None:
+                return None
+        return StoredChannel(self, scan_id)
+
+    def last_id(self, scan_id):
+        row = self._connect().execute(
+            'SELECT MAX(id) FROM scan_events WHERE scan_id = ?', (scan_id,)
+        ).fetchone()
+        return row[0] or 0
+
+    def closed(self, scan_id):
+        placeholders = ', '.join('?' for _ in FINAL_EVENTS)
+        row = self._connect().execute(
+            f'SELECT 1 FROM scan_events WHERE scan_id = ? AND event IN ({placeholders}) LIMIT 1',
+            (scan_id,) + FINAL_EVENTS
+        ).fetchone()
+        return row is not None
+
+    def since(self, scan_id, last_id):
+        rows = self._connect().execute(
+            'SELECT id, event, data FROM scan_events WHERE scan_id = ? AND id > ? ORDER BY id',
+            (scan_id, last_id)
+        ).fetchall()
+        return [{'id': id, 'event': event, 'data': json.loads(data)} for id, event, data in rows]
+
+    def heads(self, scan_ids):
+        """{scan_id: (newest event id, finished)} of the scans that have events"""
+        heads = {}
+        final = ', '.join('?' for _ in FINAL_EVENTS)
+        conn = self._connect()
+        # Stay well under SQLite's limit on query parameters
+        for start in range(0, len(scan_ids), 500):
+            chunk = scan_ids[start:start + 500]
+            rows = conn.execute(
+                f'SELECT scan_id, MAX(id), MAX(event IN ({final})) FROM scan_events '
+                f"WHERE scan_id IN ({', '.join('?' for _ in chunk)}) GROUP BY scan_id",
+                FINAL_EVENTS + tuple(chunk)
+            ).fetchall()
+            heads.update((scan_id, (head, bool(closed))) for scan_id, head, closed in rows)
+        return heads
+
+    def publish(self, scan_id, event, data):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO scan_events (scan_id, id, event, data, created_at) '
+                'SELECT ?, COALESCE(MAX(id), 0) + 1, ?, ?, ? FROM scan_events WHERE scan_id = ?',
+                (scan_id, event, json.dumps(data, default=str), now, scan_id)
+            )
+            # Keep the newest max_events of the scan, like ScanChannel's deque
+            conn.execute(
+                'DELETE FROM scan_events WHERE scan_id = ? AND id <= '
+                '(SELECT MAX(id) FROM scan_events WHERE scan_id = ?) - ?',
+                (scan_id, scan_id, self.max_events)
+            )
+            if now - self._last_prune > 3600:
+                self._last_prune = now
+                conn.execute('DELETE FROM scan_events WHERE created_at < ?',
+                             (now - self.retention,))
+
+
+class RedisEventBus(PolledEventBus):
+    """Scan events kept in Redis, for workers on other hosts than the web app
+
+    Each scan has a counter numbering its events, a list of the newest
+    `max_events` of them and, once it has finished, a closed flag; all
+    three expire `retention` seconds after the last event. Subscribers
+    poll like those of SQLiteEventBus. Needs the `redis` package.
+    """
+
+    # Numbers, appends and trims in one step, so concurrent publishers
+    # cannot store events out of order
+    PUBLISH_SCRIPT = """
+        local id = redis.call('INCR', KEYS[1])
+        redis.call('RPUSH', KEYS[2], '[' .. id .. ',' .. ARGV[1] .. ',' .. ARGV[2] .. ']')
+        redis.call('LTRIM', KEYS[2], -tonumber(ARGV[3]), -1)
+        if ARGV[4] == '1' then
+            redis.call('SET', KEYS[3], '1')
+        end
+        for _, key in ipairs(KEYS) do
+            redis.call('EXPIRE', key, ARGV[5])
+        end
+        return id
+    """
+
+    def __init__(self, url, max_events=200, poll_interval=0.25, retention=24 * 3600,
+                 prefix='webscan'):
+        import redis
+
+        super().__init__(max_events, poll_interval, retention)
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self._publish_script = self.redis.register_script(self.PUBLISH_SCRIPT)
+
+    def _keys(self, scan_id):
+        key = f'{self.prefix}:events:{scan_id}'
+        return [f'{key}:last_id', key, f'{key}:closed']
+
+    def channel(self, scan_id, create=False):
+        if not create and not self.redis.exists(self._keys(scan_id)[0]):
+            return None
+        return StoredChannel(self, scan_id)
+
+    def last_id(self, scan_id):
+        return int(self.redis.get(self._keys(scan_id)[0]) or 0)
+
+    def closed(self, scan_id):
+        return bool(self.redis.exists(self._keys(scan_id)[2]))
+
+    def since(self, scan_id, last_id):
+        events = []
+        for item in self.redis.lrange(self._keys(scan_id)[1], 0, -1):
+            id, event, data = json.loads(item)
+            if id > last_id:
+                events.append({'id': id, 'event': event, 'data': data})
+        return events
+
+    def heads(self, scan_ids):
+        """{scan_id: (newest event id, finished)} of the scans that have events"""
+        pipe = self.redis.pipeline(transaction=False)
+        for scan_id in scan_ids:
+            last_id_key, _, closed_key = self._keys(scan_id)
+            pipe.get(last_id_key)
+            pipe.exists(closed_key)
+        replies = pipe.execute()
+        return {
+            scan_id: (int(head), bool(closed))
+            for scan_id, head, closed in zip(scan_ids, replies[::2], replies[1::2])
+            if head is not None
+        }
+
+    def publish(self, scan_id, event, data):
+        self._publish_script(keys=self._keys(scan_id), args=[
+            json.dumps(event), json.dumps(data, default=str), self.max_events,
+            int(event in FINAL_EVENTS), self.retention])
+
+
+def create_event_bus(settings):
+    """Event bus for the configured execution mode
+
+    Scans run in the web process ('local') publish in memory; with worker
+    processes ('queue') events go through the shared result store: its
+    SQLite database, or Redis.
+    """
+    if settings.SCAN_EXECUTION == 'queue':
+        if settings.RESULT_STORE_BACKEND == 'redis':
+            return RedisEventBus(settings.RESULT_REDIS_URL, retention=settings.RESULT_RETENTION)
+        return SQLiteEventBus(settings.RESULT_DB_PATH, retention=settings.RESULT_RETENTION)
+    return ScanEventBus()
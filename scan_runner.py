@@ -0,0 +1,379 @@
+import secrets
+import threading
+import time
+from datetime import datetime
+
+from Scanner_manager import ScannerManager, ALL_SCANNERS, SCANNER_OPTIONS
+from google_sheet_logger import GoogleSheetsLogger
+from report_generator import analyze_vulnerabilities, determine_vuln_stage
+from report_service import ReportService
+from result_store import create_result_store, TERMINAL_STATUSES
+from scan_cache import create_shared_results, reserve, unreserve
+from scan_events import create_event_bus
+from lazy import LazyObject
+from metrics import StageClock, SCANS_FINISHED, SCAN_SECONDS
+from baseline import (create_baseline_store, fingerprint_scan, probe_signature,
+                      diff_fingerprints, merge_fingerprints, QUICK_PROBES)
+import config
+
+# Scan execution shared by the web app (local mode) and worker.py (queue
+# mode): the components a scan needs, and run_scan itself.
+
+# Scanner results and runs shared by worker.py processes (queue mode only)
+shared_results = create_shared_results(config)
+
+# Initialize components on first use, so importing the app stays fast
+# (tool version probes, Google OAuth and the sheet lookup happen later)
+scanner_manager = LazyObject(lambda: ScannerManager(shared_results), name='ScannerManager')
+sheets_logger = LazyObject(GoogleSheetsLogger)
+
+# First argument of queued jobs that run a grouped nmap instead of a scan
+NMAP_GROUP_JOB = 'nmap_group'
+
+# Scan records, persisted once a scan finishes
+scan_results = create_result_store(config)
+
+# PDF reports, rendered in worker processes on first download
+report_service = ReportService(
+    directory=config.REPORTS_DIR,
+    workers=config.REPORT_WORKERS,
+    max_age=config.REPORT_CACHE_MAX_AGE
+)
+
+# Status transitions and progress deltas pushed to /scan_events clients;
+# kept in the shared database when scans run in separate worker processes
+scan_events_bus = create_event_bus(config)
+
+# Fingerprints of each target's last scan, diffed against rescans
+baseline_store = create_baseline_store(config)
+
+# Cancel events of running scans: scan_id -> threading.Event
+scan_cancel_events = {}
+scan_cancel_lock = threading.Lock()
+
+def scan_cancel_event(scan_id):
+    with scan_cancel_lock:
+        return scan_cancel_events.setdefault(scan_id, threading.Event())
+
+def start_prewarm():
+    """Install missing scanners up front so no scan ever waits on a package install"""
+    if config.SCANNER_AUTO_INSTALL:
+        threading.Thread(
+            target=lambda: scanner_manager.prewarm_scanners(), name='scanner-prewarm', daemon=True
+        ).start()
+
+def mark_cancelled(record):
+    """Store a scan as cancelled and tell its event stream"""
+    with scan_results.editing():
+        record['status'] = 'cancelled'
+        record['cancelled_at'] = datetime.now().isoformat()
+    scan_results.save(record)
+    SCANS_FINISHED.inc(status='cancelled')
+    scan_events_bus.publish(record['scan_id'], 'cancelled', {'status': 'cancelled'})
+
+def new_scan_record(scan_id, scan_type, target, gmail, batch_id=None,
+                    priority='interactive'):
+    """Create the initial record for a queued scan"""
+    record = {
+        'scan_id': scan_id,
+        'timestamp': datetime.now().isoformat(),
+        'target': target,
+        'scan_type': scan_type,
+        'gmail': gmail,
+        'priority': priority,
+        'status': 'queued',
+        'results': {},
+        'vulnerabilities': []
+    }
+    if batch_id:
+        record['batch_id'] = batch_id
+    return record
+
+def run_job(job_id, *args):
+    """Run a job taken off the queue by worker.py: a scan or a grouped nmap"""
+    if args and args[0] == NMAP_GROUP_JOB:
+        run_nmap_group_job(job_id, *args[1:])
+    else:
+        run_scan(job_id, *args)
+
+def nmap_group_jobs(targets, user, force_refresh=False):
+    """Queue-mode jobs scanning a batch's hosts with grouped nmap runs
+
+    Each group of hosts is reserved for its job in the shared results
+    first, so the batch's scans that workers start before the job wait
+    for its results instead of each running nmap. Returns the jobs as
+    (job_id, user, args), to be submitted ahead of the scans.
+    """
+    jobs = []
+    size = max(1, config.NMAP_GROUP_SIZE)
+    for start in range(0, len(targets), size):
+        job_id = f'nmap-group-{secrets.token_hex(8)}'
+        group = reserve(shared_results, 'nmap', targets[start:start + size],
+                        SCANNER_OPTIONS['nmap'], job_id, config.SCAN_DEADLINE,
+                        force_refresh)
+        if len(group) < 2:
+            # Nothing to gain over the scans' own nmap runs
+            unreserve(shared_results, 'nmap', group, SCANNER_OPTIONS['nmap'], job_id)
+            continue
+        # Queued as a user of their own: the per-user limit would hold groups
+        # back while the user's scans that wait on them hold workers
+        jobs.append((job_id, f'{user}:{job_id}', (NMAP_GROUP_JOB, group, force_refresh)))
+    return jobs
+
+def cancel_nmap_group_jobs(jobs):
+    """Drop the reservations of group jobs that were not queued after all"""
+    for job_id, _, (_, group, _) in jobs:
+        unreserve(shared_results, 'nmap', group, SCANNER_OPTIONS['nmap'], job_id)
+
+def run_nmap_group_job(job_id, targets, force_refresh=False):
+    """Scan a reserved group of hosts with one nmap run, in this worker thread"""
+    try:
+        if scanner_manager.check_scanner_installed('nmap'):
+            scanner_manager.run_nmap_group(targets, force_refresh=force_refresh, owner=job_id,
+                                           background=False)
+    finally:
+        # Hosts cached or taken over meanwhile were not claimed by the run
+        unreserve(shared_results, 'nmap', targets, SCANNER_OPTIONS['nmap'], job_id)
+
+def run_scan(scan_id, scan_type, target, gmail, force_refresh=False, quick_delta=False,
+             deadline=None):
+    """Run the actual scan, reusing cached scanner results unless forced
+
+    The scan's scanners share `deadline` seconds, and stop early once the
+    scan is cancelled through /scan_cancel.
+
+    Status requests read the record while scanner threads fill it in, so
+    every change to it is made inside scan_results.editing(). Timings are
+    collected in their own dict and copied into the record.
+    """
+    cancel = scan_cancel_event(scan_id)
+    deadline_at = time.monotonic() + (deadline or config.SCAN_DEADLINE)
+    # Seconds per stage and per scanner, kept in the record
+    started = time.perf_counter()
+    timings = {}
+    clock = StageClock(timings)
+    # Initialize results, outside the try so a failure can always be recorded
+    try:
+        results = scan_results.get(scan_id)
+    except Exception as e:
+        print(f"Failed to load scan record {scan_id}: {e}")
+        results = None
+    if results is None:
+        results = new_scan_record(scan_id, scan_type, target, gmail)
+    try:
+        if cancel.is_set():
+            mark_cancelled(results)
+            return
+        with scan_results.editing():
+            results['status'] = 'running'
+            results['timings'] = dict(timings)
+            # Per-scanner progress, updated while the tools are still running
+            results['progress'] = {}
+        
+        scan_results.save(results)
+        scan_events_bus.publish(scan_id, 'status', {'status': 'running'})
+        
+        # Scans run by worker.py reach /scan_status only through the store,
+        # so their progress and finished scanners are saved as they change
+        last_saved = time.monotonic()
+        save_lock = threading.Lock()
+        def save_progress(force=False):
+            nonlocal last_saved
+            if scan_results.keep_active:
+                return
+            # Saves one at a time, so an older snapshot never lands last
+            with save_lock:
+                now = time.monotonic()
+                if not force and now - last_saved < config.RESULT_PROGRESS_INTERVAL:
+                    return
+                last_saved = now
+                try:
+                    scan_results.save(results)
+                except Exception as e:
+                    print(f"Failed to save progress of scan {scan_id}: {e}")
+        
+        def publish_progress(scanner, update):
+            with scan_results.editing():
+                results['progress'][scanner] = update
+                results['timings'] = dict(timings)
+            save_progress()
+            scan_events_bus.publish(scan_id, 'progress', dict(update, scanner=scanner))
+        
+        # Check required scanners; installing them is the pre-warm phase's job
+        with clock.stage('ensure_scanners'):
+            missing = scanner_manager.ensure_scanners(scan_type)
+        with scan_results.editing():
+            for scanner in missing:
+                results['results'][scanner] = {
+                    'error': f'{scanner} is not installed on the scan server',
+                    'success': False
+                }
+        
+        # Scanners of the requested scan type
+        if scan_type == 'all' or scan_type == 1:
+            scanners = list(ALL_SCANNERS)
+        else:
+            scanner_map = {
+                2: 'nmap',
+                3: 'nikto',
+                4: 'curl',
+                5: 'whatweb'
+            }
+            scanner_name = scanner_map.get(scan_type)
+            scanners = [scanner_name] if scanner_name else []
+        scanners = [s for s in scanners if s not in missing]
+        
+        # The target's previous scan, if any
+        with clock.stage('baseline_load'):
+            baseline = baseline_store.get(target, scan_type)
+        if quick_delta and baseline:
+            with clock.stage('quick_delta'):
+                run_quick_delta(results, scanners, target, baseline, publish_progress,
+                                cancel, deadline_at, timings)
+            save_progress(force=True)
+        
+        def record_result(scanner, result):
+            with scan_results.editing():
+                results['results'][scanner] = result
+                results['timings'] = dict(timings)
+            save_progress(force=True)
+        
+        # Run the scan based on type
+        remaining = [s for s in scanners if s not in results['results']]
+        if remaining:
+            with clock.stage('scanners'):
+                scanner_manager.run_scanners(
+                    remaining, target, progress=publish_progress,
+                    force_refresh=force_refresh, cancel=cancel, deadline=deadline_at,
+                    timings=timings, on_result=record_result)
+        
+        # Scanners were stopped; keep what finished, skip analysis and logging
+        if cancel.is_set():
+            timings['total'] = round(time.perf_counter() - started, 4)
+            with scan_results.editing():
+                results['timings'] = dict(timings)
+            mark_cancelled(results)
+            return
+        if time.monotonic() >= deadline_at:
+            with scan_results.editing():
+                results['deadline_exceeded'] = True
+        
+        with clock.stage('analyze_vulnerabilities'):
+            # Analyze vulnerabilities
+            vulnerabilities = analyze_vulnerabilities(results['results'])
+            
+            # Determine overall vulnerability stage
+            vuln_stage = determine_vuln_stage(vulnerabilities)
+        with scan_results.editing():
+            results['vulnerabilities'] = vulnerabilities
+            results['vuln_stage'] = vuln_stage
+        
+        # New, resolved and changed findings since the previous scan
+        with clock.stage('baseline_update'):
+            update_baseline(results, baseline)
+        
+        # Log to Google Sheets
+        with clock.stage('sheets_log'):
+            sheets_logger.log_scan({
+                'timestamp': results['timestamp'],
+                'gmail': gmail,
+                'scan_type': scan_type,
+                'target': target,
+                'vuln_stage': results['vuln_stage']
+            })
+        
+        timings['total'] = round(time.perf_counter() - started, 4)
+        with scan_results.editing():
+            results['status'] = 'completed'
+            results['timings'] = dict(timings)
+        scan_results.save(results)
+        SCANS_FINISHED.inc(status='completed')
+        SCAN_SECONDS.observe(timings['total'])
+        
+        # Reports are rendered lazily unless configured to be ready up front
+        if config.REPORT_PREGENERATE:
+            report_service.prefetch(scan_results.get(scan_id))
+        scan_events_bus.publish(scan_id, 'completed', {
+            'status': 'completed',
+            'vuln_stage': results['vuln_stage'],
+            'vulnerabilities': results['vulnerabilities'],
+            'delta': results.get('delta')
+        })
+        
+    except Exception as e:
+        timings['total'] = round(time.perf_counter() - started, 4)
+        with scan_results.editing():
+            results['status'] = 'failed'
+            results['error'] = str(e)
+            # The step that raised, e.g. 'scanners' or 'sheets_log'
+            results['failed_stage'] = clock.failed
+            results['timings'] = dict(timings)
+        scan_results.save(results)
+        SCANS_FINISHED.inc(status='failed')
+        scan_events_bus.publish(scan_id, 'failed', {
+            'status': 'failed',
+            'error': results['error']
+        })
+    finally:
+        with scan_cancel_lock:
+            scan_cancel_events.pop(scan_id, None)
+
+def run_quick_delta(results, scanners, target, baseline, progress, cancel=None,
+                    deadline=None, timings=None):
+    """Run the cheap probes first, and skip the slow scanners if nothing changed
+
+    When the probes' fingerprints match the baseline, the slow scanners'
+    results are taken from the baseline scan instead of being rerun.
+    """
+    probes = [s for s in QUICK_PROBES if s in scanners]
+    slow = [s for s in scanners if s not in probes]
+    if not probes or not slow or not baseline.get('probes'):
+        return
+    
+    probe_results = scanner_manager.run_scanners(
+        probes, target, progress=progress, force_refresh=True,
+        cancel=cancel, deadline=deadline, timings=timings)
+    with scan_results.editing():
+        results['results'].update(probe_results)
+    
+    unchanged = probe_signature(fingerprint_scan(probe_results, [])) == baseline['probes']
+    previous = scan_results.get(baseline['scan_id']) if unchanged else None
+    reused = []
+    with scan_results.editing():
+        for scanner in slow:
+            result = (previous or {}).get('results', {}).get(scanner)
+            if result and result.get('success'):
+                results['results'][scanner] = dict(result, reused_from=baseline['scan_id'])
+                reused.append(scanner)
+        results['quick_delta'] = {
+            'unchanged': unchanged,
+            'baseline_scan_id': baseline['scan_id'],
+            'skipped': reused
+        }
+
+def update_baseline(results, baseline):
+    """Diff the scan against the target's baseline, then make it the new baseline"""
+    fingerprints = fingerprint_scan(results['results'], results['vulnerabilities'])
+    if baseline:
+        delta = diff_fingerprints(baseline, fingerprints)
+        with scan_results.editing():
+            results['delta'] = delta
+    merged = merge_fingerprints(baseline, fingerprints)
+    baseline_store.save(results['target'], results['scan_type'], {
+        'scan_id': results['scan_id'],
+        'timestamp': results['timestamp'],
+        'fingerprints': merged,
+        'probes': probe_signature(merged)
+    })
+
+def fail_scan(scan_id, error):
+    """Mark a scan failed without running it, e.g. after its worker was lost"""
+    record = scan_results.get(scan_id)
+    if record is None or record.get('status') in TERMINAL_STATUSES:
+        return
+    with scan_results.editing():
+        record['status'] = 'failed'
+        record['error'] = error
+    scan_results.save(record)
+    SCANS_FINISHED.inc(status='failed')
+    scan_events_bus.publish(scan_id, 'failed', {'status': 'failed', 'error': error})
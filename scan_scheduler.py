@@ -0,0 +1,176 @@
+import threading
+from collections import OrderedDict, deque
+
+
+# Priority classes, highest first: scans a user is watching, then batches
+PRIORITIES = ('interactive', 'bulk')
+
+
+class QueueFullError(Exception):
+    """Raised when the scan queue cannot accept another job"""
+
+
+class ScanJob:
+    def __init__(self, scan_id, user, args, priority='interactive'):
+        self.scan_id = scan_id
+        self.user = user
+        self.args = args
+        self.priority = priority
+
+
+class ScanScheduler:
+    """Fixed pool of scan workers fed from a bounded job queue
+
+    Each user's jobs run in submission order, and users take turns, so a
+    large batch from one user does not hold back everyone else. A user who
+    already has `per_user_limit` scans running is skipped until one of them
+    finishes.
+
+    Interactive jobs are always handed out before bulk ones, and bulk jobs
+    never occupy more than `bulk_workers` workers, so a scan someone is
+    waiting on does not queue behind a large batch.
+    """
+
+    def __init__(self, handler, workers=4, max_queue=100, per_user_limit=2,
+                 bulk_workers=None):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.per_user_limit = max(1, per_user_limit)
+        if bulk_workers is None:
+            # Keep one worker free for interactive scans
+            bulk_workers = self.workers - 1
+        self.bulk_workers = max(1, min(bulk_workers, self.workers))
+
+        # priority -> user -> deque of jobs; the first user gets the next turn
+        self._pending = {priority: OrderedDict() for priority in PRIORITIES}
+        self._queued = 0
+        self._running = {}
+        self._running_bulk = 0
+        self._cond = threading.Condition()
+        self._threads = []
+        self._stopped = False
+
+    def start(self):
+        """Start the worker threads"""
+        with self._cond:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(
+                    target=self._worker, name=f'scan-worker-{i}'
+                )
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    def shutdown(self):
+        """Stop the workers once the jobs they are running finish"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def submit(self, scan_id, user, *args, priority='interactive'):
+        """Queue a scan, raising QueueFullError when the queue is at capacity"""
+        self.submit_many([(scan_id, user, args)], priority=priority)
+
+    def submit_many(self, jobs, priority='interactive'):
+        """Queue several (scan_id, user, args) jobs; all of them or none"""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        with self._cond:
+            if self._queued + len(jobs) > self.max_queue:
+                raise QueueFullError('Scan queue is full, please retry later')
+            pending = self._pending[priority]
+            for scan_id, user, args in jobs:
+                pending.setdefault(user, deque()).append(
+                    ScanJob(scan_id, user, args, priority))
+            self._queued += len(jobs)
+            self._cond.notify_all()
+        self.start()
+
+    def cancel(self, scan_id):
+        """Remove a scan that has not started yet; True if it was queued"""
+        with self._cond:
+            for pending in self._pending.values():
+                for user, jobs in pending.items():
+                    for job in jobs:
+                        if job.scan_id == scan_id:
+                            jobs.remove(job)
+                            if not jobs:
+                                del pending[user]
+                            self._queued -= 1
+                            return True
+        return False
+
+    def position(self, scan_id):
+        """1-based position of a queued scan, or None if it is not queued"""
+        with self._cond:
+            index = 0
+            for priority in PRIORITIES:
+                # Jobs in the order the users' turns will hand them out
+                queues = list(self._pending[priority].values())
+                for turn in range(max((len(jobs) for jobs in queues), default=0)):
+                    for jobs in queues:
+                        if turn < len(jobs):
+                            index += 1
+                            if jobs[turn].scan_id == scan_id:
+                                return index
+        return None
+
+    def stats(self):
+        """Snapshot of queue depth and running jobs"""
+        with self._cond:
+            return {
+                'queued': self._queued,
+                'queued_by_priority': {
+                    priority: sum(len(jobs) for jobs in self._pending[priority].values())
+                    for priority in PRIORITIES
+                },
+                'running': sum(self._running.values()),
+                'running_bulk': self._running_bulk,
+                'workers': self.workers,
+            }
+
+    def _next_job(self):
+        # Called with the condition held
+        for priority in PRIORITIES:
+            if priority == 'bulk' and self._running_bulk >= self.bulk_workers:
+                continue
+            pending = self._pending[priority]
+            for user, jobs in pending.items():
+                if self._running.get(user, 0) < self.per_user_limit:
+                    job = jobs.popleft()
+                    # This user's turn is used up; move them to the back
+                    del pending[user]
+                    if jobs:
+                        pending[user] = jobs
+                    self._queued -= 1
+                    self._running[user] = self._running.get(user, 0) + 1
+                    if priority == 'bulk':
+                        self._running_bulk += 1
+                    return job
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    if self._stopped:
+                        return
+                    self._cond.wait()
+                    job = self._next_job()
+
+            try:
+                self.handler(job.scan_id, *job.args)
+            except Exception as e:
+                print(f"Scan {job.scan_id} failed in worker: {e}")
+            finally:
+                with self._cond:
+                    self._running[job.user] -= 1
+                    if not self._running[job.user]:
+                        del self._running[job.user]
+                    if job.priority == 'bulk':
+                        self._running_bulk -= 1
+                    self._cond.notify_all()
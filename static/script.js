@@ -2,7 +2,7 @@
     // State management
     let currentScanId = null;
     let selectedScanner = null;
-    let statusCheckInterval = null;
+    let statusStream = null;
     
     // Elements
     const emailSection = document.querySelector('.email-section');
@@ -16,9 +16,12 @@
     const gmailInput = document.getElementById('gmail');
     const emailStatus = document.getElementById('emailStatus');
     const targetInput = document.getElementById('target');
+    const forceRefreshInput = document.getElementById('forceRefresh');
+    const quickDeltaInput = document.getElementById('quickDelta');
     const startScanBtn = document.getElementById('startScan');
     const downloadBtn = document.getElementById('downloadReport');
     const newScanBtn = document.getElementById('newScan');
+    const cancelScanBtn = document.getElementById('cancelScan');
     
     // Email verification
     verifyBtn.addEventListener('click', verifyEmail);
@@ -112,7 +115,8 @@
                 statusItem.className = `status-item ${data.installed ? 'installed' : 'missing'}`;
                 statusItem.innerHTML = `
                     <h4>${scanner.name}</h4>
-                    <p>${data.installed ? '✓ Installed' : '⚠ Will install temporarily'}</p>
+                    <p>${data.installed ? '✓ Installed' : '⚠ Not installed yet'}</p>
+                    ${data.version ? `<p class="small">${escapeHtml(data.version)}</p>` : ''}
                 `;
                 statusGrid.appendChild(statusItem);
             } catch (error) {
@@ -151,7 +155,9 @@
                 },
                 body: JSON.stringify({
                     scan_type: parseInt(selectedScanner),
-                    target: target
+                    target: target,
+                    force_refresh: forceRefreshInput.checked,
+                    quick_delta: quickDeltaInput.checked
                 })
             });
             
@@ -159,8 +165,10 @@
             
             if (data.scan_id) {
                 currentScanId = data.scan_id;
+                cancelScanBtn.style.display = 'inline-block';
+                cancelScanBtn.disabled = false;
                 updateProgress(20, 'Scan started...');
-                startStatusPolling();
+                startStatusUpdates();
             } else {
                 throw new Error(data.error || 'Failed to start scan');
             }
@@ -172,39 +180,100 @@
         }
     }
     
-    // Poll for scan status
-    function startStatusPolling() {
-        let progress = 20;
+    // Follow scan status through pushed events (SSE, long-poll fallback)
+    function startStatusUpdates() {
+        const scannerProgress = {};
         
-        statusCheckInterval = setInterval(async () => {
-            try {
+        function finish() {
+            if (statusStream) {
+                statusStream.close();
+                statusStream = null;
+            }
+            startScanBtn.disabled = false;
+            startScanBtn.textContent = 'Start Security Scan';
+            cancelScanBtn.style.display = 'none';
+        }
+        
+        async function handleEvent(type, data) {
+            if (type === 'snapshot' && data.progress) {
+                Object.assign(scannerProgress, data.progress);
+            }
+            
+            if (type === 'progress') {
+                scannerProgress[data.scanner] = data;
+            }
+            
+            if (type === 'completed' || data.status === 'completed') {
+                finish();
+                updateProgress(100, 'Scan completed!');
+                // Raw outputs are only fetched once, when the scan is done
                 const response = await fetch(`/scan_status/${currentScanId}`);
-                const data = await response.json();
-                
-                if (data.status === 'completed') {
-                    clearInterval(statusCheckInterval);
-                    updateProgress(100, 'Scan completed!');
-                    displayResults(data);
-                    startScanBtn.disabled = false;
-                    startScanBtn.textContent = 'Start Security Scan';
-                } else if (data.status === 'failed') {
-                    clearInterval(statusCheckInterval);
-                    updateProgress(0, 'Scan failed: ' + data.error);
-                    startScanBtn.disabled = false;
-                    startScanBtn.textContent = 'Start Security Scan';
-                } else {
-                    // Update progress based on scanner
-                    if (data.results) {
-                        const scannerCount = Object.keys(data.results).length;
-                        progress = 20 + (scannerCount * 20);
-                        if (progress > 90) progress = 90;
+                displayResults(await response.json());
+                return true;
+            } else if (type === 'failed' || data.status === 'failed') {
+                finish();
+                updateProgress(0, 'Scan failed: ' + data.error);
+                return true;
+            } else if (type === 'cancelled' || data.status === 'cancelled') {
+                finish();
+                updateProgress(0, 'Scan cancelled');
+                return true;
+            } else if (data.status === 'queued') {
+                updateProgress(20, data.queue_position
+                    ? `Queued (position ${data.queue_position})...`
+                    : 'Queued...');
+            } else {
+                // Update progress based on finished scanners
+                const done = Object.values(scannerProgress)
+                    .filter(info => info.state !== 'running').length;
+                const progress = Math.min(90, 20 + (done * 20));
+                updateProgress(progress, describeProgress(scannerProgress));
+            }
+            return false;
+        }
+        
+        if (window.EventSource) {
+            const source = new EventSource(`/scan_events/${currentScanId}`);
+            statusStream = source;
+            ['snapshot', 'status', 'progress', 'completed', 'failed', 'cancelled'].forEach(type => {
+                source.addEventListener(type, event => {
+                    handleEvent(type, JSON.parse(event.data));
+                });
+            });
+            return;
+        }
+        
+        // Long-poll fallback for browsers without EventSource
+        statusStream = { closed: false, close() { this.closed = true; } };
+        const poller = statusStream;
+        (async function longPoll(since) {
+            while (!poller.closed) {
+                try {
+                    const query = since === null ? '' : `&since=${since}`;
+                    const response = await fetch(
+                        `/scan_events/${currentScanId}?mode=poll${query}`);
+                    const data = await response.json();
+                    for (const event of data.events) {
+                        if (await handleEvent(event.event, event.data)) return;
                     }
-                    updateProgress(progress, 'Scanning in progress...');
+                    since = data.last_id;
+                } catch (error) {
+                    console.error('Status check error:', error);
+                    await new Promise(resolve => setTimeout(resolve, 2000));
                 }
-            } catch (error) {
-                console.error('Status check error:', error);
             }
-        }, 2000);
+        })(null);
+    }
+    
+    function describeProgress(scannerProgress) {
+        if (!scannerProgress || Object.keys(scannerProgress).length === 0) {
+            return 'Scanning in progress...';
+        }
+        const parts = Object.entries(scannerProgress).map(([scanner, info]) => {
+            const findings = info.finding_count ? `, ${info.finding_count} findings` : '';
+            return `${scanner}: ${info.state}${findings}`;
+        });
+        return 'Scanning in progress... ' + parts.join(' | ');
     }
     
     function updateProgress(percent, message) {
@@ -214,51 +283,34 @@
     
     function displayResults(data) {
         resultsSection.style.display = 'block';
-        
-        const resultsContainer = document.getElementById('results');
-        let html = '';
-        
-        // Vulnerability summary
-        if (data.vulnerabilities && data.vulnerabilities.length > 0) {
-            html += '<h3>Vulnerabilities Found</h3>';
-            data.vulnerabilities.forEach((vuln, index) => {
-                html += `
-                    <div class="result-item">
-                        <h4>${index + 1}. ${vuln.title}</h4>
-                        <p class="severity-${vuln.severity.toLowerCase()}">Severity: ${vuln.severity}</p>
-                        <p>${vuln.description}</p>
-                        <p><strong>Impact:</strong> ${vuln.impact}</p>
-                        <p><strong>Recommendation:</strong> ${vuln.recommendation}</p>
-                    </div>
-                `;
-            });
-        } else {
-            html += '<p class="severity-low">No critical vulnerabilities found</p>';
-        }
-        
-        // Scanner outputs (collapsible)
-        html += '<h3>Scanner Outputs</h3>';
-        for (const [scanner, result] of Object.entries(data.results)) {
-            if (result.success) {
-                html += `
-                    <div class="result-item">
-                        <h4>${scanner.toUpperCase()} Results</h4>
-                        <pre style="background: #f0f0f0; padding: 10px; border-radius: 5px; overflow-x: auto;">${escapeHtml(result.output || result.headers || 'No output')}</pre>
-                    </div>
-                `;
-            }
-        }
-        
-        resultsContainer.innerHTML = html;
+        document.getElementById('results').innerHTML = renderResults(data);
         
         // Setup download button
         downloadBtn.onclick = () => downloadReport(data.scan_id);
     }
     
     function downloadReport(scanId) {
-        window.location.href = `/download_report/${scanId}`;
+        const format = document.getElementById('reportFormat').value;
+        window.location.href = `/download_report/${scanId}?format=${format}`;
     }
     
+    // Stop the running scan; its final 'cancelled' event resets the UI
+    cancelScanBtn.addEventListener('click', async () => {
+        if (!currentScanId) return;
+        cancelScanBtn.disabled = true;
+        try {
+            const response = await fetch(`/scan_cancel/${currentScanId}`, { method: 'POST' });
+            const data = await response.json();
+            if (data.error) {
+                throw new Error(data.error);
+            }
+            updateProgress(0, 'Cancelling scan...');
+        } catch (error) {
+            alert('Failed to cancel scan: ' + error.message);
+            cancelScanBtn.disabled = false;
+        }
+    });
+    
     newScanBtn.addEventListener('click', () => {
         // Reset UI
         selectedScanner = null;
@@ -277,15 +329,6 @@
         element.className = 'status-message ' + type;
     }
     
-    function escapeHtml(unsafe) {
-        return unsafe
-            .replace(/&/g, "&amp;")
-            .replace(/</g, "&lt;")
-            .replace(/>/g, "&gt;")
-            .replace(/"/g, "&quot;")
-            .replace(/'/g, "&#039;");
-    }
-    
     // Click on example targets
     document.querySelectorAll('.example').forEach(example => {
         example.addEventListener('click', function() {
@@ -293,3 +336,73 @@
         });
     });
 });
+
+// Results of a finished scan as HTML. Findings quote what the target sent
+// back (banners, paths, headers, script output), so every scanner-derived
+// value is escaped.
+function renderResults(data) {
+    let html = '';
+    
+    // Changes since the previous scan of this target
+    if (data.delta) {
+        const delta = data.delta;
+        html += '<h3>Changes Since Last Scan</h3>';
+        if (delta.unchanged) {
+            html += '<p>No changes detected.</p>';
+        } else {
+            html += `<p>${delta.new.length} new, ${delta.resolved.length} resolved, ${delta.changed.length} changed</p>`;
+            for (const [title, items] of [['New', delta.new], ['Resolved', delta.resolved], ['Changed', delta.changed]]) {
+                items.forEach(item => {
+                    html += `<div class="result-item"><strong>${title}:</strong> [${escapeHtml(item.scanner)}] ${escapeHtml(item.label)}</div>`;
+                });
+            }
+        }
+    }
+    
+    // Vulnerability summary
+    if (data.vulnerabilities && data.vulnerabilities.length > 0) {
+        html += '<h3>Vulnerabilities Found</h3>';
+        data.vulnerabilities.forEach((vuln, index) => {
+            const severity = escapeHtml(vuln.severity || 'Low');
+            html += `
+                <div class="result-item">
+                    <h4>${index + 1}. ${escapeHtml(vuln.title)}</h4>
+                    <p class="severity-${severity.toLowerCase()}">Severity: ${severity}</p>
+                    <p>${escapeHtml(vuln.description)}</p>
+                    <p><strong>Impact:</strong> ${escapeHtml(vuln.impact)}</p>
+                    <p><strong>Recommendation:</strong> ${escapeHtml(vuln.recommendation)}</p>
+                </div>
+            `;
+        });
+    } else {
+        html += '<p class="severity-low">No critical vulnerabilities found</p>';
+    }
+    
+    // Scanner outputs (collapsible)
+    html += '<h3>Scanner Outputs</h3>';
+    for (const [scanner, result] of Object.entries(data.results || {})) {
+        if (result.success) {
+            html += `
+                <div class="result-item">
+                    <h4>${escapeHtml(scanner.toUpperCase())} Results</h4>
+                    <pre style="background: #f0f0f0; padding: 10px; border-radius: 5px; overflow-x: auto;">${escapeHtml(result.output || result.headers || 'No output')}</pre>
+                </div>
+            `;
+        }
+    }
+    return html;
+}
+
+function escapeHtml(unsafe) {
+    return String(unsafe ?? '')
+        .replace(/&/g, "&amp;")
+        .replace(/</g, "&lt;")
+        .replace(/>/g, "&gt;")
+        .replace(/"/g, "&quot;")
+        .replace(/'/g, "&#039;");
+}
+
+// Loaded by the tests under Node
+if (typeof module !== 'undefined') {
+    module.exports = { renderResults, escapeHtml };
+}
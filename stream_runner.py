@@ -0,0 +1,149 @@
+import os
+import selectors
+import subprocess
+import time
+from collections import deque
+
+from process_supervisor import (KILL_GRACE, PeakRSS, describe_usage, kill_group, kill_tree,
+                                start_process, try_reap, wait_for_exit)
+
+
+class ProcessCancelled(Exception):
+    """Raised when a running tool is stopped through its cancel event"""
+
+
+class OutputBuffer:
+    """Ring buffer keeping the most recent lines of a tool's output
+
+    Once `max_bytes` is exceeded the oldest lines are dropped, so a
+    multi-megabyte scan only keeps its tail in memory.
+    """
+
+    def __init__(self, max_bytes=256 * 1024):
+        self.max_bytes = max_bytes
+        self.lines = deque()
+        self.size = 0
+        self.total_lines = 0
+        self.dropped_lines = 0
+
+    def append(self, line):
+        self.lines.append(line)
+        self.size += len(line)
+        self.total_lines += 1
+        while self.size > self.max_bytes and len(self.lines) > 1:
+            self.size -= len(self.lines.popleft())
+            self.dropped_lines += 1
+
+    @property
+    def truncated(self):
+        return self.dropped_lines > 0
+
+    def text(self):
+        body = ''.join(self.lines)
+        if self.truncated:
+            return f"... ({self.dropped_lines} earlier lines truncated)\n" + body
+        return body
+
+
+class StreamResult:
+    def __init__(self, returncode, stdout, stderr, usage=None):
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        # Peak RSS, CPU and wall time of the tool
+        self.usage = usage or {}
+
+
+def run_streaming(cmd, timeout, on_line=None, max_bytes=256 * 1024, limits=None,
+                  cancel=None):
+    """Run a command, handing each stdout line to `on_line` as it arrives
+
+    The command runs in its own process group under `limits` (a
+    ResourceLimits). Raises subprocess.TimeoutExpired when it runs longer
+    than `timeout` seconds, and ProcessCancelled once the `cancel` event is
+    set; either way the whole process tree is killed first.
+
+    The run ends when the tool itself exits: background children it left
+    holding the pipes are killed, and their remaining output drained.
+    """
+    started = time.monotonic()
+    process = start_process(cmd, limits)
+    sampler = PeakRSS(process.pid)
+    sampler.sample()
+    exited = None
+    drain_until = None
+    stdout = OutputBuffer(max_bytes)
+    stderr = OutputBuffer(max_bytes // 4)
+    pending = {process.stdout: b'', process.stderr: b''}
+    sinks = {process.stdout: stdout, process.stderr: stderr}
+    deadline = time.monotonic() + timeout
+
+    def emit(pipe, raw):
+        line = raw.decode('utf-8', errors='replace')
+        sinks[pipe].append(line)
+        if pipe is process.stdout and on_line:
+            on_line(line)
+
+    selector = selectors.DefaultSelector()
+    try:
+        for pipe in pending:
+            selector.register(pipe, selectors.EVENT_READ)
+
+        while selector.get_map():
+            if exited is None:
+                if cancel is not None and cancel.is_set():
+                    raise ProcessCancelled(f'{cmd[0]} was cancelled')
+                if time.monotonic() >= deadline:
+                    raise subprocess.TimeoutExpired(cmd, timeout)
+            elif time.monotonic() >= drain_until:
+                # Something outside the group still holds the pipes
+                break
+            remaining = (deadline if exited is None else drain_until) - time.monotonic()
+
+            # Wake up often enough to notice a cancel or the tool's exit
+            # promptly, and to sample its memory
+            for key, _ in selector.select(timeout=max(0, min(remaining, 0.25))):
+                pipe = key.fileobj
+                chunk = os.read(pipe.fileno(), 65536)
+                if not chunk:
+                    selector.unregister(pipe)
+                    if pending[pipe]:
+                        emit(pipe, pending[pipe])
+                        pending[pipe] = b''
+                    continue
+
+                data = pending[pipe] + chunk
+                *complete, pending[pipe] = data.split(b'\n')
+                for raw in complete:
+                    emit(pipe, raw + b'\n')
+                if len(pending[pipe]) > max_bytes:
+                    # Never let a single unterminated line grow unbounded
+                    emit(pipe, pending[pipe])
+                    pending[pipe] = b''
+
+            if exited is None:
+                sampler.sample()
+                exited = try_reap(process)
+                if exited is not None:
+                    # The tool is done; its background children go with it
+                    kill_group(process)
+                    drain_until = time.monotonic() + KILL_GRACE
+
+        for pipe, rest in pending.items():
+            if rest:
+                emit(pipe, rest)
+        if exited is None:
+            exited = wait_for_exit(process, max(0.1, deadline - time.monotonic()), sampler)
+            kill_group(process)
+        returncode, rusage = exited
+    except BaseException:
+        if process.returncode is None:
+            kill_tree(process)
+            process.wait()
+        raise
+    finally:
+        selector.close()
+        process.stdout.close()
+        process.stderr.close()
+
+    return StreamResult(returncode, stdout, stderr, describe_usage(rusage, sampler, started))
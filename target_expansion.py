@@ -0,0 +1,65 @@
+import ipaddress
+import re
+
+from scan_cache import normalize_target
+
+# Separators between targets in a pasted list or an uploaded hostname file
+TARGET_SEPARATOR = re.compile(r'[\s,;]+')
+
+# An IPv4 or IPv6 address followed by a prefix length
+CIDR_PATTERN = re.compile(r'^[0-9a-fA-F:.]+/\d+$')
+
+
+class TargetError(ValueError):
+    """Raised for target lists that cannot be expanded"""
+
+
+def split_targets(text):
+    """Targets in free-form text, one or more per line, '#' starts a comment"""
+    targets = []
+    for line in text.splitlines():
+        line = line.split('#', 1)[0]
+        targets.extend(part for part in TARGET_SEPARATOR.split(line) if part)
+    return targets
+
+
+def _expand_cidr(entry, limit):
+    try:
+        network = ipaddress.ip_network(entry, strict=False)
+    except ValueError:
+        raise TargetError(f"Invalid CIDR range: {entry}")
+    if network.num_addresses > limit + 2:
+        raise TargetError(f"CIDR range {entry} has more than {limit} hosts")
+    # hosts() leaves out the network and broadcast addresses of larger ranges
+    return [str(host) for host in network.hosts()] or [str(network.network_address)]
+
+
+def expand_targets(entries, max_targets=256):
+    """Expand target entries into a de-duplicated list of single targets
+
+    `entries` is a string or a list of strings, each holding one or more
+    hostnames, IPs, URLs or CIDR ranges. Returns the targets in first-seen
+    order and the number of duplicates dropped.
+    """
+    if isinstance(entries, str):
+        entries = [entries]
+
+    targets = []
+    seen = set()
+    duplicates = 0
+    for entry in entries:
+        for target in split_targets(str(entry)):
+            if CIDR_PATTERN.match(target):
+                expanded = _expand_cidr(target, max_targets)
+            else:
+                expanded = [target]
+            for host in expanded:
+                key = normalize_target(host)
+                if key in seen:
+                    duplicates += 1
+                    continue
+                seen.add(key)
+                targets.append(host)
+                if len(targets) > max_targets:
+                    raise TargetError(f"A batch can hold at most {max_targets} targets")
+    return targets, duplicates
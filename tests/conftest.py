@@ -0,0 +1,27 @@
+import atexit
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# Importing app or scan_runner opens the databases and directories named by
+# the config, so point them at a scratch directory before any test does
+DATA_DIR = tempfile.mkdtemp(prefix='webscan-tests-')
+atexit.register(shutil.rmtree, DATA_DIR, True)
+for name, path in (('WEBSCAN_RESULT_DB', 'scans.db'), ('WEBSCAN_RESULT_BLOB_DIR', 'outputs'),
+                   ('WEBSCAN_JOB_QUEUE', 'jobs.db'), ('WEBSCAN_REPORTS_DIR', 'reports'),
+                   ('WEBSCAN_LOG_FILE', 'logs/scan_logs.csv'),
+                   ('WEBSCAN_SHEETS_SPOOL', 'sheets_spool.jsonl')):
+    os.environ[name] = os.path.join(DATA_DIR, path)
+os.environ['WEBSCAN_SCANNER_AUTO_INSTALL'] = '0'
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """Every redis.Redis.from_url() client talks to one fakeredis server"""
+    fakeredis = pytest.importorskip('fakeredis')
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr('redis.Redis.from_url', lambda url, **kwargs: fakeredis.FakeRedis(
+        server=server, **kwargs))
+    return server
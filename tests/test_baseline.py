@@ -0,0 +1,40 @@
+"""Fingerprints of rescans ignore output that changes on every run"""
+from baseline import scanner_fingerprints, fingerprint_scan, probe_signature, RedisBaselineStore
+
+WHATWEB_OUTPUT = '''WhatWeb report for http://example.com
+Status    : 200 OK
+Title     : Example
+
+HTTP Headers:
+	HTTP/1.1 200 OK
+	Date: {date}
+	Server: Apache/2.4.49 (Unix)
+	Set-Cookie: sid={sid}; path=/
+	Content-Type: text/html
+'''
+
+
+def whatweb_result(date, sid):
+    return {'success': True, 'output': WHATWEB_OUTPUT.format(date=date, sid=sid)}
+
+
+def test_whatweb_fingerprint_ignores_date_and_cookies():
+    first = whatweb_result('Fri, 16 Oct 2026 10:00:00 GMT', 'abc123')
+    second = whatweb_result('Sat, 17 Oct 2026 11:30:00 GMT', 'def456')
+    assert scanner_fingerprints('whatweb', first) == scanner_fingerprints('whatweb', second)
+    assert (probe_signature(fingerprint_scan({'whatweb': first}, []))
+            == probe_signature(fingerprint_scan({'whatweb': second}, [])))
+
+
+def test_whatweb_fingerprint_tracks_other_headers():
+    first = whatweb_result('Fri, 16 Oct 2026 10:00:00 GMT', 'abc123')
+    upgraded = dict(first, output=first['output'].replace('2.4.49', '2.4.58'))
+    assert scanner_fingerprints('whatweb', first) != scanner_fingerprints('whatweb', upgraded)
+
+
+def test_redis_baselines_are_keyed_on_the_normalized_target(fake_redis):
+    store = RedisBaselineStore('redis://redis/0')
+    assert store.get('example.com', 'all') is None
+    store.save('Example.com/', 'all', {'scan_id': 'scan-1'})
+    assert store.get('example.com', 'all') == {'scan_id': 'scan-1'}
+    assert store.get('example.com', 2) is None
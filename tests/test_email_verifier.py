@@ -0,0 +1,114 @@
+"""EmailVerifier caching, with stub MX resolvers and a fake clock"""
+import asyncio
+
+from email_verifier import EmailVerifier, MX_FAILURE_TTL
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class StubResolver:
+    """Answers (hosts, ttl), or raises while `error` is set; counts lookups"""
+
+    def __init__(self, hosts=('alt1.gmail-smtp-in.l.google.com.',), ttl=300):
+        self.hosts = list(hosts)
+        self.ttl = ttl
+        self.error = None
+        self.lookups = 0
+
+    def __call__(self, domain):
+        self.lookups += 1
+        if self.error:
+            raise self.error
+        return list(self.hosts), self.ttl
+
+    async def resolve_async(self, domain):
+        await asyncio.sleep(0.01)
+        return self(domain)
+
+
+def make_verifier(resolver, cache_ttl=3600):
+    verifier = EmailVerifier(resolver=resolver, async_resolver=resolver.resolve_async,
+                             cache_ttl=cache_ttl)
+    clock = Clock()
+    verifier.mx_cache.clock = verifier.verdicts.clock = clock
+    return verifier, clock
+
+
+def test_mx_answer_is_cached_for_its_ttl():
+    resolver = StubResolver(ttl=300)
+    verifier, clock = make_verifier(resolver)
+    assert verifier.verify('first.user@gmail.com')
+    assert verifier.verify('second.user@gmail.com')
+    assert resolver.lookups == 1
+
+    clock.now += 299
+    assert verifier.verify('third.user@gmail.com')
+    assert resolver.lookups == 1
+    clock.now += 2
+    assert verifier.verify('fourth.user@gmail.com')
+    assert resolver.lookups == 2
+
+
+def test_failed_lookup_is_retried_after_the_failure_ttl():
+    resolver = StubResolver()
+    resolver.error = OSError('SERVFAIL')
+    verifier, clock = make_verifier(resolver)
+    # A failed lookup falls through to the format checks
+    assert verifier.verify('first.user@gmail.com')
+    assert verifier.mx_records('gmail.com') is None
+    assert resolver.lookups == 1
+
+    resolver.error = None
+    clock.now += MX_FAILURE_TTL - 1
+    assert verifier.mx_records('gmail.com') is None
+    clock.now += 2
+    assert verifier.mx_records('gmail.com') == resolver.hosts
+    assert resolver.lookups == 2
+
+
+def test_verdicts_are_cached_until_they_expire():
+    resolver = StubResolver()
+    verifier, clock = make_verifier(resolver, cache_ttl=600)
+    assert verifier.verify('cached.user@gmail.com')
+
+    # gmail.com stops answering with MX hosts: the cached verdict holds
+    resolver.hosts = []
+    clock.now += 500
+    assert verifier.verify('Cached.User@gmail.com')
+    clock.now += 200
+    assert not verifier.verify('cached.user@gmail.com')
+    assert not verifier.verify('short@gmail.com')
+    assert not verifier.verify('someone@example.com')
+
+
+def test_async_callers_share_one_lookup():
+    resolver = StubResolver(ttl=300)
+    verifier, clock = make_verifier(resolver)
+
+    async def verify_all():
+        return await asyncio.gather(*(verifier.verify_async(f'async.user{i}@gmail.com')
+                                      for i in range(10)))
+
+    assert asyncio.run(verify_all()) == [True] * 10
+    assert resolver.lookups == 1
+    # The answer cached by the async path serves the sync one
+    assert verifier.verify('sync.user@gmail.com')
+    assert resolver.lookups == 1
+
+
+def test_async_failed_lookup_is_negatively_cached():
+    resolver = StubResolver()
+    resolver.error = OSError('timeout')
+    verifier, clock = make_verifier(resolver)
+    assert asyncio.run(verifier.mx_records_async('gmail.com')) is None
+    assert asyncio.run(verifier.mx_records_async('gmail.com')) is None
+    assert resolver.lookups == 1
+    clock.now += MX_FAILURE_TTL + 1
+    resolver.error = None
+    assert asyncio.run(verifier.mx_records_async('gmail.com')) == resolver.hosts
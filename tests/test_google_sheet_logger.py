@@ -0,0 +1,172 @@
+"""SheetsLogShipper against a local stub worksheet"""
+import os
+import threading
+import time
+
+from google_sheet_logger import SheetsLogShipper
+
+
+class StubSheet:
+    """Records append_rows calls; raises while `failures` is above zero"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.batches = []
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def append_rows(self, rows, value_input_option=None):
+        with self.lock:
+            self.calls += 1
+            if self.failures:
+                self.failures -= 1
+                raise RuntimeError('429 rate limited')
+            self.batches.append(list(rows))
+
+    @property
+    def rows(self):
+        with self.lock:
+            return [row for batch in self.batches for row in batch]
+
+
+def make_shipper(sheet, spool_path, **kwargs):
+    options = dict(batch_size=10, flush_interval=0.05, backoff_base=0.01,
+                   backoff_max=0.05, shutdown_retries=1)
+    options.update(kwargs)
+    return SheetsLogShipper(sheet, str(spool_path), **options)
+
+
+def test_processes_keep_separate_spools(tmp_path):
+    spool = tmp_path / 'sheets_spool.jsonl'
+    idle = make_shipper(StubSheet(failures=10 ** 6), spool, process_id=101)
+    busy_sheet = StubSheet()
+    busy = make_shipper(busy_sheet, spool, process_id=202)
+    try:
+        idle.enqueue(['idle-row'])
+        busy.enqueue(['busy-row'])
+        assert busy.flush(timeout=5)
+        assert busy_sheet.rows == [['busy-row']]
+        # Shipping and truncating one spool leaves the other's rows alone
+        assert idle.spool_path != busy.spool_path
+        assert os.path.getsize(busy.spool_path) == 0
+        assert b'idle-row' in open(idle.spool_path, 'rb').read()
+    finally:
+        busy.close()
+        idle.close(timeout=5)
+
+
+def test_spool_of_exited_process_is_taken_over(tmp_path):
+    spool = tmp_path / 'sheets_spool.jsonl'
+    exited = make_shipper(StubSheet(failures=10 ** 6), spool, process_id=101)
+    exited.enqueue(['left-behind-1'])
+    exited.enqueue(['left-behind-2'])
+    exited.close(timeout=5)
+    assert os.path.exists(exited.spool_path)
+
+    sheet = StubSheet()
+    successor = make_shipper(sheet, spool, process_id=202)
+    try:
+        assert successor.flush(timeout=5)
+        assert sheet.rows == [['left-behind-1'], ['left-behind-2']]
+        assert not os.path.exists(exited.spool_path)
+    finally:
+        successor.close()
+
+
+def test_spool_of_running_process_is_left_alone(tmp_path):
+    spool = tmp_path / 'sheets_spool.jsonl'
+    running = make_shipper(StubSheet(failures=10 ** 6), spool, process_id=101)
+    running.enqueue(['still-running'])
+    sheet = StubSheet()
+    other = make_shipper(sheet, spool, process_id=202)
+    try:
+        assert other.flush(timeout=5)
+        assert sheet.rows == []
+        assert os.path.exists(running.spool_path)
+    finally:
+        other.close()
+        running.close(timeout=5)
+
+
+def test_rows_are_shipped_in_batches(tmp_path):
+    sheet = StubSheet()
+    shipper = make_shipper(sheet, tmp_path / 'spool.jsonl', batch_size=3, flush_interval=60)
+    try:
+        for i in range(7):
+            shipper.enqueue([f'row-{i}'])
+        assert shipper.flush(timeout=5)
+        assert [len(batch) for batch in sheet.batches] == [3, 3, 1]
+        assert sheet.rows == [[f'row-{i}'] for i in range(7)]
+    finally:
+        shipper.close()
+
+
+def test_partial_batch_is_shipped_after_flush_interval(tmp_path):
+    sheet = StubSheet()
+    shipper = make_shipper(sheet, tmp_path / 'spool.jsonl', batch_size=50, flush_interval=0.1)
+    try:
+        shipper.enqueue(['only-row'])
+        for _ in range(50):
+            if sheet.rows:
+                break
+            time.sleep(0.05)
+        assert sheet.rows == [['only-row']]
+    finally:
+        shipper.close()
+
+
+def test_failed_batch_is_retried_with_backoff(tmp_path):
+    sheet = StubSheet(failures=2)
+    shipper = make_shipper(sheet, tmp_path / 'spool.jsonl')
+    try:
+        shipper.enqueue(['row-1'])
+        shipper.enqueue(['row-2'])
+        assert shipper.flush(timeout=5)
+        assert sheet.calls == 3
+        assert sheet.batches == [[['row-1'], ['row-2']]]
+    finally:
+        shipper.close()
+
+
+def test_spool_is_truncated_once_everything_is_shipped(tmp_path):
+    sheet = StubSheet()
+    shipper = make_shipper(sheet, tmp_path / 'spool.jsonl')
+    try:
+        shipper.enqueue(['row-1'])
+        assert os.path.getsize(shipper.spool_path) > 0
+        assert shipper.flush(timeout=5)
+        assert os.path.getsize(shipper.spool_path) == 0
+        assert open(shipper.offset_path).read() == '0'
+    finally:
+        shipper.close()
+
+
+class RejectingSheet(StubSheet):
+    """Ships rows until one starting with 'unshipped' comes along"""
+
+    def append_rows(self, rows, value_input_option=None):
+        if any(row[0].startswith('unshipped') for row in rows):
+            with self.lock:
+                self.calls += 1
+            raise RuntimeError('503 backend error')
+        super().append_rows(rows, value_input_option)
+
+
+def test_unshipped_rows_are_replayed_from_the_offset(tmp_path):
+    spool = tmp_path / 'spool.jsonl'
+    first = make_shipper(RejectingSheet(), spool, process_id=101, batch_size=1)
+    for row in ('shipped', 'unshipped-1', 'unshipped-2'):
+        first.enqueue([row])
+    first.close(timeout=5)
+    assert first.sheet.rows == [['shipped']]
+    # The shipped row is still in the spool, behind the recorded offset
+    assert int(open(first.offset_path).read()) > 0
+
+    sheet = StubSheet()
+    # Same process id, as after a restart: the spool is resumed, not adopted
+    restarted = make_shipper(sheet, spool, process_id=101)
+    try:
+        assert restarted.flush(timeout=5)
+        assert sheet.rows == [['unshipped-1'], ['unshipped-2']]
+    finally:
+        restarted.close()
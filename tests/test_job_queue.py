@@ -0,0 +1,76 @@
+"""RedisJobQueue claims, checked against fakeredis (skipped without it)"""
+import pytest
+
+from job_queue import RedisJobQueue
+from scan_scheduler import QueueFullError
+
+
+@pytest.fixture
+def queue(fake_redis):
+    return RedisJobQueue('redis://localhost/0', max_queue=10)
+
+
+def test_claim_moves_job_to_running_set(queue):
+    queue.submit('scan-1', 'user@gmail.com', 'all', 'example.com', priority='bulk')
+    queue.submit('scan-2', 'user@gmail.com', 2, 'example.org')
+
+    job = queue.claim('worker-1')
+    assert (job.scan_id, job.args, job.priority, job.attempts) == (
+        'scan-2', (2, 'example.org'), 'interactive', 1)
+    assert queue.redis.zscore(queue._running, 'scan-2') is not None
+    assert queue.redis.hget(queue._job('scan-2'), 'worker') == 'worker-1'
+    assert queue.stats()['queued'] == 1
+
+
+def test_expired_lease_is_requeued_and_claimed_again(queue):
+    queue.submit('scan-1', 'user@gmail.com', 'all', 'example.com')
+    assert queue.claim('worker-1', lease=-1).attempts == 1
+
+    job = queue.claim('worker-2')
+    assert (job.scan_id, job.attempts) == ('scan-1', 2)
+    assert queue.claim('worker-3') is None
+
+
+def test_claims_respect_the_per_user_limit(queue):
+    queue.per_user_limit = 2
+    for i in range(3):
+        queue.submit(f'busy-{i}', 'busy@gmail.com', 'all', f'host{i}.example.com')
+    queue.submit('other-1', 'other@gmail.com', 'all', 'example.org')
+
+    claimed = [queue.claim('worker-1').scan_id for _ in range(3)]
+    # The other user goes before the busy user's second scan
+    assert claimed == ['busy-0', 'other-1', 'busy-1']
+    # busy@ is at its limit, so its third scan waits
+    assert queue.claim('worker-1') is None
+
+    queue.complete('busy-0', 'worker-1')
+    assert queue.claim('worker-1').scan_id == 'busy-2'
+
+
+def test_expired_lease_frees_the_users_slot(queue):
+    queue.per_user_limit = 1
+    queue.submit('scan-1', 'user@gmail.com', 'all', 'example.com')
+    queue.submit('scan-2', 'user@gmail.com', 'all', 'example.org')
+    queue.claim('worker-1', lease=-1)
+
+    # scan-1 is requeued ahead of scan-2, and the user's slot is free again
+    job = queue.claim('worker-2')
+    assert (job.scan_id, job.attempts) == ('scan-1', 2)
+    # The lost worker finishing late leaves the new claim alone
+    queue.complete('scan-1', 'worker-1')
+    assert queue.redis.hget(queue._running_users, 'user@gmail.com') == '1'
+    assert queue.claim('worker-3') is None
+
+
+def test_submit_many_is_all_or_nothing_at_capacity(queue):
+    queue.submit_many([(f'scan-{i}', 'user@gmail.com', ('all', 'example.com'))
+                       for i in range(8)], priority='bulk')
+    with pytest.raises(QueueFullError):
+        queue.submit_many([(f'more-{i}', 'user@gmail.com', ('all', 'example.com'))
+                           for i in range(3)])
+    assert queue.stats()['queued'] == 8
+    assert not queue.redis.exists(queue._job('more-0'))
+
+    queue.submit_many([(f'more-{i}', 'user@gmail.com', ('all', 'example.com'))
+                       for i in range(2)])
+    assert queue.stats()['queued_by_priority'] == {'interactive': 2, 'bulk': 8}
@@ -0,0 +1,105 @@
+"""Per-process scan logs and reading them back together"""
+import os
+
+from log_sink import RotatingLogSink, per_process_path, process_paths, read_process_logs, rotated_files
+
+FIELDS = ['timestamp', 'gmail', 'target']
+
+
+def make_sink(path, pid, **kwargs):
+    return RotatingLogSink(path, FIELDS, stamp_field='logged_at', per_process=True,
+                           process_id=pid, **kwargs)
+
+
+def write(sink, timestamp, target, gmail='a@gmail.com'):
+    sink.write({'timestamp': timestamp, 'gmail': gmail, 'target': target})
+    sink.flush()
+
+
+def test_history_merges_the_logs_of_all_processes(tmp_path):
+    path = str(tmp_path / 'scan_logs.csv')
+    sinks = [make_sink(path, pid) for pid in (101, 202)]
+    try:
+        write(sinks[0], '2026-10-16T10:00:00', 'one')
+        write(sinks[1], '2026-10-16T10:05:00', 'two', gmail='b@gmail.com')
+        write(sinks[0], '2026-10-16T10:10:00', 'three')
+
+        assert process_paths(path) == [per_process_path(path, 101), per_process_path(path, 202)]
+        assert [r['target'] for r in read_process_logs(path, order_field='logged_at')] == \
+            ['one', 'two', 'three']
+        assert [r['target'] for r in read_process_logs(path, order_field='logged_at',
+                                                       gmail='a@gmail.com')] == ['one', 'three']
+    finally:
+        for sink in sinks:
+            sink.close()
+
+
+def test_logs_are_merged_in_write_order_not_scan_start_order(tmp_path):
+    # Rows are logged when a scan ends, so a long scan started earlier comes later
+    path = str(tmp_path / 'scan_logs.csv')
+    sinks = [make_sink(path, pid) for pid in (101, 202)]
+    try:
+        write(sinks[0], '2026-10-16T10:10:00', 'short-scan')
+        write(sinks[1], '2026-10-16T10:05:00', 'medium-scan')
+        write(sinks[0], '2026-10-16T10:00:00', 'long-scan')
+
+        rows = list(read_process_logs(path, order_field='logged_at'))
+        assert [r['target'] for r in rows] == ['short-scan', 'medium-scan', 'long-scan']
+        assert [r['logged_at'] for r in rows] == sorted(r['logged_at'] for r in rows)
+    finally:
+        for sink in sinks:
+            sink.close()
+
+
+def all_rotated(path):
+    return [f for p in process_paths(path) for f in rotated_files(p)]
+
+
+def test_backups_are_counted_across_processes(tmp_path):
+    path = str(tmp_path / 'scan_logs.csv')
+    sinks = [make_sink(path, pid, max_bytes=1, backup_count=3) for pid in (101, 202)]
+    try:
+        # Every record after a process's first rotates its file
+        for i in range(6):
+            for sink in sinks:
+                write(sink, f'2026-10-16T10:0{i}:00', f'target-{i}')
+        assert len(all_rotated(path)) == 3
+    finally:
+        for sink in sinks:
+            sink.close()
+
+
+def test_current_file_of_exited_process_is_rotated_and_pruned(tmp_path):
+    path = str(tmp_path / 'scan_logs.csv')
+    exited = make_sink(path, 101)
+    write(exited, '2026-10-16T10:00:00', 'left-behind')
+    exited.close()
+
+    running = make_sink(path, 202)
+    write(running, '2026-10-16T10:05:00', 'running')
+    try:
+        successor = make_sink(path, 303, backup_count=1)
+        successor.close()
+        # The running process's file is locked and stays; the exited one is rotated
+        assert not os.path.exists(exited.path)
+        assert os.path.exists(running.path)
+        assert len(all_rotated(path)) == 1
+        assert [r['target'] for r in read_process_logs(path, order_field='logged_at')] == \
+            ['left-behind', 'running']
+    finally:
+        running.close()
+
+
+def test_file_with_other_columns_is_rotated_before_appending(tmp_path):
+    path = str(tmp_path / 'scan_logs.csv')
+    with open(per_process_path(path, 101), 'w') as f:
+        f.write('timestamp,gmail,target\n2026-10-16T09:00:00,a@gmail.com,old-row\n')
+
+    sink = make_sink(path, 101)
+    try:
+        write(sink, '2026-10-16T10:00:00', 'new-row')
+        rows = list(read_process_logs(path, order_field='logged_at'))
+        assert [r['target'] for r in rows] == ['old-row', 'new-row']
+        assert rows[1]['logged_at']
+    finally:
+        sink.close()
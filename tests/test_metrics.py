@@ -0,0 +1,82 @@
+"""Metrics are recorded cheaply and rendered in the Prometheus text format"""
+import pytest
+
+from metrics import MetricsRegistry, StageClock
+
+
+def test_counters_gauges_and_histograms_render():
+    registry = MetricsRegistry()
+    scans = registry.counter('scans_total', 'Scans', ['status'])
+    depth = registry.gauge('queue_depth', 'Queued scans', function=lambda: 3)
+    seconds = registry.histogram('scan_seconds', 'Scan time', ['scanner'], buckets=(1, 10))
+    scans.inc(status='completed')
+    scans.inc(2, status='completed')
+    seconds.observe(0.5, scanner='nmap')
+    seconds.observe(5, scanner='nmap')
+
+    text = registry.render()
+    assert '# TYPE scans_total counter' in text
+    assert 'scans_total{status="completed"} 3' in text
+    assert 'queue_depth 3' in text
+    assert 'scan_seconds_bucket{scanner="nmap",le="1"} 1' in text
+    assert 'scan_seconds_bucket{scanner="nmap",le="+Inf"} 2' in text
+    assert 'scan_seconds_sum{scanner="nmap"} 5.5' in text
+    assert depth.kind == 'gauge'
+
+    with pytest.raises(ValueError):
+        scans.inc(scanner='nmap')
+
+
+def test_disabled_registry_records_nothing():
+    registry = MetricsRegistry(enabled=False)
+    scans = registry.counter('scans_total', 'Scans', ['status'])
+    seconds = registry.histogram('scan_seconds', 'Scan time')
+    scans.inc(status='completed')
+    with seconds.time():
+        pass
+    assert scans.samples() == [] and seconds.samples() == []
+
+    registry.set_enabled(True)
+    scans.inc(status='completed')
+    assert scans.samples() == [('', ('completed',), (), 1)]
+
+
+def test_failing_gauge_does_not_break_the_scrape():
+    registry = MetricsRegistry()
+    registry.gauge('broken', 'Fails', function=lambda: 1 / 0)
+    registry.counter('scans_total', 'Scans').inc()
+    assert 'scans_total 1' in registry.render()
+
+
+def test_streamed_bodies_are_timed_until_their_last_chunk():
+    registry = MetricsRegistry()
+    seconds = registry.histogram('report_seconds', 'Report time')
+    body = seconds.observe_body(iter([b'a', b'b']), 0.0)
+    assert seconds.samples() == []
+    assert list(body) == [b'a', b'b']
+    assert seconds.samples()[-1] == ('_count', (), (), 1)
+
+
+def test_stage_clock_records_the_failed_stage():
+    timings = {}
+    clock = StageClock(timings)
+    with clock.stage('ensure_scanners'):
+        pass
+    with pytest.raises(RuntimeError):
+        with clock.stage('sheets_log'):
+            raise RuntimeError('quota')
+    assert set(timings) == {'ensure_scanners', 'sheets_log'}
+    assert clock.failed == 'sheets_log'
+
+
+def test_metrics_endpoint_is_hidden_when_disabled(monkeypatch):
+    import app
+
+    client = app.app.test_client()
+    monkeypatch.setattr(app.config, 'METRICS_ENABLED', True)
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert 'webscan_scans_finished_total' in response.get_data(as_text=True)
+
+    monkeypatch.setattr(app.config, 'METRICS_ENABLED', False)
+    assert client.get('/metrics').status_code == 404
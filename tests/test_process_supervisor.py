@@ -0,0 +1,76 @@
+"""Scanner tools run in their own process group under resource limits"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+import process_supervisor
+from process_supervisor import ResourceLimits
+from stream_runner import run_streaming
+
+posix_only = pytest.mark.skipif(os.name != 'posix', reason='process groups and rlimits are POSIX')
+
+
+def gone(pid):
+    """Whether a process has exited (a zombie left for init counts)"""
+    try:
+        with open(f'/proc/{pid}/stat', encoding='ascii') as f:
+            return f.read().rsplit(')', 1)[1].split()[0] == 'Z'
+    except FileNotFoundError:
+        return True
+
+
+def test_wrap_prefixes_prlimit_and_nice(monkeypatch):
+    monkeypatch.setattr(process_supervisor, 'PRLIMIT', '/usr/bin/prlimit')
+    monkeypatch.setattr(process_supervisor, 'NICE', '/usr/bin/nice')
+    limits = ResourceLimits(cpu_seconds=60, max_files=128, nice=5)
+    wrapped = limits.wrap(['nmap', '-sV', 'example.com'])
+    assert wrapped[0] == '/usr/bin/prlimit'
+    assert '--cpu=60:' in wrapped and '--nofile=128:' in wrapped
+    assert wrapped[wrapped.index('--') + 1:] == [
+        '/usr/bin/nice', '-n', '5', 'nmap', '-sV', 'example.com']
+    assert ResourceLimits().wrap(['nmap']) == ['nmap']
+
+    # Without the wrappers the limits are applied after the start instead
+    monkeypatch.setattr(process_supervisor, 'PRLIMIT', None)
+    assert limits.wrap(['nmap']) is None
+
+
+@posix_only
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='reads /proc')
+@pytest.mark.parametrize('wrappers', [True, False])
+def test_limits_reach_the_tool(monkeypatch, wrappers):
+    if not wrappers:
+        monkeypatch.setattr(process_supervisor, 'PRLIMIT', None)
+    elif process_supervisor.PRLIMIT is None:
+        pytest.skip('prlimit is not installed')
+    limits = ResourceLimits(max_files=64, nice=3)
+    # Sleep first so a limit applied after the start is in place when read
+    result = run_streaming(['sh', '-c', 'sleep 0.2; ulimit -n; cat /proc/self/stat'], 10,
+                           limits=limits)
+    lines = result.stdout.text().splitlines()
+    assert lines[0] == '64'
+    niceness = int(lines[1].rsplit(')', 1)[1].split()[16])
+    assert niceness >= min(19, os.getpriority(os.PRIO_PROCESS, 0) + 3)
+    assert {'wall_seconds', 'cpu_seconds'} <= set(result.usage)
+
+
+@posix_only
+@pytest.mark.skipif(not os.path.isdir('/proc'), reason='reads /proc')
+def test_timeout_kills_the_whole_process_tree():
+    pids = []
+    with pytest.raises(subprocess.TimeoutExpired):
+        run_streaming(['sh', '-c', 'sleep 30 & echo $!; wait'], 0.5,
+                      on_line=lambda line: pids.append(int(line)))
+    assert pids and gone(pids[0])
+
+
+@posix_only
+@pytest.mark.skipif(not os.path.isdir('/proc'), reason='reads /proc')
+def test_background_children_go_with_the_tool():
+    pids = []
+    result = run_streaming(['sh', '-c', 'sleep 30 & echo $!'], 10,
+                           on_line=lambda line: pids.append(int(line)))
+    assert result.returncode == 0
+    assert gone(pids[0])
@@ -0,0 +1,49 @@
+"""PDF reports render scanner output that looks like markup"""
+import pytest
+
+pytest.importorskip('reportlab')
+
+from report_generator import analyze_vulnerabilities, generate_professional_report
+
+
+def test_report_escapes_scanner_output(tmp_path):
+    results = {
+        'nikto': {'success': True, 'output': (
+            '+ /admin/<script>alert(1)</script>: Admin login page found & exposed\n'
+            '+ Server: Apache/2.4 <unclosed')},
+        'nmap': {'success': True, 'output': (
+            '80/tcp open http\n| http-title: <b>Welcome & "hello"\n'),
+            # A vulnerable script without CVEs: its output is the description
+            'findings': [{'host': '192.0.2.10', 'port': 80, 'protocol': 'tcp',
+                          'script': 'http-custom-check', 'vulnerable': True, 'cves': [],
+                          'output': 'State: VULNERABLE <img src=x onerror=alert(1)> & more'}]},
+    }
+    vulnerabilities = analyze_vulnerabilities(results)
+    assert any('<img' in vuln['description'] for vuln in vulnerabilities)
+    vulnerabilities.append({'title': 'Header <X-Test> & co', 'severity': 'Low',
+                            'description': '<para>raw</para> & more'})
+    record = {
+        'scan_id': 'scan-1', 'target': 'http://example.com/?a=1&b=<2>',
+        'timestamp': '2026-01-01T00:00:00', 'scan_type': 'all', 'gmail': 'a@gmail.com',
+        'results': results, 'vulnerabilities': vulnerabilities, 'vuln_stage': 'Low',
+    }
+
+    path = generate_professional_report(record, str(tmp_path / 'report.pdf'))
+    with open(path, 'rb') as f:
+        assert f.read(5) == b'%PDF-'
+
+
+def test_severity_charts_are_cached_and_copied():
+    from report_generator import _severity_chart, severity_chart
+
+    _severity_chart.cache_clear()
+    first, second = severity_chart((1, 2, 0, 5)), severity_chart((1, 2, 0, 5))
+    assert _severity_chart.cache_info().hits == 1
+    # Each report lays out its own copy of the cached drawing
+    assert first is not second
+    bars = [item for item in first.contents if hasattr(item, 'data')]
+    assert bars[0].data == [[1, 2, 0, 5]]
+    assert bars[0].valueAxis.valueMax == 5
+    # An empty scan still gets a drawable axis
+    empty = [item for item in severity_chart((0, 0, 0, 0)).contents if hasattr(item, 'data')]
+    assert empty[0].valueAxis.valueMax == 1
@@ -0,0 +1,41 @@
+"""SARIF rules describe a finding's kind, not one of its occurrences"""
+import json
+
+from report_generator import analyze_vulnerabilities
+from report_model import build_report_model
+from report_renderers import SARIFRenderer
+
+
+def sarif_rules(record):
+    sarif = json.loads(SARIFRenderer().render(build_report_model(record)))
+    run = sarif['runs'][0]
+    return {rule['id']: rule for rule in run['tool']['driver']['rules']}, run['results']
+
+
+def test_rule_descriptor_uses_the_base_rule_title():
+    nikto = '\n'.join(f'+ /.git/{name}: Git repository found.' for name in ('HEAD', 'config', 'index'))
+    results = {'nikto': {'success': True, 'output': nikto}}
+    record = {'scan_id': 'scan-1', 'target': 'http://example.com', 'timestamp': '2026-01-01T00:00:00',
+              'results': results, 'vulnerabilities': analyze_vulnerabilities(results)}
+
+    rules, findings = sarif_rules(record)
+    rule = rules['nikto-git-exposed']
+    assert rule['name'] == rule['shortDescription']['text'] == 'Exposed Git repository'
+    assert rule['fullDescription']['text'] == 'Nikto found a .git directory served by the web server.'
+    # The occurrence count and evidence stay on the result
+    assert '(3 occurrences)' in findings[0]['message']['text']
+    assert '/.git/HEAD' in findings[0]['message']['text']
+
+
+def test_stored_findings_without_rule_title_drop_their_counts():
+    record = {'scan_id': 'scan-1', 'target': 'http://example.com', 'timestamp': '2026-01-01T00:00:00',
+              'results': {}, 'vulnerabilities': [
+                  {'title': 'Exposed Git repository (3 occurrences)', 'rule_id': 'nikto-git-exposed',
+                   'severity': 'High', 'description': 'Found. Evidence: + /.git/HEAD'},
+                  {'title': 'CVE-2021-41773 (CVSS 7.5) on 192.0.2.1:80/tcp',
+                   'rule_title': 'CVE-2021-41773', 'severity': 'High', 'description': 'x'},
+              ]}
+
+    rules, _ = sarif_rules(record)
+    assert rules['nikto-git-exposed']['name'] == 'Exposed Git repository'
+    assert rules['CVE-2021-41773']['name'] == 'CVE-2021-41773'
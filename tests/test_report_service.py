@@ -0,0 +1,56 @@
+"""ReportService renders each report once and reuses it until the scan changes"""
+import os
+
+import pytest
+
+from report_service import ReportService, report_content_hash
+
+RECORD = {
+    'scan_id': 'scan-1', 'timestamp': '2026-01-01T00:00:00', 'target': 'example.com',
+    'scan_type': 'all', 'gmail': 'user@gmail.com', 'vuln_stage': 'Low',
+    'vulnerabilities': [{'title': 'Missing header', 'severity': 'Low',
+                         'description': 'X-Frame-Options is not set'}],
+    'results': {'curl': {'success': True, 'output': 'HTTP/1.1 200 OK'}},
+    'status': 'completed',
+}
+
+
+def test_cache_key_follows_report_content():
+    key = report_content_hash(RECORD)
+    # Fields the report does not show leave the key alone
+    assert report_content_hash(dict(RECORD, status='running', progress={'nmap': {}})) == key
+    assert report_content_hash(dict(RECORD, vulnerabilities=[])) != key
+    assert report_content_hash(dict(RECORD, target='example.org')) != key
+
+
+def test_reports_are_rendered_once_and_reused(tmp_path, monkeypatch):
+    pytest.importorskip('reportlab')
+    service = ReportService(directory=str(tmp_path), workers=1)
+    try:
+        path = service.render(RECORD)
+        with open(path, 'rb') as f:
+            assert f.read(5) == b'%PDF-'
+
+        # A cached report is served without going near the pool
+        monkeypatch.setattr(service, '_pool', lambda: pytest.fail('rendered again'))
+        assert service.render(dict(RECORD, status='archived')) == path
+        monkeypatch.undo()
+
+        changed = service.render(dict(RECORD, vulnerabilities=[]))
+        assert changed != path
+        assert sorted(os.listdir(tmp_path)) == sorted(
+            os.path.basename(p) for p in (path, changed))
+    finally:
+        service.shutdown()
+
+
+def test_concurrent_requests_share_one_render(tmp_path):
+    pytest.importorskip('reportlab')
+    service = ReportService(directory=str(tmp_path), workers=1)
+    try:
+        path, future = service.submit(RECORD)
+        again, same = service.submit(RECORD)
+        assert (again, same) == (path, future)
+        future.result(timeout=120)
+    finally:
+        service.shutdown()
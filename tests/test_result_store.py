@@ -0,0 +1,155 @@
+"""ResultStore hands out copies of live records"""
+import json
+import threading
+from types import SimpleNamespace
+
+from baseline import create_baseline_store, RedisBaselineStore
+from result_store import (ResultStore, MemoryBackend, SQLiteBackend, BlobStore, RedisBackend,
+                          RedisBlobStore, create_result_store)
+from scan_events import create_event_bus, RedisEventBus
+
+
+def make_store(tmp_path):
+    return ResultStore(MemoryBackend(), BlobStore(str(tmp_path / 'outputs')))
+
+
+def test_get_returns_a_copy_of_a_running_scan(tmp_path):
+    store = make_store(tmp_path)
+    record = {'scan_id': 'scan-1', 'status': 'running', 'results': {},
+              'progress': {'nmap': {'lines': 1}}}
+    store.save(record)
+
+    copy = store.get('scan-1')
+    copy['progress']['nmap']['lines'] = 99
+    copy['results']['nikto'] = {}
+    assert record['progress']['nmap']['lines'] == 1
+    assert record['results'] == {}
+    assert store.get('scan-1', include_outputs=False)['progress'] == {'nmap': {'lines': 1}}
+
+
+def test_get_returns_a_copy_of_a_cached_scan(tmp_path):
+    store = make_store(tmp_path)
+    store.save({'scan_id': 'scan-1', 'status': 'completed',
+                'results': {'nmap': {'success': True, 'output': 'raw'}}})
+
+    for include_outputs in (False, True):
+        copy = store.get('scan-1', include_outputs=include_outputs)
+        copy['status'] = 'edited'
+        copy['results']['nmap']['success'] = False
+    summary = store.get('scan-1', include_outputs=False)
+    assert summary['status'] == 'completed'
+    assert summary['results'] == {'nmap': {'success': True}}
+
+
+def test_scans_interrupted_by_a_restart_are_failed(tmp_path):
+    path = str(tmp_path / 'scans.db')
+    before = ResultStore(SQLiteBackend(path), BlobStore(str(tmp_path / 'outputs')))
+    for scan_id, status in (('queued', 'queued'), ('running', 'running'), ('done', 'completed')):
+        before.save({'scan_id': scan_id, 'status': status, 'results': {}})
+
+    after = ResultStore(SQLiteBackend(path), BlobStore(str(tmp_path / 'outputs')))
+    assert after.fail_unfinished('restarted') == 2
+    assert after.fail_unfinished('restarted') == 0
+    for scan_id in ('queued', 'running'):
+        record = after.get(scan_id)
+        assert record['status'] == 'failed'
+        assert record['error'] == 'restarted'
+    # Failed records are finished, so retention applies to them again
+    after.retention = 0
+    assert after.evict() == 3
+
+
+def test_reads_while_scanner_threads_write(tmp_path):
+    store = make_store(tmp_path)
+    record = {'scan_id': 'scan-1', 'status': 'running', 'results': {}, 'progress': {}}
+    store.save(record)
+    stop = threading.Event()
+    errors = []
+
+    def write(scanner):
+        count = 0
+        while not stop.is_set():
+            count += 1
+            key = f'{scanner}-{count % 20}'
+            with store.editing():
+                # Adding and removing keys changes the dicts' sizes
+                if count % 40 < 20:
+                    record['progress'][key] = {'lines': count}
+                    record['results'][key] = {'output': 'x' * 10, 'success': True}
+                else:
+                    record['progress'].pop(key, None)
+                    record['results'].pop(key, None)
+
+    def read():
+        try:
+            for _ in range(300):
+                json.dumps(store.get('scan-1'))
+                store.save(record)
+        except Exception as e:
+            errors.append(e)
+
+    writers = [threading.Thread(target=write, args=(name,)) for name in ('nmap', 'nikto')]
+    for thread in writers:
+        thread.start()
+    try:
+        read()
+    finally:
+        stop.set()
+        for thread in writers:
+            thread.join()
+    assert errors == []
+
+
+def test_redis_store_is_shared_between_processes(fake_redis):
+    def store():
+        # One per host: the web app's reads what a worker elsewhere saved
+        return ResultStore(RedisBackend('redis://redis/0'), RedisBlobStore('redis://redis/0'),
+                           keep_active=False)
+
+    worker, web = store(), store()
+    worker.save({'scan_id': 'scan-1', 'status': 'running', 'results': {}})
+    assert web.get('scan-1')['status'] == 'running'
+    assert web.backend.unfinished() == ['scan-1']
+
+    worker.save({'scan_id': 'scan-1', 'status': 'completed',
+                 'results': {'nmap': {'success': True, 'output': 'raw'}}})
+    assert web.get('scan-1', include_outputs=False)['results'] == {'nmap': {'success': True}}
+    assert web.get('scan-1')['results']['nmap']['output'] == 'raw'
+    assert web.backend.unfinished() == []
+
+    worker.save_batch({'batch_id': 'batch-1', 'scans': [{'scan_id': 'scan-1'}]})
+    assert web.get_batch('batch-1')['scans'] == [{'scan_id': 'scan-1'}]
+
+
+def test_redis_store_evicts_like_sqlite(fake_redis):
+    store = ResultStore(RedisBackend('redis://redis/0'), RedisBlobStore('redis://redis/0'),
+                        max_completed=2, keep_active=False)
+    for i in range(3):
+        store.save({'scan_id': f'done-{i}', 'status': 'completed',
+                    'results': {'curl': {'headers': 'x'}}})
+    store.save({'scan_id': 'running', 'status': 'running', 'results': {}})
+    store.save_batch({'batch_id': 'batch-1', 'scans': []})
+
+    # Beyond the size cap, oldest first
+    assert store.evict() == 1
+    assert store.get('done-0') is None
+    assert store.blobs.read('done-0') == {}
+    assert store.get_batch('batch-1') is not None
+
+    store.retention = -1
+    assert store.evict() == 2
+    assert store.get('running') is not None
+    assert store.get_batch('batch-1') is None
+
+
+def test_redis_result_store_moves_all_shared_state(fake_redis):
+    settings = SimpleNamespace(
+        RESULT_STORE_BACKEND='redis', RESULT_REDIS_URL='redis://redis/0',
+        SCAN_EXECUTION='queue', RESULT_CACHE_SIZE=8, RESULT_CACHE_TTL=30,
+        RESULT_RETENTION=3600, RESULT_MAX_COMPLETED=100)
+    store = create_result_store(settings)
+    assert isinstance(store.backend, RedisBackend)
+    assert isinstance(store.blobs, RedisBlobStore)
+    assert not store.keep_active
+    assert isinstance(create_event_bus(settings), RedisEventBus)
+    assert isinstance(create_baseline_store(settings), RedisBaselineStore)
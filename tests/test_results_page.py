@@ -0,0 +1,96 @@
+"""static/script.js renders findings that quote the scanned target as text"""
+import io
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from header_probe import analyze_security_headers
+from nmap_parser import parse_nmap_xml
+from report_generator import analyze_vulnerabilities
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RENDER = '''
+global.document = { addEventListener() {} };
+const { renderResults } = require(process.argv[1]);
+process.stdout.write(renderResults(JSON.parse(require('fs').readFileSync(0, 'utf8'))));
+'''
+
+MARKUP = '<img src=x onerror=alert(1)>'
+
+
+def render_results(data):
+    """HTML that script.js puts into the results section for `data`"""
+    if shutil.which('node') is None:
+        pytest.skip('node is not installed')
+    result = subprocess.run(['node', '-e', RENDER, os.path.join(ROOT, 'static', 'script.js')],
+                            input=json.dumps(data), capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+def test_rule_evidence_is_escaped():
+    results = {
+        'curl': {'success': True, 'headers': f'HTTP/1.1 200 OK\r\nServer: {MARKUP}/1.0\r\n'},
+        'nikto': {'success': True, 'output': f'+ /.git/{MARKUP}: Git repository found.\n'},
+    }
+    vulnerabilities = analyze_vulnerabilities(results)
+    # The evidence keeps the raw text; only rendering escapes it
+    assert sum(MARKUP in vuln['description'] for vuln in vulnerabilities) == 2
+
+    html = render_results({'scan_id': 'scan-1', 'results': results,
+                           'vulnerabilities': vulnerabilities})
+    assert '<img' not in html
+    assert html.count('&lt;img src=x onerror=alert(1)&gt;') >= 2
+
+
+def test_every_vulnerability_field_is_escaped():
+    vulnerability = {field: f'{field} {MARKUP}'
+                     for field in ('title', 'description', 'impact', 'recommendation')}
+    html = render_results({
+        'scan_id': 'scan-1',
+        'results': {f'{MARKUP}': {'success': True, 'output': MARKUP}},
+        'vulnerabilities': [dict(vulnerability, severity=f'Low"{MARKUP}')],
+        'delta': {'new': [{'scanner': MARKUP, 'label': MARKUP}], 'resolved': [], 'changed': []},
+    })
+    assert '<img' not in html
+    assert 'class="severity-low&quot;&lt;img' in html
+
+
+def test_header_issues_are_escaped():
+    headers = {'x-frame-options': MARKUP, 'x-content-type-options': MARKUP}
+    cookie = '<script>sid</script>'
+    security = analyze_security_headers(headers, [f'{cookie}=1; Path=/'], 'http://example.com/')
+    results = {'curl': {'success': True, 'headers': '', 'security_analysis': security}}
+    vulnerabilities = analyze_vulnerabilities(results)
+    descriptions = ' '.join(vuln['description'] for vuln in vulnerabilities)
+    assert descriptions.count(MARKUP) == 2 and cookie in descriptions
+
+    html = render_results({'scan_id': 'scan-1', 'results': results,
+                           'vulnerabilities': vulnerabilities})
+    assert '<img' not in html and '<script>' not in html
+
+
+# A vulnerable script without CVEs, whose output becomes the description
+NMAP_XML = '''<?xml version="1.0"?>
+<nmaprun><host><address addr="192.0.2.10" addrtype="ipv4"/><ports>
+<port protocol="tcp" portid="80"><state state="open"/><service name="http"/>
+<script id="http-custom-check" output="State: VULNERABLE&#10;  Title: &lt;img src=x onerror=alert(1)&gt; &amp; more"/>
+</port></ports></host></nmaprun>
+'''
+
+
+def test_nmap_script_output_is_escaped():
+    ports, findings = parse_nmap_xml(io.BytesIO(NMAP_XML.encode()))
+    results = {'nmap': {'success': True, 'output': '', 'findings': findings}}
+    vulnerabilities = analyze_vulnerabilities(results)
+    assert [vuln['rule_id'] for vuln in vulnerabilities] == ['nmap-http-custom-check']
+    assert MARKUP in vulnerabilities[0]['description']
+
+    html = render_results({'scan_id': 'scan-1', 'results': results,
+                           'vulnerabilities': vulnerabilities})
+    assert '<img' not in html
+    assert '&lt;img src=x onerror=alert(1)&gt; &amp; more' in html
@@ -0,0 +1,82 @@
+"""The compiled rule engine fires the same rules as one search per rule"""
+import re
+
+import config
+from rule_engine import RuleEngine, literal_prefix
+
+NIKTO_OUTPUT = '''+ Server: Apache/2.4.29 (Ubuntu)
++ /: The anti-clickjacking X-Frame-Options header is not present.
++ /.git/backup.zip: Git repository archive found.
++ /.env.bak: Environment file backup found.
++ /.git/config: Git config file found.
++ OSVDB-3268: /icons/: Directory indexing found.
++ /phpinfo.php: Output from the phpinfo() function was found.
++ /db/dump.sql: Database dump found.
+'''
+
+
+def per_rule_hits(engine, scanner, text):
+    """The old engine: every rule searched for on its own"""
+    hits = {}
+    for rule in engine.rules:
+        if rule.scanner != scanner:
+            continue
+        pattern = rule.pattern or re.escape(rule.keyword)
+        count = len(re.findall(pattern, text, re.IGNORECASE | re.MULTILINE))
+        if count:
+            hits[rule.id] = count
+    return hits
+
+
+def test_overlapping_matches_fire_every_rule():
+    engine = RuleEngine.from_file(config.RULES_PATH)
+    hits, _ = engine.scan('nikto', NIKTO_OUTPUT)
+    fired = {rule.id: count for rule, count, _ in hits}
+    assert {'nikto-git-exposed', 'nikto-env-file', 'nikto-backup-file'} <= set(fired)
+    assert fired == per_rule_hits(engine, 'nikto', NIKTO_OUTPUT)
+
+
+def test_keywords_inside_other_keywords():
+    engine = RuleEngine([
+        {'id': 'admin', 'scanner': 'nikto', 'keyword': 'admin', 'severity': 'Low', 'title': 'a'},
+        {'id': 'admin-login', 'scanner': 'nikto', 'keyword': 'admin login',
+         'severity': 'Medium', 'title': 'b'},
+        {'id': 'login', 'scanner': 'nikto', 'keyword': 'login', 'severity': 'Low', 'title': 'c'},
+    ])
+    text = '+ /x: Admin login page found.\n+ /y: nothing here\n'
+    hits, matched_lines = engine.scan('nikto', text)
+    assert [(rule.id, count) for rule, count, _ in hits] == [
+        ('admin', 1), ('admin-login', 1), ('login', 1)]
+    assert matched_lines == 1
+    assert hits[0][2] == ['+ /x: Admin login page found.']
+
+
+def test_pattern_rules_count_like_findall():
+    rules = [
+        {'id': 'doubled', 'scanner': 'nikto', 'pattern': r'abab', 'severity': 'Low', 'title': 'a'},
+        {'id': 'tail', 'scanner': 'nikto', 'pattern': r'bab\w*', 'severity': 'Low', 'title': 'b'},
+        {'id': 'repeated', 'scanner': 'nikto', 'keyword': 'aba', 'severity': 'Low', 'title': 'c'},
+        {'id': 'short', 'scanner': 'nikto', 'pattern': r'/[a-z]+\.bak', 'severity': 'Low',
+         'title': 'd'},
+        {'id': 'anchored', 'scanner': 'nikto', 'pattern': r'^ABAB', 'severity': 'Low', 'title': 'e'},
+    ]
+    engine = RuleEngine(rules)
+    text = 'ababab /x.bak\nxx ababababa /y.BAK /z.bak\nAbAb\n'
+    hits, matched_lines = engine.scan('nikto', text)
+    expected = per_rule_hits(engine, 'nikto', text)
+    assert {rule.id: count for rule, count, _ in hits} == expected
+    assert expected == {'doubled': 4, 'tail': 3, 'repeated': 4, 'short': 3, 'anchored': 2}
+    assert matched_lines == 3
+
+
+def test_literal_prefix():
+    assert literal_prefix(r'/\.git/') == '/.git/'
+    assert literal_prefix(r'^Server:[^\r\n]*\d') == 'server:'
+    assert literal_prefix(r'/server-(?:status|info)\b') == '/server-'
+    # A quantified character is not part of every match
+    assert literal_prefix(r'abcd?e') == 'abc'
+    assert literal_prefix(r'ab{2}') == 'a'
+    assert literal_prefix(r'\d+ ports') == ''
+    assert literal_prefix(r'abc|xyz') == ''
+    assert literal_prefix(r'a(?:b|c)|[|]') == ''
+    assert literal_prefix(r'abc(?:x|y)[|]') == 'abc'
@@ -0,0 +1,158 @@
+"""ScanResultCache reuses and coalesces scanner runs, also across processes"""
+import threading
+import time
+
+import pytest
+
+from scan_cache import (ScanResultCache, SQLiteSharedResults, RedisSharedResults, reserve,
+                        unreserve)
+
+OPTIONS = ('-sV',)
+
+
+@pytest.fixture(params=['sqlite', 'redis'])
+def shared(request, tmp_path):
+    if request.param == 'redis':
+        request.getfixturevalue('fake_redis')
+        return RedisSharedResults('redis://redis/0')
+    return SQLiteSharedResults(str(tmp_path / 'scans.db'))
+
+
+def process_cache(shared):
+    """The result cache of one worker process"""
+    return ScanResultCache({'nmap': 60}, shared=shared, lease=30, poll_interval=0.01)
+
+
+def in_thread(func):
+    results = []
+    thread = threading.Thread(target=lambda: results.append(func()))
+    thread.start()
+    return thread, results
+
+
+def test_successful_results_are_reused_until_they_expire():
+    cache = ScanResultCache({'nmap': 60})
+    now = [0.0]
+    cache.cache.clock = lambda: now[0]
+    runs = []
+
+    def run():
+        runs.append(True)
+        return {'success': True, 'ports': [22]}
+
+    assert cache.get_or_run('nmap', 'Example.com/', OPTIONS, run) == {'success': True, 'ports': [22]}
+    cached = cache.get_or_run('nmap', 'example.com', OPTIONS, run)
+    assert cached['ports'] == [22] and 'cached_at' in cached
+    # Other options are another scan
+    cache.get_or_run('nmap', 'example.com', ('-sS',), run)
+    assert len(runs) == 2
+
+    now[0] = 61
+    assert 'cached_at' not in cache.get_or_run('nmap', 'example.com', OPTIONS, run)
+    cache.get_or_run('nmap', 'example.com', OPTIONS, run, force_refresh=True)
+    assert len(runs) == 4
+
+
+def test_failed_results_are_not_cached():
+    cache = ScanResultCache({'nmap': 60})
+    assert cache.get_or_run('nmap', 'example.com', OPTIONS,
+                            lambda: {'success': False, 'error': 'timeout'})['error'] == 'timeout'
+    assert cache.get_or_run('nmap', 'example.com', OPTIONS,
+                            lambda: {'success': True}) == {'success': True}
+
+
+def test_identical_scans_in_flight_run_once():
+    cache = ScanResultCache({'nmap': 60})
+    started, finish = threading.Event(), threading.Event()
+
+    def slow_run():
+        started.set()
+        finish.wait(5)
+        return {'success': True, 'ports': [80]}
+
+    owner, first = in_thread(lambda: cache.get_or_run('nmap', 'example.com', OPTIONS, slow_run))
+    started.wait(5)
+    waiter, second = in_thread(lambda: cache.get_or_run(
+        'nmap', 'example.com', OPTIONS, lambda: pytest.fail('ran twice')))
+    time.sleep(0.05)
+    finish.set()
+    owner.join(5)
+    waiter.join(5)
+    assert first == second == [{'success': True, 'ports': [80]}]
+    # Each caller gets its own copy
+    assert first[0] is not second[0]
+
+
+def test_results_are_reused_by_other_processes(shared):
+    first, second = process_cache(shared), process_cache(shared)
+    result = first.get_or_run('nmap', 'example.com', OPTIONS,
+                              lambda: {'success': True, 'ports': [80]})
+    assert result == {'success': True, 'ports': [80]}
+
+    reused = second.get_or_run('nmap', 'Example.com/', OPTIONS, lambda: pytest.fail('ran'))
+    assert reused['ports'] == [80]
+    assert 'cached_at' in reused
+
+
+def test_waits_for_a_run_in_another_process(shared):
+    first, second = process_cache(shared), process_cache(shared)
+    started, finish = threading.Event(), threading.Event()
+
+    def slow_run():
+        started.set()
+        finish.wait(5)
+        return {'success': True, 'ports': [443]}
+
+    owner, _ = in_thread(lambda: first.get_or_run('nmap', 'example.com', OPTIONS, slow_run))
+    started.wait(5)
+    shared_calls = []
+    waiter, results = in_thread(lambda: second.get_or_run(
+        'nmap', 'example.com', OPTIONS, lambda: pytest.fail('ran twice'),
+        on_shared=lambda: shared_calls.append(True)))
+    time.sleep(0.1)
+    finish.set()
+    owner.join(5)
+    waiter.join(5)
+    assert results == [{'success': True, 'ports': [443]}]
+    assert shared_calls == [True]
+
+
+def test_failed_run_elsewhere_is_retried_here(shared):
+    first, second = process_cache(shared), process_cache(shared)
+    first.get_or_run('nmap', 'example.com', OPTIONS, lambda: {'success': False})
+    assert second.get_or_run('nmap', 'example.com', OPTIONS,
+                             lambda: {'success': True}) == {'success': True}
+
+
+def test_reserved_group_is_taken_over_by_its_job(shared):
+    # The web app reserves the hosts of a grouped nmap job it queues
+    assert reserve(shared, 'nmap', ['a.example', 'b.example'], OPTIONS, 'group-1', 30) == [
+        'a.example', 'b.example']
+    group_worker, scan_worker = process_cache(shared), process_cache(shared)
+
+    # A scan picked up first waits for the group instead of running nmap
+    waiter, results = in_thread(lambda: scan_worker.get_or_run(
+        'nmap', 'b.example', OPTIONS, lambda: pytest.fail('ran its own nmap')))
+    assert group_worker.claim('nmap', ['a.example', 'b.example'], OPTIONS) == []
+    owned = group_worker.claim('nmap', ['a.example', 'b.example'], OPTIONS, owner='group-1')
+    assert owned == ['a.example', 'b.example']
+    for target in owned:
+        group_worker.resolve('nmap', target, OPTIONS, {'success': True, 'host': target})
+    waiter.join(5)
+    assert results[0]['host'] == 'b.example'
+
+
+def test_unreserved_hosts_are_scanned_by_their_own_scans(shared):
+    reserve(shared, 'nmap', ['a.example'], OPTIONS, 'group-1', 30)
+    unreserve(shared, 'nmap', ['a.example'], OPTIONS, 'group-1')
+    assert process_cache(shared).get_or_run('nmap', 'a.example', OPTIONS,
+                                            lambda: {'success': True}) == {'success': True}
+
+
+def test_waiting_on_another_process_honours_the_deadline(shared):
+    reserve(shared, 'nmap', ['a.example'], OPTIONS, 'group-1', 30)
+    result = process_cache(shared).get_or_run(
+        'nmap', 'a.example', OPTIONS, lambda: pytest.fail('ran'),
+        deadline=time.monotonic() + 0.05)
+    assert not result['success']
+    assert 'deadline' in result['error']
@@ -0,0 +1,135 @@
+"""Scans can be cancelled, run against a deadline and are queued by priority"""
+import threading
+import time
+
+import pytest
+
+from Scanner_manager import ScannerManager
+from scan_cache import CANCELLED_RESULT
+from scan_scheduler import ScanScheduler
+from stream_runner import ProcessCancelled, run_streaming
+
+
+def test_interactive_scans_go_first_and_bulk_keeps_a_worker_free():
+    release = threading.Event()
+    started = []
+    lock = threading.Lock()
+
+    def handler(scan_id):
+        with lock:
+            started.append(scan_id)
+        release.wait(5)
+
+    scheduler = ScanScheduler(handler, workers=2, per_user_limit=5)
+    scheduler.start = lambda: None
+    scheduler.submit_many([('b1', 'batch', ()), ('b2', 'batch', ())], priority='bulk')
+    scheduler.submit('i1', 'alice')
+    assert scheduler.position('i1') == 1
+    with pytest.raises(ValueError):
+        scheduler.submit('x', 'alice', priority='urgent')
+
+    del scheduler.start
+    scheduler.start()
+    for _ in range(100):
+        if len(started) == 2:
+            break
+        time.sleep(0.02)
+    # One bulk scan at most on two workers, after the interactive one
+    assert started == ['i1', 'b1']
+    assert scheduler.stats()['running_bulk'] == 1
+    release.set()
+    scheduler.shutdown()
+
+
+def test_cancel_kills_a_running_tool():
+    cancel = threading.Event()
+    threading.Timer(0.2, cancel.set).start()
+    start = time.monotonic()
+    with pytest.raises(ProcessCancelled):
+        run_streaming(['sleep', '30'], 60, cancel=cancel)
+    assert time.monotonic() - start < 5
+
+
+def test_scanners_do_not_start_once_cancelled_or_out_of_time():
+    manager = ScannerManager()
+    manager.run_nikto = lambda target, **kwargs: pytest.fail('started')
+    cancel = threading.Event()
+    cancel.set()
+    assert manager.run_scanner('nikto', 'example.com', cancel=cancel) == CANCELLED_RESULT
+    result = manager.run_scanner('nikto', 'example.com', deadline=time.monotonic() - 1)
+    assert 'deadline' in result['error']
+    # The deadline caps a scanner's own timeout
+    assert manager._timeout('nikto', time.monotonic() + 5) <= 5
+
+
+class StubScannerManager:
+    def __init__(self, during_run):
+        self.during_run = during_run
+
+    def ensure_scanners(self, scan_type):
+        return []
+
+    def run_scanners(self, scanners, target, on_result=None, **kwargs):
+        self.during_run()
+        on_result(scanners[0], {'success': True, 'output': ''})
+
+
+def test_run_scan_stops_at_a_cancel(monkeypatch):
+    import scan_runner
+
+    monkeypatch.setattr(scan_runner, 'scanner_manager', StubScannerManager(
+        lambda: scan_runner.scan_cancel_event('scan-cancel').set()))
+    scan_runner.run_scan('scan-cancel', 'all', 'example.com', 'user@gmail.com')
+    record = scan_runner.scan_results.get('scan-cancel')
+    assert record['status'] == 'cancelled'
+    # What finished before the cancel is kept
+    assert record['results']['nmap']['success']
+    assert 'scan-cancel' not in scan_runner.scan_cancel_events
+
+
+def test_run_scan_flags_a_passed_deadline(monkeypatch):
+    import scan_runner
+
+    monkeypatch.setattr(scan_runner, 'scanner_manager', StubScannerManager(
+        lambda: time.sleep(1.1)))
+    scan_runner.run_scan('scan-late', 4, 'example.com', 'user@gmail.com', deadline=1)
+    record = scan_runner.scan_results.get('scan-late')
+    assert record['status'] == 'completed'
+    assert record['deadline_exceeded']
+
+
+def test_cancel_endpoint_takes_queued_scans_off_the_queue(monkeypatch):
+    import app
+    from scan_runner import new_scan_record, scan_results
+
+    scheduler = ScanScheduler(lambda *args: None)
+    scheduler.start = lambda: None
+    monkeypatch.setattr(app, 'scan_scheduler', scheduler)
+    scan_results.save(new_scan_record('scan-queued', 4, 'example.com', 'user@gmail.com'))
+    scheduler.submit('scan-queued', 'user@gmail.com', 4, 'example.com')
+    client = app.app.test_client()
+
+    with client.session_transaction() as session:
+        session['gmail'] = 'other@gmail.com'
+    assert client.post('/scan_cancel/scan-queued').status_code == 403
+
+    with client.session_transaction() as session:
+        session['gmail'] = 'user@gmail.com'
+    assert client.post('/scan_cancel/scan-queued').get_json()['status'] == 'cancelled'
+    assert scheduler.position('scan-queued') is None
+    assert scan_results.get('scan-queued')['status'] == 'cancelled'
+    assert client.post('/scan_cancel/scan-queued').status_code == 409
+
+
+def test_requested_limits_are_validated(monkeypatch):
+    import app
+
+    monkeypatch.setattr(app.config, 'SCAN_DEADLINE', 600)
+    assert app.scan_limits({}, 'bulk') == ('bulk', 600)
+    assert app.scan_limits({'priority': 'interactive', 'deadline': '30'}, 'bulk') == (
+        'interactive', 30)
+    # Never longer than the server allows
+    assert app.scan_limits({'deadline': 3600}, 'bulk') == ('bulk', 600)
+    for data in ({'priority': 'urgent'}, {'deadline': 'soon'}, {'deadline': -5}):
+        with pytest.raises(ValueError):
+            app.scan_limits(data, 'interactive')
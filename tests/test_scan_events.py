@@ -0,0 +1,70 @@
+"""Event streams of finished scans end instead of idling on keepalives"""
+import pytest
+
+from scan_events import ScanEventBus, SQLiteEventBus, RedisEventBus
+
+def read_stream(response):
+    """The body of an event stream, failing if it idles instead of ending"""
+    body = ''
+    for chunk in response.response:
+        body += chunk.decode() if isinstance(chunk, bytes) else chunk
+        if 'keepalive' in body:
+            response.close()
+            pytest.fail(f'stream kept going: {body}')
+    response.close()
+    return body
+
+
+@pytest.mark.parametrize('execution', ['local', 'queue'])
+def test_resume_at_final_event_ends_stream(tmp_path, monkeypatch, execution):
+    import app
+    from scan_runner import new_scan_record, scan_results
+
+    # The bus each execution mode uses
+    bus = SQLiteEventBus(str(tmp_path / 'scans.db')) if execution == 'queue' else ScanEventBus()
+    monkeypatch.setattr(app, 'scan_events_bus', bus)
+    monkeypatch.setattr(app.config, 'SSE_KEEPALIVE', 1)
+    scan_id = f'scan-final-{execution}'
+    record = new_scan_record(scan_id, 'all', 'example.com', 'user@gmail.com')
+    record['status'] = 'completed'
+    scan_results.save(record)
+    bus.publish(scan_id, 'status', {'status': 'running'})
+    bus.publish(scan_id, 'completed', {'status': 'completed'})
+    final_id = bus.channel(scan_id).last_id
+
+    client = app.app.test_client()
+    for query, headers in ((f'?since={final_id}', {}), ('', {'Last-Event-ID': str(final_id)})):
+        body = read_stream(client.get(f'/scan_events/{scan_id}{query}', headers=headers,
+                                      buffered=False))
+        assert 'event: snapshot' in body
+        assert '"status": "completed"' in body
+
+    poll = client.get(f'/scan_events/{scan_id}?mode=poll&since={final_id}').get_json()
+    assert [event['event'] for event in poll['events']] == ['snapshot']
+    assert poll['events'][0]['data']['status'] == 'completed'
+
+
+@pytest.fixture(params=['sqlite', 'redis'])
+def stored_bus(request, tmp_path):
+    if request.param == 'redis':
+        request.getfixturevalue('fake_redis')
+        return RedisEventBus('redis://redis/0', max_events=3)
+    return SQLiteEventBus(str(tmp_path / 'scans.db'), max_events=3)
+
+
+def test_stored_bus_numbers_trims_and_closes(stored_bus):
+    assert stored_bus.channel('scan-1') is None
+    for lines in range(4):
+        stored_bus.publish('scan-1', 'progress', {'lines': lines})
+
+    channel = stored_bus.channel('scan-1')
+    assert channel.last_id == 4
+    # The newest max_events are kept
+    assert [event['id'] for event in channel.events] == [2, 3, 4]
+    assert channel.since(3) == [{'id': 4, 'event': 'progress', 'data': {'lines': 3}}]
+    assert not channel.closed
+
+    stored_bus.publish('scan-1', 'completed', {'status': 'completed'})
+    assert channel.closed
+    assert channel.wait(5, timeout=5) == []
+    assert stored_bus.heads(['scan-1', 'unknown']) == {'scan-1': (5, True)}
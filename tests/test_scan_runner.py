@@ -0,0 +1,82 @@
+"""run_scan keeps the result store up to date, errors included"""
+import sqlite3
+
+import scan_runner
+from scan_runner import run_scan, scan_results
+
+
+def test_store_errors_are_recorded_not_masked(monkeypatch):
+    saves = []
+
+    def get(scan_id, include_outputs=True):
+        raise sqlite3.OperationalError('database is locked')
+
+    def save(record):
+        saves.append(dict(record))
+        if len(saves) == 1:
+            raise sqlite3.OperationalError('disk I/O error')
+
+    monkeypatch.setattr(scan_results, 'get', get)
+    monkeypatch.setattr(scan_results, 'save', save)
+    run_scan('scan-1', 4, '127.0.0.1', 'user@gmail.com')
+    assert saves[-1]['status'] == 'failed'
+    assert saves[-1]['error'] == 'disk I/O error'
+
+
+class RecordingScannerManager:
+    """Runs no tools; reads the record back from the store as each scanner goes"""
+
+    def __init__(self, scan_id):
+        self.scan_id = scan_id
+        self.seen = []
+
+    def ensure_scanners(self, scan_type):
+        return []
+
+    def run_scanners(self, scanners, target, progress=None, on_result=None, **kwargs):
+        results = {}
+        for scanner in scanners:
+            progress(scanner, {'state': 'running', 'lines': 3})
+            self.seen.append(scan_results.get(self.scan_id, include_outputs=False))
+            results[scanner] = {'success': True, 'output': f'{scanner} output'}
+            on_result(scanner, results[scanner])
+            self.seen.append(scan_results.get(self.scan_id, include_outputs=False))
+        return results
+
+
+def test_queue_mode_saves_progress_while_running(monkeypatch):
+    # As in worker.py: live records are not kept, so reads go to the backend
+    monkeypatch.setattr(scan_results, 'keep_active', False)
+    monkeypatch.setattr(scan_runner.config, 'RESULT_PROGRESS_INTERVAL', 0)
+    manager = RecordingScannerManager('scan-progress')
+    monkeypatch.setattr(scan_runner, 'scanner_manager', manager)
+    run_scan('scan-progress', 'all', '127.0.0.1', 'user@gmail.com')
+
+    seen = manager.seen
+    assert seen[0]['status'] == 'running'
+    assert seen[0]['progress']['nmap'] == {'state': 'running', 'lines': 3}
+    assert 'nmap' not in seen[0]['results']
+    assert seen[1]['results']['nmap']['success'] is True
+    assert set(seen[-1]['results']) == set(scan_runner.ALL_SCANNERS)
+    assert scan_results.get('scan-progress')['status'] == 'completed'
+
+
+def test_nmap_group_jobs_reserve_their_hosts(tmp_path, monkeypatch):
+    from scan_cache import SQLiteSharedResults, ScanResultCache
+
+    shared = SQLiteSharedResults(str(tmp_path / 'scans.db'))
+    monkeypatch.setattr(scan_runner, 'shared_results', shared)
+    monkeypatch.setattr(scan_runner.config, 'NMAP_GROUP_SIZE', 2)
+    jobs = scan_runner.nmap_group_jobs(['a.example', 'b.example', 'c.example'], 'user@gmail.com')
+
+    # The odd host out is left to its own scan
+    assert len(jobs) == 1
+    job_id, user, args = jobs[0]
+    assert user == f'user@gmail.com:{job_id}'
+    assert args == (scan_runner.NMAP_GROUP_JOB, ['a.example', 'b.example'], False)
+    worker_cache = ScanResultCache({'nmap': 60}, shared=shared)
+    options = scan_runner.SCANNER_OPTIONS['nmap']
+    assert worker_cache.claim('nmap', ['a.example', 'c.example'], options) == ['c.example']
+
+    scan_runner.cancel_nmap_group_jobs(jobs)
+    assert worker_cache.claim('nmap', ['a.example'], options) == ['a.example']
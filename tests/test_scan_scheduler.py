@@ -0,0 +1,70 @@
+"""ScanScheduler bounds the queue and takes users' jobs in turns"""
+import threading
+import time
+
+import pytest
+
+from scan_scheduler import QueueFullError, ScanScheduler
+
+
+def idle_scheduler(**kwargs):
+    """A scheduler whose workers never start, so jobs stay queued"""
+    scheduler = ScanScheduler(lambda scan_id: None, **kwargs)
+    scheduler.start = lambda: None
+    return scheduler
+
+
+def test_queue_is_bounded():
+    scheduler = idle_scheduler(max_queue=2)
+    scheduler.submit_many([('a1', 'alice', ()), ('a2', 'alice', ())])
+    with pytest.raises(QueueFullError):
+        scheduler.submit('a3', 'alice')
+    assert scheduler.stats()['queued'] == 2
+
+
+def test_submit_many_is_all_or_nothing():
+    scheduler = idle_scheduler(max_queue=2)
+    with pytest.raises(QueueFullError):
+        scheduler.submit_many([(f'a{i}', 'alice', ()) for i in range(3)])
+    assert scheduler.stats()['queued'] == 0
+
+
+def test_users_take_turns():
+    scheduler = idle_scheduler()
+    scheduler.submit_many([('a1', 'alice', ()), ('a2', 'alice', ()), ('a3', 'alice', ())])
+    scheduler.submit('b1', 'bob')
+    # Bob's scan goes after Alice's first, not behind her whole batch
+    assert [scheduler.position(scan_id) for scan_id in ('a1', 'b1', 'a2', 'a3')] == [1, 2, 3, 4]
+    assert scheduler.cancel('a2')
+    assert scheduler.position('a3') == 3
+    assert scheduler.position('a2') is None
+
+
+def test_workers_run_jobs_up_to_the_per_user_limit():
+    release = threading.Event()
+    running = []
+    lock = threading.Lock()
+    done = threading.Semaphore(0)
+
+    def handler(scan_id):
+        with lock:
+            running.append(scan_id)
+        release.wait(5)
+        done.release()
+
+    scheduler = ScanScheduler(handler, workers=4, per_user_limit=2)
+    scheduler.submit_many([(f'a{i}', 'alice', ()) for i in range(3)])
+    scheduler.submit('b1', 'bob')
+    for _ in range(50):
+        if len(running) == 3:
+            break
+        time.sleep(0.02)
+    # Alice's third scan waits for one of her first two, though a worker is free
+    assert sorted(running) == ['a0', 'a1', 'b1']
+    assert scheduler.position('a2') == 1
+
+    release.set()
+    for _ in range(4):
+        assert done.acquire(timeout=5)
+    scheduler.shutdown()
+    assert 'a2' in running
@@ -0,0 +1,47 @@
+"""ScannerManager runs the scanners of one scan side by side"""
+import threading
+
+import pytest
+
+from Scanner_manager import ALL_SCANNERS, ScannerManager
+
+
+@pytest.fixture
+def manager():
+    return ScannerManager()
+
+
+def stub_scanner(manager, scanner, run):
+    setattr(manager, f'run_{scanner}', lambda target, **kwargs: run(target))
+
+
+def test_all_scanners_run_at_the_same_time(manager):
+    # Each scanner waits for all the others; run back to back they would time out
+    everyone = threading.Barrier(len(ALL_SCANNERS), timeout=5)
+
+    def together(scanner):
+        def run(target):
+            everyone.wait()
+            return {'success': True, 'output': f'{scanner} {target}'}
+        return run
+
+    for scanner in ALL_SCANNERS:
+        stub_scanner(manager, scanner, together(scanner))
+
+    results = manager.run_scanners(ALL_SCANNERS, 'example.com', max_workers=len(ALL_SCANNERS))
+    assert list(results) == ALL_SCANNERS
+    assert results['nikto'] == {'success': True, 'output': 'nikto example.com'}
+
+
+def test_a_failing_scanner_does_not_stop_the_others(manager):
+    def broken(target):
+        raise RuntimeError('tool crashed')
+
+    stub_scanner(manager, 'nmap', broken)
+    stub_scanner(manager, 'whatweb', lambda target: {'success': True, 'output': 'ok'})
+    finished = []
+    results = manager.run_scanners(['nmap', 'whatweb'], 'example.com',
+                                   on_result=lambda scanner, result: finished.append(scanner))
+    assert results['nmap'] == {'error': 'tool crashed', 'success': False}
+    assert results['whatweb']['success']
+    assert sorted(finished) == ['nmap', 'whatweb']
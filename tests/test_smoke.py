@@ -0,0 +1,41 @@
+"""Smoke tests: the web app and the scan worker start at all
+
+Each check runs in a fresh interpreter inside a temporary directory, so
+the data directories the modules create on import land there.
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_python(tmp_path, *args, **env):
+    # Not the scratch paths conftest gives this process
+    environment = {name: value for name, value in os.environ.items()
+                   if not name.startswith('WEBSCAN_')}
+    environment.update(WEBSCAN_SCANNER_AUTO_INSTALL='0', PYTHONPATH=ROOT, **env)
+    return subprocess.run([sys.executable, *args], cwd=tmp_path, env=environment,
+                          capture_output=True, text=True, timeout=120)
+
+
+def test_app_imports(tmp_path):
+    result = run_python(tmp_path, '-c', 'import app; assert "/scan" in str(app.app.url_map)')
+    assert result.returncode == 0, result.stderr
+
+
+def test_app_imports_in_queue_mode(tmp_path):
+    result = run_python(tmp_path, '-c', 'import app, worker', WEBSCAN_EXECUTION='queue')
+    assert result.returncode == 0, result.stderr
+
+
+def test_worker_help(tmp_path):
+    result = run_python(tmp_path, os.path.join(ROOT, 'worker.py'), '--help')
+    assert result.returncode == 0, result.stderr
+    assert '--concurrency' in result.stdout
+
+
+def test_app_import_skips_async_modules(tmp_path):
+    # asyncio is only for asgi_app.py; the threaded app should not pay for it
+    result = run_python(tmp_path, '-c', 'import sys, app; assert "asyncio" not in sys.modules')
+    assert result.returncode == 0, result.stderr
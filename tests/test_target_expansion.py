@@ -0,0 +1,74 @@
+"""Batch target lists expand into single, de-duplicated targets"""
+import pytest
+
+from target_expansion import TargetError, expand_targets, split_targets
+
+
+def test_lists_are_split_and_comments_dropped():
+    text = 'example.com, example.org;10.0.0.1\n# staging hosts\nstaging.example.com  # old\n'
+    assert split_targets(text) == ['example.com', 'example.org', '10.0.0.1',
+                                   'staging.example.com']
+
+
+def test_cidr_ranges_expand_to_their_hosts():
+    targets, duplicates = expand_targets(['192.0.2.0/30', '192.0.2.8/32', '2001:db8::/127'])
+    # Network and broadcast addresses are left out of ranges that have them
+    assert targets == ['192.0.2.1', '192.0.2.2', '192.0.2.8', '2001:db8::', '2001:db8::1']
+    assert duplicates == 0
+
+
+def test_duplicates_are_dropped_in_first_seen_order():
+    targets, duplicates = expand_targets(
+        'Example.com\nhttp://b.example\nexample.com/\n192.0.2.1 192.0.2.0/30')
+    assert targets == ['Example.com', 'http://b.example', '192.0.2.1', '192.0.2.2']
+    assert duplicates == 2
+
+
+@pytest.mark.parametrize('entries, error', [
+    ('192.0.2.0/23', 'more than 256 hosts'),
+    ('192.0.2.0/33', 'Invalid CIDR range'),
+    (' '.join(f'host{i}.example' for i in range(257)), 'at most 256 targets'),
+])
+def test_limits(entries, error):
+    with pytest.raises(TargetError, match=error):
+        expand_targets(entries)
+
+
+def test_limit_counts_distinct_targets():
+    entries = ['192.0.2.0/24'] * 2 + ['192.0.2.1']
+    targets, duplicates = expand_targets(entries)
+    assert len(targets) == 254
+    assert duplicates == 255
+
+
+class RecordingScheduler:
+    def __init__(self):
+        self.jobs = []
+
+    def submit_many(self, jobs, priority='interactive'):
+        self.jobs.extend((job, priority) for job in jobs)
+
+
+def test_batch_endpoint_queues_one_bulk_scan_per_target(monkeypatch):
+    import app
+
+    scheduler = RecordingScheduler()
+    monkeypatch.setattr(app, 'scan_scheduler', scheduler)
+    client = app.app.test_client()
+    with client.session_transaction() as session:
+        session['gmail'] = 'user@gmail.com'
+
+    response = client.post('/scan_batch', json={
+        'scan_type': 3, 'targets': ['example.com, 192.0.2.0/30', 'EXAMPLE.com']})
+    assert response.status_code == 200, response.get_json()
+    body = response.get_json()
+    assert [scan['target'] for scan in body['scans']] == ['example.com', '192.0.2.1', '192.0.2.2']
+    assert body['duplicates_removed'] == 1
+    assert [(job[0], priority) for job, priority in scheduler.jobs] == [
+        (scan['scan_id'], 'bulk') for scan in body['scans']]
+
+    status = client.get(f"/batch_status/{body['batch_id']}").get_json()
+    assert status['counts']['queued'] == 3
+
+    assert client.post('/scan_batch', json={'scan_type': 3, 'targets': '10.0.0.0/8'}
+                       ).status_code == 400
@@ -0,0 +1,45 @@
+"""ToolRegistry resolves tools once and notices tools being installed"""
+import os
+import stat
+import time
+
+from tool_registry import ToolRegistry
+
+
+def install_tool(directory, name, version):
+    path = directory / name
+    path.write_text(f'#!/bin/sh\necho "{version}"\n')
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    return path
+
+
+def test_refresh_resolves_paths_and_versions(tmp_path, monkeypatch):
+    monkeypatch.setenv('PATH', str(tmp_path))
+    install_tool(tmp_path, 'faketool', 'faketool 1.2.3')
+    registry = ToolRegistry({'faketool': ['--version'], 'missingtool': ['-V']})
+    registry.refresh()
+
+    assert registry.path('faketool') == str(tmp_path / 'faketool')
+    assert registry.info('faketool')['version'] == 'faketool 1.2.3'
+    assert registry.missing(['faketool', 'missingtool']) == ['missingtool']
+    # Lookups are served from memory until the next refresh
+    os.remove(tmp_path / 'faketool')
+    assert registry.is_installed('faketool')
+    registry.refresh()
+    assert not registry.is_installed('faketool')
+
+
+def test_watcher_refreshes_when_path_changes(tmp_path, monkeypatch):
+    monkeypatch.setenv('PATH', str(tmp_path))
+    registry = ToolRegistry({'faketool': ['--version']}, poll_interval=0.05)
+    registry.start()
+    assert not registry.is_installed('faketool')
+
+    install_tool(tmp_path, 'faketool', 'faketool 2.0')
+    # Some filesystems keep coarse mtimes; make the change visible
+    os.utime(tmp_path, ns=(time.time_ns(), time.time_ns() + 10**9))
+    for _ in range(100):
+        if registry.is_installed('faketool'):
+            break
+        time.sleep(0.05)
+    assert registry.info('faketool')['version'] == 'faketool 2.0'
@@ -0,0 +1,106 @@
+import os
+import shutil
+import subprocess
+import threading
+import time
+from datetime import datetime
+
+
+class ToolRegistry:
+    """Resolved paths and versions of external tools, looked up once
+
+    Lookups are served from memory. A background thread refreshes the
+    registry every `refresh_interval` seconds, or sooner when one of the
+    directories on PATH changes (a tool was installed or removed).
+    """
+
+    def __init__(self, version_args, refresh_interval=3600, poll_interval=10):
+        self.version_args = version_args
+        self.refresh_interval = refresh_interval
+        self.poll_interval = poll_interval
+
+        self._tools = {}
+        self._lock = threading.Lock()
+        self._path_signature = None
+        self._last_refresh = 0
+        self._watcher = None
+
+    def refresh(self):
+        """Resolve every tool's path and version now"""
+        signature = self._current_path_signature()
+        tools = {}
+        for tool, args in self.version_args.items():
+            path = shutil.which(tool)
+            tools[tool] = {
+                'path': path,
+                'version': self._detect_version(path, args) if path else None,
+                'checked_at': datetime.now().isoformat()
+            }
+        with self._lock:
+            self._tools = tools
+            self._path_signature = signature
+            self._last_refresh = time.monotonic()
+        return tools
+
+    def start(self):
+        """Populate the registry and start the background refresher"""
+        with self._lock:
+            if self._watcher is not None:
+                return
+            self._watcher = threading.Thread(target=self._watch, name='tool-registry')
+            self._watcher.daemon = True
+        self.refresh()
+        self._watcher.start()
+
+    def info(self, tool):
+        with self._lock:
+            return self._tools.get(tool)
+
+    def path(self, tool):
+        info = self.info(tool)
+        return info['path'] if info else None
+
+    def is_installed(self, tool):
+        return self.path(tool) is not None
+
+    def missing(self, tools):
+        return [tool for tool in tools if not self.is_installed(tool)]
+
+    def snapshot(self):
+        with self._lock:
+            return {tool: dict(info) for tool, info in self._tools.items()}
+
+    def _watch(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                with self._lock:
+                    stale = time.monotonic() - self._last_refresh >= self.refresh_interval
+                    signature = self._path_signature
+                if stale or self._current_path_signature() != signature:
+                    self.refresh()
+            except Exception as e:
+                print(f"Failed to refresh tool registry: {e}")
+
+    def _current_path_signature(self):
+        signature = []
+        for directory in os.environ.get('PATH', '').split(os.pathsep):
+            try:
+                signature.append((directory, os.stat(directory).st_mtime_ns))
+            except OSError:
+                signature.append((directory, None))
+        return tuple(signature)
+
+    def _detect_version(self, path, args):
+        try:
+            result = subprocess.run(
+                [path, *args], capture_output=True, text=True, timeout=10,
+                stdin=subprocess.DEVNULL
+            )
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+        for line in (result.stdout + result.stderr).splitlines():
+            line = line.strip()
+            if line:
+                return line[:120]
+        return None
@@ -0,0 +1,169 @@
+"""Standalone scan worker
+
+Takes scans from the shared job queue and runs them with the same code the
+web app uses in local mode, writing records and events to the shared
+result store. With the default SQLite queue and store, start as many as
+needed on the web app's host, whose local disk holds the databases:
+
+    WEBSCAN_EXECUTION=queue python worker.py [--concurrency N]
+
+With both in Redis, workers (and web apps) can run on any host that
+reaches it:
+
+    WEBSCAN_EXECUTION=queue WEBSCAN_JOB_QUEUE=redis://redis-host:6379/0 \\
+        WEBSCAN_RESULT_STORE=redis python worker.py
+
+The first SIGTERM/SIGINT stops taking new scans and lets running ones
+finish; a second one exits at once, and the unfinished scans are handed
+to other workers when their leases run out.
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import uuid
+
+from job_queue import create_job_queue
+from scan_scheduler import PRIORITIES
+import scan_runner
+import config
+
+
+class ScanWorker:
+    """Runs up to `concurrency` queued scans at a time"""
+
+    def __init__(self, queue, concurrency, bulk_slots=None, worker_id=None,
+                 lease=60, poll_interval=1, max_attempts=3):
+        self.queue = queue
+        self.concurrency = max(1, concurrency)
+        # Threads that may run bulk scans; the rest wait for interactive ones
+        if bulk_slots is None:
+            bulk_slots = self.concurrency - 1
+        self.bulk_slots = min(self.concurrency, max(1, bulk_slots))
+        self.worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}'
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+
+        self._running = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def run(self):
+        """Work until stop() is called and the running scans have finished"""
+        print(f"Worker {self.worker_id} running {self.concurrency} scans at a time")
+        threading.Thread(target=self._watch, name='worker-heartbeat', daemon=True).start()
+        threads = [
+            threading.Thread(target=self._work, name=f'scan-worker-{i}', daemon=True)
+            for i in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def stop(self):
+        self._stopping.set()
+
+    def _priorities(self):
+        with self._lock:
+            running_bulk = sum(1 for priority in self._running.values() if priority == 'bulk')
+        if running_bulk < self.bulk_slots:
+            return PRIORITIES
+        return ('interactive',)
+
+    def _work(self):
+        while not self._stopping.is_set():
+            try:
+                job = self.queue.claim(self.worker_id, self._priorities(), self.lease)
+            except Exception as e:
+                print(f"Failed to claim a scan: {e}")
+                job = None
+            if job is None:
+                self._stopping.wait(self.poll_interval)
+                continue
+
+            with self._lock:
+                self._running[job.scan_id] = job.priority
+            try:
+                if job.attempts > self.max_attempts:
+                    scan_runner.fail_scan(
+                        job.scan_id, f'Scan was interrupted {job.attempts - 1} times, giving up')
+                else:
+                    scan_runner.run_job(job.scan_id, *job.args)
+            except Exception as e:
+                print(f"Scan {job.scan_id} failed in worker: {e}")
+            finally:
+                with self._lock:
+                    self._running.pop(job.scan_id, None)
+                try:
+                    self.queue.complete(job.scan_id, self.worker_id)
+                except Exception as e:
+                    print(f"Failed to complete scan {job.scan_id}: {e}")
+
+    def _watch(self):
+        # Renew leases a few times per lease period, and pass cancels from
+        # /scan_cancel on to the running scans every second
+        renew_every = max(1, self.lease // 3)
+        ticks = 0
+        while True:
+            time.sleep(1)
+            ticks += 1
+            with self._lock:
+                scan_ids = list(self._running)
+            if not scan_ids:
+                continue
+            try:
+                for scan_id in self.queue.cancel_requested(scan_ids):
+                    with self._lock:
+                        if scan_id in self._running:
+                            scan_runner.scan_cancel_event(scan_id).set()
+                if ticks % renew_every == 0:
+                    self.queue.heartbeat(self.worker_id, scan_ids, self.lease)
+            except Exception as e:
+                print(f"Worker heartbeat failed: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run queued scans for the web scanner')
+    parser.add_argument('--concurrency', type=int, default=config.WORKER_CONCURRENCY,
+                        help='scans run at the same time (default: %(default)s)')
+    parser.add_argument('--bulk-slots', type=int, default=None,
+                        help='of those, how many may be bulk scans (default: concurrency - 1)')
+    parser.add_argument('--worker-id', help='name shown in the job table (default: host-pid)')
+    args = parser.parse_args()
+
+    if config.SCAN_EXECUTION != 'queue':
+        sys.exit('worker.py needs WEBSCAN_EXECUTION=queue, in the web app as well')
+    if config.RESULT_STORE_BACKEND == 'memory':
+        sys.exit('worker.py needs a shared result store, not WEBSCAN_RESULT_STORE=memory')
+
+    worker = ScanWorker(
+        create_job_queue(config),
+        concurrency=args.concurrency,
+        bulk_slots=args.bulk_slots,
+        worker_id=args.worker_id,
+        lease=config.JOB_LEASE,
+        poll_interval=config.JOB_POLL_INTERVAL,
+        max_attempts=config.JOB_MAX_ATTEMPTS
+    )
+
+    def shutdown(signum, frame):
+        if worker._stopping.is_set():
+            print("Exiting; unfinished scans go back to the queue when their leases expire")
+            os._exit(1)
+        print("Finishing running scans before exiting (signal again to exit now)")
+        worker.stop()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    scan_runner.start_prewarm()
+    worker.run()
+
+
+if __name__ == '__main__':
+    main()